@@ -0,0 +1,126 @@
+import json
+import argparse
+from pathlib import Path
+
+import numpy as np
+
+
+class CompressionPredictor:
+    # Log-linear models per compressor fitted on our own benchmark results (benchmark/benchmark_sz3.py) with
+    # the sampled features of get_compression_features. They predict the compression ratio, the compression
+    # throughput and, when the benchmark recorded it, the PSNR. Otherwise the PSNR assumes errors uniform in
+    # [-eb, eb], which is what the SZ quantizer produces.
+    FEATURES = ["quant_entropy", "p0", "entropy", "log_range_over_eb", "log_lorenzo_over_eb", "log_threads"]
+
+    def __init__(self, models: dict = None):
+        # compressor name -> {"cr": coefficients, "throughput": coefficients, "psnr": coefficients or None}
+        self.models = models or {}
+
+    @staticmethod
+    def usesThreads(compressor_name: str) -> bool:
+        # benchmark_sz3.py passes its layer_depth column to sz_split as --threads, sz3 runs single-threaded
+        return "split" in compressor_name.lower()
+
+    @staticmethod
+    def featureVector(features: dict, threads: int = 1) -> np.ndarray:
+        eb = features["error_bound"]
+        return np.array([1.0,
+                         features["quant_entropy"],
+                         features["p0"],
+                         features["entropy"],
+                         np.log2(max(features["valueRange"], 1e-300) / eb),
+                         np.log2(features["avg_lorenzo"] / eb + 1),
+                         np.log2(max(threads, 1))])
+
+    @staticmethod
+    def fitLeastSquares(X: np.ndarray, y: np.ndarray, ridge: float = 1e-3) -> list:
+        # a small ridge keeps the fit stable with few benchmark rows, the intercept is not penalized
+        penalty = ridge * np.eye(X.shape[1])
+        penalty[0, 0] = 0
+        return np.linalg.solve(X.T @ X + penalty, X.T @ y).tolist()
+
+    def fit(self, rows: list):
+        # rows are dicts with compressor_name, layer_depth (the thread count of sz_split), features,
+        # compression_ratio, original_size, compress_wall_time and optionally psnr
+        by_compressor = {}
+        for row in rows:
+            by_compressor.setdefault(row["compressor_name"], []).append(row)
+        for compressor_name, compressor_rows in by_compressor.items():
+            threads = [row.get("layer_depth", 1) if self.usesThreads(compressor_name) else 1 for row in compressor_rows]
+            X = np.stack([self.featureVector(row["features"], row_threads) for row, row_threads in zip(compressor_rows, threads)])
+            cr = np.log([row["compression_ratio"] for row in compressor_rows])
+            throughput = np.log([row["original_size"] / 1e6 / row["compress_wall_time"] for row in compressor_rows])
+            psnr_rows = [index for index, row in enumerate(compressor_rows) if np.isfinite(row.get("psnr", np.nan))]
+            self.models[compressor_name] = {
+                "cr": self.fitLeastSquares(X, cr),
+                "throughput": self.fitLeastSquares(X, throughput),
+                "psnr": self.fitLeastSquares(X[psnr_rows], np.array([compressor_rows[i]["psnr"] for i in psnr_rows])) if len(psnr_rows) >= X.shape[1] else None,
+                "rows": len(compressor_rows),
+            }
+        return self
+
+    def predict(self, features: dict, original_size: int, threads: int = 1) -> dict:
+        # compressor name -> predicted compression ratio, compression time in seconds and PSNR in dB
+        predictions = {}
+        for compressor_name, model in self.models.items():
+            x = self.featureVector(features, threads if self.usesThreads(compressor_name) else 1)
+            throughput = float(np.exp(x @ model["throughput"]))
+            if model["psnr"] is not None:
+                psnr = float(x @ model["psnr"])
+            else:
+                psnr = float(20 * np.log10(max(features["valueRange"], 1e-300) / features["error_bound"]) + 10 * np.log10(3))
+            predictions[compressor_name] = {
+                "cr": float(np.exp(x @ model["cr"])),
+                "compress_time": original_size / 1e6 / throughput,
+                "psnr": psnr,
+            }
+        return predictions
+
+    def save(self, path):
+        with open(path, 'w') as f:
+            json.dump({"features": self.FEATURES, "models": self.models}, f, indent=2)
+
+    @classmethod
+    def load(cls, path):
+        with open(path, 'r') as f:
+            content = json.load(f)
+        if content.get("features") != cls.FEATURES:
+            raise ValueError(f"{path} was trained with different features")
+        return cls(content["models"])
+
+
+def train_from_benchmark(stats_files: list, config_file: str, sample_blocks: int = 64) -> CompressionPredictor:
+    # runs where the benchmark data lives, the features of every (file, error bound) are computed once
+    import yaml
+    import pandas as pd
+    from globus_compute_util import get_compression_features
+    with open(config_file, 'r') as f:
+        datasets = {dataset["name"]: dataset for dataset in yaml.safe_load(f)["datasets"]}
+    stats = pd.concat([pd.read_csv(stats_file) for stats_file in stats_files], ignore_index=True)
+    features_cache = {}
+    rows = []
+    for record in stats.to_dict("records"):
+        dataset = datasets.get(record["dataset_name"])
+        if dataset is None or record["compress_wall_time"] <= 0:
+            print(f"skipping {record['dataset_name']}/{record['data_file_name']}, no dataset config or timing")
+            continue
+        key = (record["dataset_name"], record["data_file_name"], record["error_bound"])
+        if key not in features_cache:
+            data_file = str(Path(dataset["folder"]) / record["data_file_name"])
+            dimension = " ".join(str(dim) for dim in dataset["dimension"])
+            features_cache[key] = get_compression_features(dimension, data_file, record["error_bound"],
+                                                           dataset.get("isFloat64", False), sample_blocks)
+        rows.append(dict(record, features=features_cache[key]))
+    return CompressionPredictor().fit(rows)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Train the compression ratio/time/PSNR predictor on benchmark_sz3.py results")
+    parser.add_argument("-s", "--stats", nargs="+", required=True, help="benchmark_stats.csv files written by benchmark_sz3.py")
+    parser.add_argument("-c", "--config", required=True, help="the benchmark config with the dataset folders and dimensions")
+    parser.add_argument("-o", "--output", default="predictor.json", help="where to save the trained model")
+    args = parser.parse_args()
+    predictor = train_from_benchmark(args.stats, args.config)
+    predictor.save(args.output)
+    for compressor_name, model in predictor.models.items():
+        print(f"{compressor_name}: trained on {model['rows']} benchmark rows")
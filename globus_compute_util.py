@@ -1,3 +1,5 @@
+import hashlib
+import inspect
 import globus_compute_sdk
 
 def list_dir(path):
@@ -6,8 +8,11 @@ def list_dir(path):
 
 def list_cpu():
     import subprocess
-    command = "lscpu"
-    return subprocess.check_output(command, shell=True).decode().strip()
+    warm_state = globals().setdefault("_OCELOT_WARM_STATE", {})
+    if "lscpu" not in warm_state:
+        command = "lscpu"
+        warm_state["lscpu"] = subprocess.check_output(command, shell=True).decode().strip()
+    return warm_state["lscpu"]
 
 def remove_files(files):
     import os
@@ -27,6 +32,80 @@ def run_command(command):
     import subprocess
     return subprocess.check_output(command, shell=True).decode().strip()
 
+# hash of this module's source, an endpoint module that differs in any way (an older install) does not match
+# and its helpers are not called resident
+with open(__file__, 'rb') as _module_source:
+    OCELOT_HELPER_VERSION = hashlib.sha256(_module_source.read()).hexdigest()[:16]
+
+def call_resident(function_name: str, *args, **kwargs):
+    # Runs a helper of the globus_compute_util module installed on the endpoint (pip install . in the Ocelot
+    # checkout). Only this shim is serialized, the module is imported once per worker and its helpers keep
+    # their warm state (open memmaps, colormaps, recent results and statistics) between calls.
+    import importlib
+    module = importlib.import_module("globus_compute_util")
+    return getattr(module, function_name)(*args, **kwargs)
+
+def helper_source(function):
+    # Source of a helper of this module followed by the module helpers it calls (directly or through other
+    # helpers), so that it can run where the module is not installed.
+    import types
+    functions, pending = [], [function]
+    while pending:
+        current = pending.pop()
+        if current in functions:
+            continue
+        functions.append(current)
+        codes = [current.__code__]
+        while codes:
+            code = codes.pop()
+            codes.extend(const for const in code.co_consts if isinstance(const, types.CodeType))
+            for name in code.co_names:
+                called = globals().get(name)
+                if inspect.isfunction(called) and called.__module__ == __name__:
+                    pending.append(called)
+    return "\n\n".join(inspect.getsource(current) for current in reversed(functions))
+
+def call_shipped(source: str, function_name: str, *args, **kwargs):
+    # Runs a helper shipped as helper_source on an endpoint without the module. The helpers are defined once
+    # per worker and source, so their warm state lasts as long as the worker keeps this shim around.
+    import hashlib
+    shipped = globals().setdefault("_OCELOT_SHIPPED", {})
+    key = hashlib.sha1(source.encode()).hexdigest()
+    if key not in shipped:
+        namespace = {"__name__": "globus_compute_util"}
+        exec(source, namespace)
+        shipped[key] = namespace
+    return shipped[key][function_name](*args, **kwargs)
+
+def get_resident_version():
+    # version of the globus_compute_util module installed on the endpoint, None when it is not installed
+    try:
+        import globus_compute_util
+    except ImportError:
+        return None
+    return getattr(globus_compute_util, "OCELOT_HELPER_VERSION", None)
+
+class ResidentExecutor:
+    # Wraps a Globus Compute Executor. Once the endpoint has the same module version installed, helpers of
+    # this module go through call_resident. Until then helpers that call other helpers are shipped together
+    # with them through call_shipped, everything else is submitted as usual.
+    def __init__(self, executor, resident=False):
+        self.executor = executor
+        self.resident = resident
+
+    def submit(self, function, *args, **kwargs):
+        if getattr(function, "__module__", None) != __name__:
+            return self.executor.submit(function, *args, **kwargs)
+        if self.resident:
+            return self.executor.submit(call_resident, function.__name__, *args, **kwargs)
+        source = helper_source(function)
+        if source != inspect.getsource(function):
+            return self.executor.submit(call_shipped, source, function.__name__, *args, **kwargs)
+        return self.executor.submit(function, *args, **kwargs)
+
+    def __getattr__(self, name):
+        return getattr(self.executor, name)
+
 
 def build_sbatch_file(job_config, command:str, work_dir:str, module_load:str=""):
     from pathlib import Path
@@ -49,60 +128,1465 @@ date
 '''
     return sbatch_file
 
-def get_partial_preview_data(dimension: str, data_file: str, layer_number: int, is_float64: bool=False):
-    import matplotlib
-    matplotlib.use('agg')
+def read_runs(flat, starts, length, sieve_elements=(1 << 20) // 8, block_elements=(64 << 20) // 8):
+    # Data sieving: runs of `length` elements at sorted offsets `starts` that are separated by less than
+    # sieve_elements are served by one large contiguous read instead of one small read each, which is
+    # what parallel file systems are good at. A single read never grows much beyond block_elements.
+    import numpy as np
+    runs = np.empty((len(starts), length), dtype=flat.dtype)
+    if len(starts) == 0:
+        return runs
+    gaps = starts[1:] - starts[:-1] - length
+    segment_ids = np.concatenate(([0], np.cumsum(gaps > sieve_elements)))
+    segment_begins = np.concatenate(([0], np.flatnonzero(np.diff(segment_ids)) + 1))
+    chunk_ids = (starts - starts[segment_begins][segment_ids]) // block_elements
+    new_group = np.ones(len(starts), dtype=bool)
+    new_group[1:] = (segment_ids[1:] != segment_ids[:-1]) | (chunk_ids[1:] != chunk_ids[:-1])
+    group_begins = np.flatnonzero(new_group)
+    group_ends = np.append(group_begins[1:], len(starts))
+    offsets = np.arange(length)
+    for begin, end in zip(group_begins, group_ends):
+        block_start = starts[begin]
+        block = np.asarray(flat[block_start:starts[end - 1] + length])
+        runs[begin:end] = block[(starts[begin:end] - block_start)[:, None] + offsets]
+    return runs
+
+def plane_count(volume_shape: tuple, axis: str):
+    # number of planes along the axis of a (layers, rows, cols) volume, 0 for an unknown axis
+    return {"xy": volume_shape[0], "xz": volume_shape[1], "yz": volume_shape[2]}.get(axis, 0)
+
+def plane_reader(flat, volume_shape: tuple, axis: str, index: int):
+    # Returns the plane shape and a function reading plane rows (with a column step) from the flat file.
+    # axis selects the plane: "xy" (index is the layer), "xz" (indexes dimension[0]) or "yz" (indexes
+    # dimension[1]). Planes that are not contiguous on disk are read with data sieving (read_runs).
+    import numpy as np
+    depth, rows, cols = volume_shape
+    if axis == "yz":
+        def read_rows(plane_rows, col_step):
+            plane_cols = np.arange(0, rows, col_step)
+            starts = (plane_rows[:, None] * (rows * cols) + plane_cols[None, :] * cols + index).ravel()
+            return read_runs(flat, starts, 1).reshape(len(plane_rows), len(plane_cols))
+        return (depth, rows), read_rows
+
+    if axis == "xz":
+        plane_shape, base, row_stride = (depth, cols), index * cols, rows * cols
+    else:
+        plane_shape, base, row_stride = (rows, cols), index * rows * cols, cols
+    def read_rows(plane_rows, col_step):
+        return read_runs(flat, base + plane_rows * row_stride, cols)[:, ::col_step]
+    return plane_shape, read_rows
+
+def projection_reader(flat, volume_shape: tuple, axis: str, reduction: str, slab_elements: int=1 << 24):
+    # The volume reduced ("max", "min" or "mean") along the axis, in the shape of plane_reader. Slabs of
+    # whole layers are streamed so memory stays at one plane and one slab, NaN/Inf values are skipped.
+    import numpy as np
+    depth, rows, cols = volume_shape
+    slab_layers = max(1, slab_elements // (rows * cols))
+    # the axis of a (layers, rows, cols) slab that is reduced, xy planes accumulate over the slabs
+    reduce_axis = {"xy": 0, "xz": 1, "yz": 2}[axis]
+    plane_shape = {"xy": (rows, cols), "xz": (depth, cols), "yz": (depth, rows)}[axis]
+    accumulated = np.full(plane_shape, np.nan if reduction != "mean" else 0.0)
+    counts = np.zeros(plane_shape, dtype=np.int64)
+    for start in range(0, depth, slab_layers):
+        stop = min(start + slab_layers, depth)
+        slab = np.asarray(flat[start * rows * cols:stop * rows * cols], dtype=np.float64).reshape(stop - start, rows, cols)
+        finite = np.isfinite(slab)
+        if reduction == "mean":
+            part = np.where(finite, slab, 0.0).sum(axis=reduce_axis)
+            part_counts = finite.sum(axis=reduce_axis)
+        else:
+            fill = -np.inf if reduction == "max" else np.inf
+            part = np.where(finite, slab, fill)
+            part = part.max(axis=reduce_axis) if reduction == "max" else part.min(axis=reduce_axis)
+            part[np.isinf(part)] = np.nan
+        target = accumulated if axis == "xy" else accumulated[start:stop]
+        if reduction == "mean":
+            target += part
+            (counts if axis == "xy" else counts[start:stop])[...] += part_counts
+        elif reduction == "max":
+            target[...] = np.fmax(target, part)
+        else:
+            target[...] = np.fmin(target, part)
+    if reduction == "mean":
+        with np.errstate(invalid='ignore', divide='ignore'):
+            accumulated = np.where(counts > 0, accumulated / counts, np.nan)
+    return plane_shape, lambda plane_rows, col_step: accumulated[plane_rows, ::col_step]
+
+def open_volume(dimension: str, data_file: str, is_float64: bool=False):
+    # The flat memmap, the (layers, rows, cols) shape and the identity (path, size, mtime, dtype, shape) of a
+    # tensor file, or None when the dimension is not 2D or 3D. A 2D tensor is a volume with a single layer.
+    # When the module is resident on the endpoint (see call_resident) recent memmaps stay open in the worker.
+    import os
     import numpy as np
+    warm_state = globals().setdefault("_OCELOT_WARM_STATE", {})
+    dimension = [int(dim) for dim in dimension.split()]
+    if len(dimension) == 2:
+        dimension = dimension + [1]
+    if len(dimension) != 3:
+        return None
+    # the layers are stored one after another, each layer is a dimension[0] x dimension[1] plane
+    volume_shape = (dimension[2], dimension[0], dimension[1])
+    data_type = np.dtype(np.float32 if not is_float64 else np.float64)
+    file_stat = os.stat(data_file)
+    identity = (os.path.abspath(data_file), file_stat.st_size, file_stat.st_mtime_ns, data_type.str, volume_shape)
+    # dicts keep insertion order, re-inserting an entry makes it the most recently used one
+    memmaps = warm_state.setdefault("memmaps", {})
+    flat = memmaps.pop(identity, None)
+    if flat is None:
+        flat = np.memmap(data_file, dtype=data_type, mode='r', shape=(int(np.prod(volume_shape)),))
+    memmaps[identity] = flat
+    while len(memmaps) > 8:
+        memmaps.pop(next(iter(memmaps)))
+    return flat, volume_shape, identity
+
+def downsample_plane(plane_shape: tuple, read_rows, out_shape: tuple, method: str, band_elements: int=1 << 24):
+    # The plane reduced to at most out_shape (rows, cols) pixels. method is "mean", "max", "min" (block
+    # reductions) or "stride". The plane is walked in bands of whole blocks so memory stays bounded.
+    import numpy as np
+    rows, cols = plane_shape
+    factor_y = max(1, -(-rows // out_shape[0]))
+    factor_x = max(1, -(-cols // out_shape[1]))
+    if method == "stride":
+        sampled_rows = np.arange(0, rows, factor_y)
+        band_rows = max(1, band_elements // cols)
+        return np.concatenate([read_rows(sampled_rows[i:i + band_rows], factor_x) for i in range(0, len(sampled_rows), band_rows)])
+    reducer = {"mean": np.add, "max": np.maximum, "min": np.minimum}[method]
+    col_starts = np.arange(0, cols, factor_x)
+    col_counts = np.diff(np.append(col_starts, cols))
+    band_rows = factor_y * max(1, band_elements // (factor_y * cols))
+    reduced_bands = []
+    for band_start in range(0, rows, band_rows):
+        band = read_rows(np.arange(band_start, min(band_start + band_rows, rows)), 1)
+        row_starts = np.arange(0, band.shape[0], factor_y)
+        dtype = np.float64 if method == "mean" else band.dtype
+        reduced = reducer.reduceat(reducer.reduceat(band, row_starts, axis=0, dtype=dtype), col_starts, axis=1, dtype=dtype)
+        if method == "mean":
+            row_counts = np.diff(np.append(row_starts, band.shape[0]))
+            reduced /= np.outer(row_counts, col_counts)
+        reduced_bands.append(reduced)
+    return np.concatenate(reduced_bands)
+
+def render_preview(layer_data, output: str="png", value_range: tuple=None):
+    # output "png" renders with matplotlib, "uint8"/"uint16" return the data quantized between data_min and
+    # data_max so that the client can colorize it without matplotlib running on the endpoint.
+    # value_range (e.g. the volume min/max from get_volume_statistics) fixes the color scale across layers.
+    import numpy as np
+    from io import BytesIO
+    warm_state = globals().setdefault("_OCELOT_WARM_STATE", {})
+    if value_range is not None:
+        data_min, data_max = float(value_range[0]), float(value_range[1])
+    else:
+        data_min, data_max = float(np.nanmin(layer_data)), float(np.nanmax(layer_data))
+    if output in ("uint8", "uint16"):
+        quantized_type = np.uint8 if output == "uint8" else np.uint16
+        levels = np.iinfo(quantized_type).max
+        scale = levels / (data_max - data_min) if data_max > data_min else 0.0
+        quantized = np.nan_to_num((layer_data - data_min) * scale, nan=0.0)
+        quantized = np.clip(np.rint(quantized), 0, levels).astype(quantized_type)
+        return (quantized, data_min, data_max)
+
     from matplotlib.figure import Figure
+    colormaps = warm_state.setdefault("colormaps", {})
+    if "rainbow" not in colormaps:
+        import matplotlib
+        matplotlib.use('agg')
+        from matplotlib import pyplot as plt
+        plt.switch_backend('agg')
+        colormaps["rainbow"] = plt.get_cmap('rainbow')
     from matplotlib import pyplot as plt
-    plt.switch_backend('agg')
+    height, width = layer_data.shape
+    fig = Figure(figsize=(width / 100, height / 100), dpi=100)
+    fig.subplots_adjust(bottom=0, top=1, left=0, right=1)
+    ax = fig.add_subplot(111)
+    ax.imshow(layer_data, cmap=colormaps["rainbow"], norm=plt.Normalize(vmin=data_min, vmax=data_max), aspect='auto', interpolation='nearest')
+    buf = BytesIO()
+    fig.savefig(buf, format='png', dpi=100)
+    return (buf, data_min, data_max)
+
+def block_entropy(plane_shape: tuple, read_rows, estimator: str, error_bound: float, block_size: int=32,
+                  band_elements: int=1 << 22, max_symbol: int=1 << 15):
+    # Float32 map of the estimated bits per value of every block_size x block_size block at the absolute
+    # error_bound: the entropy of the 2D Lorenzo prediction residuals (estimator "lorenzo") or of the
+    # quantization bins (estimator "quantization") of the values quantized with 2 * error_bound.
+    # Bands of whole block rows are quantized, predicted and histogrammed per block in one sort.
+    import numpy as np
+    rows, cols = plane_shape
+    block_cols = -(-cols // block_size)
+    band_rows = block_size * max(1, band_elements // (block_size * cols))
+    symbol_count = 2 * max_symbol + 1
+    bands = []
+    for band_start in range(0, rows, band_rows):
+        band = read_rows(np.arange(band_start, min(band_start + band_rows, rows)), 1).astype(np.float64)
+        quantized = np.rint(np.where(np.isfinite(band), band, 0.0) / (2 * error_bound)).astype(np.int64)
+        if estimator == "lorenzo":
+            residual = quantized.copy()
+            residual[1:, :] -= quantized[:-1, :]
+            residual[:, 1:] -= quantized[:, :-1]
+            residual[1:, 1:] += quantized[:-1, :-1]
+        else:
+            residual = quantized
+        block_rows = -(-band.shape[0] // block_size)
+        block_ids = ((np.arange(band.shape[0]) // block_size)[:, None] * block_cols + np.arange(band.shape[1]) // block_size).ravel()
+        # symbols out of range share one escape bin at each end
+        keys = block_ids * symbol_count + np.clip(residual.ravel(), -max_symbol, max_symbol) + max_symbol
+        unique_keys, counts = np.unique(keys, return_counts=True)
+        key_blocks = unique_keys // symbol_count
+        probability = counts / np.bincount(block_ids, minlength=block_rows * block_cols)[key_blocks]
+        entropy = np.bincount(key_blocks, weights=-probability * np.log2(probability), minlength=block_rows * block_cols)
+        bands.append(entropy.reshape(block_rows, block_cols))
+    return np.concatenate(bands).astype(np.float32)
+
+def cached_preview(cache_key: str, compute, cache_dir: str=None, cache_limit: int=512 * 1024 * 1024):
+    # The (payload, data_min, data_max) of compute() for cache_key. The last results stay in the worker and,
+    # when cache_dir is set, results are kept there as an LRU cache of at most cache_limit bytes, so a
+    # repeated preview is only a cache read. cache_key has to hold the file identity and every parameter.
+    import os
+    import hashlib
+    import numpy as np
     from io import BytesIO
-    dimension = [int(dim) for dim in dimension.split()]
-    if len(dimension) != 3: 
-        # error, this function only deals with 3D tensor
+    warm_state = globals().setdefault("_OCELOT_WARM_STATE", {})
+    # dicts keep insertion order, re-inserting an entry makes it the most recently used one
+    recent_results = warm_state.setdefault("previews", {})
+    if cache_key in recent_results:
+        recent_results[cache_key] = recent_results.pop(cache_key)
+        return recent_results[cache_key]
+
+    cache_file = None
+    if cache_dir:
+        os.makedirs(cache_dir, exist_ok=True)
+        cache_file = os.path.join(cache_dir, hashlib.sha1(cache_key.encode()).hexdigest() + ".npz")
+        if os.path.exists(cache_file):
+            try:
+                with np.load(cache_file) as cached:
+                    payload = cached["payload"]
+                    if bool(cached["png"]):
+                        payload = BytesIO(payload.tobytes())
+                    result = (payload, float(cached["data_min"]), float(cached["data_max"]))
+                # refresh the access time used for the LRU eviction
+                os.utime(cache_file)
+                return result
+            except (OSError, KeyError, ValueError):
+                pass
+
+    result = compute()
+    recent_results[cache_key] = result
+    while len(recent_results) > 32:
+        recent_results.pop(next(iter(recent_results)))
+    if cache_file is None:
+        return result
+    payload, data_min, data_max = result
+    is_png = isinstance(payload, BytesIO)
+    if is_png:
+        payload = np.frombuffer(payload.getvalue(), dtype=np.uint8)
+    try:
+        temp_file = f"{cache_file}.{os.getpid()}.tmp"
+        with open(temp_file, 'wb') as f:
+            np.savez(f, payload=payload, png=is_png, data_min=data_min, data_max=data_max)
+        os.replace(temp_file, cache_file)
+        entries = []
+        for entry in os.scandir(cache_dir):
+            if entry.name.endswith(".npz"):
+                entry_stat = entry.stat()
+                entries.append((entry_stat.st_mtime, entry_stat.st_size, entry.path))
+        total_size = sum(entry[1] for entry in entries)
+        for _, size, path in sorted(entries):
+            if total_size <= cache_limit:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            total_size -= size
+    except OSError:
+        # a full or read-only work_dir must not break the preview itself
+        pass
+    return result
+
+def get_preview_data(dimension: str, data_file: str, is_float64: bool=False, max_resolution: int=1024, method: str="mean",
+                     output: str="png", cache_dir: str=None, cache_limit: int=512 * 1024 * 1024):
+    # the whole first layer (all of a 2D tensor), reduced to at most max_resolution pixels on either axis
+    return get_partial_preview_data(dimension, data_file, 0, is_float64, (max_resolution, max_resolution), method,
+                                    output, cache_dir, cache_limit)
+
+def get_partial_preview_data(dimension: str, data_file: str, layer_number: int, is_float64: bool=False,
+                             target_shape: tuple=(400, 600), method: str="mean", output: str="png",
+                             cache_dir: str=None, cache_limit: int=512 * 1024 * 1024, axis: str="xy",
+                             value_range: tuple=None):
+    # One plane of the axis reduced on the endpoint to at most target_shape (rows, cols) pixels, so the
+    # payload scales with the viewport instead of the dataset (see downsample_plane and render_preview).
+    # Returns (payload, data_min, data_max), or (-1, -1, -1) for a plane that is not in the tensor.
+    volume = open_volume(dimension, data_file, is_float64)
+    if volume is None or layer_number < 0 or layer_number >= plane_count(volume[1], axis):
         return (-1, -1, -1)
-    
-    layer_size = dimension[0] * dimension[1]
+    flat, volume_shape, identity = volume
+    cache_key = repr(identity + ("plane", axis, layer_number, tuple(target_shape), method, output,
+                                 None if value_range is None else tuple(value_range)))
+    def compute():
+        plane_shape, read_rows = plane_reader(flat, volume_shape, axis, layer_number)
+        return render_preview(downsample_plane(plane_shape, read_rows, target_shape, method), output, value_range)
+    return cached_preview(cache_key, compute, cache_dir, cache_limit)
+
+def get_projection_preview(dimension: str, data_file: str, projection: str, is_float64: bool=False,
+                           target_shape: tuple=(400, 600), method: str="mean", output: str="png",
+                           cache_dir: str=None, cache_limit: int=512 * 1024 * 1024, axis: str="xy",
+                           value_range: tuple=None):
+    # The "max", "min" or "mean" projection of the whole depth along the axis, previewed like
+    # get_partial_preview_data.
+    volume = open_volume(dimension, data_file, is_float64)
+    if volume is None or plane_count(volume[1], axis) == 0 or projection not in ("max", "min", "mean"):
+        return (-1, -1, -1)
+    flat, volume_shape, identity = volume
+    cache_key = repr(identity + ("projection", axis, projection, tuple(target_shape), method, output,
+                                 None if value_range is None else tuple(value_range)))
+    def compute():
+        plane_shape, read_rows = projection_reader(flat, volume_shape, axis, projection)
+        return render_preview(downsample_plane(plane_shape, read_rows, target_shape, method), output, value_range)
+    return cached_preview(cache_key, compute, cache_dir, cache_limit)
+
+def get_compressibility_map(dimension: str, data_file: str, layer_number: int, estimator: str, error_bound: float,
+                            is_float64: bool=False, block_size: int=32, axis: str="xy", projection: str=None,
+                            cache_dir: str=None, cache_limit: int=512 * 1024 * 1024):
+    # The block_entropy map of one plane, or of the projection along the axis when projection is set, as
+    # (bits, min bits, max bits), or (-1, -1, -1) for invalid arguments.
+    volume = open_volume(dimension, data_file, is_float64)
+    if volume is None or estimator not in ("lorenzo", "quantization") or not error_bound or error_bound <= 0:
+        return (-1, -1, -1)
+    flat, volume_shape, identity = volume
+    if projection is None and (layer_number < 0 or layer_number >= plane_count(volume_shape, axis)):
+        return (-1, -1, -1)
+    if projection is not None and (plane_count(volume_shape, axis) == 0 or projection not in ("max", "min", "mean")):
+        return (-1, -1, -1)
+    cache_key = repr(identity + ("entropy", axis, layer_number if projection is None else projection, estimator,
+                                 error_bound, block_size))
+    def compute():
+        if projection is None:
+            plane_shape, read_rows = plane_reader(flat, volume_shape, axis, layer_number)
+        else:
+            plane_shape, read_rows = projection_reader(flat, volume_shape, axis, projection)
+        bits = block_entropy(plane_shape, read_rows, estimator, error_bound, block_size)
+        return (bits, float(bits.min()), float(bits.max()))
+    return cached_preview(cache_key, compute, cache_dir, cache_limit)
+
+def get_volume_statistics(dimension: str, data_file: str, is_float64: bool=False, bins: int=256, chunk_elements: int=1 << 22,
+                          sidecar_dir: str=None, scan: bool=True):
+    # Single pass over the whole file in chunks of chunk_elements values, so memory stays bounded for any
+    # file size. Per-layer min/max/mean/std/NaN counts are merged per chunk and give the volume statistics,
+    # and the fixed-size histogram keeps covering the values seen so far by doubling its bin width (and
+    # merging bin pairs) whenever a chunk falls outside.
+    # The result is saved as a small sidecar next to the data file (or in sidecar_dir when that is not
+    # writable) and later calls return the sidecar without scanning. With scan=False only a sidecar is read.
+    import os
+    import numpy as np
+    warm_state = globals().setdefault("_OCELOT_WARM_STATE", {})
+    dimension = [int(dim) for dim in dimension.split()]
     data_type = np.float32 if not is_float64 else np.float64
-    
-    with open(data_file, 'rb') as f:
-        f.seek(layer_number * layer_size * np.dtype(data_type).itemsize)
-        layer_data = np.fromfile(f, dtype=data_type, count=layer_size)
-        layer_data = layer_data.reshape(dimension[0], dimension[1])
+    bins = max(2, bins + bins % 2)
+    num_elements = int(np.prod(dimension))
+    layer_size = int(np.prod(dimension[:2]))
+    num_layers = num_elements // layer_size
 
-    fig = Figure(dpi=100)
-    fig.subplots_adjust(bottom=0, top=1, left=0, right=1)
-    ax = fig.add_subplot(111)
-    data_min, data_max = np.min(layer_data), np.max(layer_data)
-    ax.imshow(layer_data, cmap=plt.get_cmap('rainbow'), norm=plt.Normalize(vmin=data_min, vmax=data_max), aspect='auto')
-    buf = BytesIO()
-    fig.savefig(buf, format='png')
+    file_stat = os.stat(data_file)
+    identity = np.array([file_stat.st_size, file_stat.st_mtime_ns, np.dtype(data_type).itemsize, bins] + dimension, dtype=np.int64)
+    warm_key = (os.path.abspath(data_file),) + tuple(identity.tolist())
+    statistics = warm_state.setdefault("statistics", {})
+    if warm_key in statistics:
+        statistics[warm_key] = statistics.pop(warm_key)
+        return statistics[warm_key]
+    while len(statistics) >= 16:
+        statistics.pop(next(iter(statistics)))
+    sidecar_name = os.path.basename(data_file) + ".ocelot-stats.npz"
+    sidecar_candidates = [os.path.join(os.path.dirname(os.path.abspath(data_file)), sidecar_name)]
+    if sidecar_dir:
+        sidecar_candidates.append(os.path.join(sidecar_dir, sidecar_name))
+    for sidecar in sidecar_candidates:
+        try:
+            with np.load(sidecar) as cached:
+                if np.array_equal(cached["identity"], identity):
+                    result = {key: cached[key] for key in cached.files if key != "identity"}
+                    for key in ("min", "max", "mean", "std", "count", "nan_count"):
+                        result[key] = result[key].item()
+                    result["sidecar"] = sidecar
+                    statistics[warm_key] = result
+                    return result
+        except (OSError, KeyError, ValueError):
+            continue
+    if not scan:
+        return None
 
-    return (buf, data_min, data_max)
+    layer_count = np.zeros(num_layers, dtype=np.int64)
+    layer_mean = np.zeros(num_layers)
+    layer_m2 = np.zeros(num_layers)
+    layer_min = np.full(num_layers, np.inf)
+    layer_max = np.full(num_layers, -np.inf)
+    layer_nan = np.zeros(num_layers, dtype=np.int64)
+    hist_low, bin_width, histogram = None, None, np.zeros(bins, dtype=np.int64)
+
+    flat = np.memmap(data_file, dtype=data_type, mode='r', shape=(num_elements,))
+    # a chunk is either a group of whole layers or a part of a single layer
+    if layer_size <= chunk_elements:
+        layers_per_chunk = chunk_elements // layer_size
+        chunks = [(start * layer_size, min(start + layers_per_chunk, num_layers) * layer_size, start)
+                  for start in range(0, num_layers, layers_per_chunk)]
+    else:
+        chunks = [(layer * layer_size + offset, layer * layer_size + min(offset + chunk_elements, layer_size), layer)
+                  for layer in range(num_layers) for offset in range(0, layer_size, chunk_elements)]
+    for chunk_start, chunk_stop, first_layer in chunks:
+        chunk = np.asarray(flat[chunk_start:chunk_stop], dtype=np.float64)
+        rows = chunk.reshape(-1, layer_size) if layer_size <= chunk_elements else chunk.reshape(1, -1)
+        layers = np.arange(first_layer, first_layer + rows.shape[0])
 
+        finite = np.isfinite(rows)
+        count = finite.sum(axis=1)
+        layer_nan[layers] += rows.shape[1] - count
+        has_values = count > 0
+        if not has_values.any():
+            continue
+        values = np.where(finite, rows, 0.0)
+        mean = values.sum(axis=1) / np.maximum(count, 1)
+        m2 = np.square(np.where(finite, rows - mean[:, None], 0.0)).sum(axis=1)
+        layer_min[layers] = np.minimum(layer_min[layers], np.where(finite, rows, np.inf).min(axis=1))
+        layer_max[layers] = np.maximum(layer_max[layers], np.where(finite, rows, -np.inf).max(axis=1))
+        # Chan et al. parallel merge of mean and sum of squared deviations
+        total = layer_count[layers] + count
+        delta = mean - layer_mean[layers]
+        safe_total = np.maximum(total, 1)
+        layer_mean[layers] += delta * count / safe_total
+        layer_m2[layers] += m2 + delta * delta * layer_count[layers] * count / safe_total
+        layer_count[layers] = total
 
+        finite_values = rows[finite]
+        chunk_min, chunk_max = float(finite_values.min()), float(finite_values.max())
+        if hist_low is None:
+            hist_low = chunk_min
+            bin_width = (chunk_max - chunk_min) / bins if chunk_max > chunk_min else max(abs(chunk_min), 1.0) * 1e-6
+        # the top edge is inclusive, values on it are clipped into the last bin
+        while chunk_min < hist_low or chunk_max > hist_low + bins * bin_width:
+            merged = histogram.reshape(bins // 2, 2).sum(axis=1)
+            if chunk_min < hist_low:
+                histogram = np.concatenate((np.zeros(bins // 2, dtype=np.int64), merged))
+                hist_low -= bins * bin_width
+            else:
+                histogram = np.concatenate((merged, np.zeros(bins // 2, dtype=np.int64)))
+            bin_width *= 2
+        bin_index = np.minimum(((finite_values - hist_low) / bin_width).astype(np.int64), bins - 1)
+        histogram += np.bincount(bin_index, minlength=bins)
+    del flat
 
-def get_preview_data(dimension: str, data_file: str, is_float64:bool=False):
-    import matplotlib
-    matplotlib.use('agg')
+    total_count = int(layer_count.sum())
+    if total_count == 0:
+        return None
+    mean = float((layer_count * layer_mean).sum() / total_count)
+    m2 = float(layer_m2.sum() + (layer_count * np.square(layer_mean - mean)).sum())
+    result = {
+        "min": float(layer_min.min()),
+        "max": float(layer_max.max()),
+        "mean": mean,
+        "std": float(np.sqrt(m2 / total_count)),
+        "count": total_count,
+        "nan_count": int(layer_nan.sum()),
+        "histogram": histogram,
+        "bin_edges": hist_low + np.arange(bins + 1) * bin_width,
+        "layer_min": layer_min,
+        "layer_max": layer_max,
+        "layer_mean": layer_mean,
+        "layer_std": np.sqrt(layer_m2 / np.maximum(layer_count, 1)),
+        "layer_nan_count": layer_nan,
+    }
+    for sidecar in sidecar_candidates:
+        try:
+            os.makedirs(os.path.dirname(sidecar), exist_ok=True)
+            temp_file = f"{sidecar}.{os.getpid()}.tmp"
+            with open(temp_file, 'wb') as f:
+                np.savez(f, identity=identity, **result)
+            os.replace(temp_file, sidecar)
+            result["sidecar"] = sidecar
+            break
+        except OSError:
+            continue
+    statistics[warm_key] = result
+    return result
+
+def get_thumbnails(dimension: str, data_dir: str, filenames: list, is_float64: bool=False, thumbnail_shape: tuple=(96, 144),
+                   known: dict=None, workers: int=None):
+    # One call renders a small strided uint8 thumbnail of the middle XY layer of every file, so browsing a
+    # directory costs one round trip. known maps file names to the (size, mtime_ns) identity the client has
+    # cached, those files are not read again and come back without a thumbnail.
+    # The files are rendered by a thread pool, memmap reads and numpy release the GIL and nested functions
+    # cannot be pickled for a process pool when this function is shipped as source.
+    import os
     import numpy as np
-    from matplotlib.figure import Figure
-    from matplotlib import pyplot as plt
-    plt.switch_backend('agg')
-    from io import BytesIO
+    from concurrent.futures import ThreadPoolExecutor
     dimension = [int(dim) for dim in dimension.split()]
+    if len(dimension) == 2:
+        dimension = dimension + [1]
     data_type = np.float32 if not is_float64 else np.float64
+    volume_shape = (dimension[2], dimension[0], dimension[1])
+    expected_size = int(np.prod(volume_shape)) * np.dtype(data_type).itemsize
+    known = known or {}
 
-    with open(data_file, 'rb') as f:
-        data = np.fromfile(f,dtype=data_type)
-        data = np.reshape(data, dimension)
+    def render(filename):
+        path = os.path.join(data_dir, filename)
+        try:
+            file_stat = os.stat(path)
+        except OSError as e:
+            return {"identity": None, "error": str(e)}
+        identity = (file_stat.st_size, file_stat.st_mtime_ns)
+        if tuple(known.get(filename, ())) == identity:
+            return {"identity": identity, "thumbnail": None}
+        if file_stat.st_size != expected_size:
+            return {"identity": identity, "error": f"size {file_stat.st_size} does not match the dimension"}
+        rows = np.unique(np.linspace(0, volume_shape[1] - 1, min(thumbnail_shape[0], volume_shape[1])).astype(np.int64))
+        cols = np.unique(np.linspace(0, volume_shape[2] - 1, min(thumbnail_shape[1], volume_shape[2])).astype(np.int64))
+        try:
+            volume = np.memmap(path, dtype=data_type, mode='r', shape=volume_shape)
+            # only the sampled rows of the middle layer are read
+            plane = np.asarray(volume[volume_shape[0] // 2][rows], dtype=np.float64)[:, cols]
+            del volume
+        except (OSError, ValueError) as e:
+            return {"identity": identity, "error": str(e)}
+        finite = np.isfinite(plane)
+        if not finite.any():
+            return {"identity": identity, "error": "no finite values"}
+        data_min, data_max = float(plane[finite].min()), float(plane[finite].max())
+        scale = 255 / (data_max - data_min) if data_max > data_min else 0.0
+        thumbnail = np.rint(np.clip((np.where(finite, plane, data_min) - data_min) * scale, 0, 255)).astype(np.uint8)
+        return {"identity": identity, "thumbnail": thumbnail, "min": data_min, "max": data_max}
 
-    fig = Figure(dpi=100)
-    fig.subplots_adjust(bottom=0, top=1, left=0, right=1)
-    ax = fig.add_subplot(111)
-    data_min, data_max = np.min(data), np.max(data)
-    ax.imshow(data, cmap=plt.get_cmap('rainbow'), norm=plt.Normalize(vmin=data_min, vmax=data_max), aspect='auto')
-    buf = BytesIO()
-    fig.savefig(buf, format='png')
+    workers = workers or min(8, os.cpu_count() or 1)
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        return dict(zip(filenames, pool.map(render, filenames)))
 
-    return (buf, data_min, data_max)
\ No newline at end of file
+def trial_compression(dimension: str, data_file: str, compress_command: str, decompress_command: str, error_bound,
+                      work_dir: str, is_float64: bool=False, sample_layers: int=4, preview_shape: tuple=(400, 600)):
+    # Compresses and decompresses a few evenly spaced XY layers of the file with the real compressor, so bad
+    # settings show up in seconds. The commands contain {input}, {compressed}, {decompressed} and {eb}
+    # placeholders and are built by CompressorCmdFactory for the sample dimension "d0 d1 sample_layers".
+    # Returns the ratio, throughputs and errors of the sample and strided uint8 previews of its middle layer
+    # before and after compression on the same scale, or {"error": message}.
+    import os
+    import time
+    import uuid
+    import subprocess
+    import numpy as np
+    dimension = [int(dim) for dim in dimension.split()]
+    if len(dimension) == 2:
+        dimension = dimension + [1]
+    data_type = np.float32 if not is_float64 else np.float64
+    volume = np.memmap(data_file, dtype=data_type, mode='r', shape=(dimension[2], dimension[0], dimension[1]))
+    layers = np.unique(np.linspace(0, dimension[2] - 1, max(1, min(sample_layers, dimension[2]))).round().astype(np.int64))
+    sample = np.ascontiguousarray(volume[layers])
+    del volume
+
+    trial_dir = os.path.join(work_dir, ".ocelot_cache", "trials")
+    os.makedirs(trial_dir, exist_ok=True)
+    name = os.path.join(trial_dir, f"{os.path.basename(data_file)}.{uuid.uuid4().hex}")
+    paths = {"input": name + ".sample", "compressed": name + ".sample.cmp", "decompressed": name + ".sample.out", "eb": error_bound}
+    try:
+        sample.tofile(paths["input"])
+        start = time.perf_counter()
+        subprocess.run(compress_command.format(**paths), shell=True, check=True, capture_output=True)
+        compress_time = time.perf_counter() - start
+        start = time.perf_counter()
+        subprocess.run(decompress_command.format(**paths), shell=True, check=True, capture_output=True)
+        decompress_time = time.perf_counter() - start
+        compressed_size = os.path.getsize(paths["compressed"])
+        decompressed = np.fromfile(paths["decompressed"], dtype=data_type)
+    except subprocess.CalledProcessError as e:
+        return {"error": f"{e.cmd} failed: {e.stderr.decode(errors='replace').strip()}"}
+    except OSError as e:
+        return {"error": str(e)}
+    finally:
+        for path in (paths["input"], paths["compressed"], paths["decompressed"]):
+            if os.path.exists(path):
+                os.remove(path)
+    if decompressed.size != sample.size:
+        return {"error": f"decompressed {decompressed.size} values instead of {sample.size}"}
+    decompressed = decompressed.reshape(sample.shape)
+
+    finite = np.isfinite(sample)
+    original_values = sample[finite].astype(np.float64)
+    difference = np.abs(decompressed[finite].astype(np.float64) - original_values)
+    data_min, data_max = float(original_values.min()), float(original_values.max())
+    value_range = data_max - data_min
+    mse = float(np.mean(difference ** 2))
+    sample_bytes = sample.nbytes
+
+    def preview(layer):
+        # strided preview on the scale of the original sample
+        step_y = max(1, -(-layer.shape[0] // preview_shape[0]))
+        step_x = max(1, -(-layer.shape[1] // preview_shape[1]))
+        scale = 255 / value_range if value_range > 0 else 0.0
+        values = np.nan_to_num((layer[::step_y, ::step_x].astype(np.float64) - data_min) * scale, nan=0.0)
+        return np.clip(np.rint(values), 0, 255).astype(np.uint8)
+
+    middle = len(layers) // 2
+    return {
+        "layers": layers.tolist(),
+        "ratio": sample_bytes / max(compressed_size, 1),
+        "compress_time": compress_time,
+        "decompress_time": decompress_time,
+        "compress_throughput": sample_bytes / 1e6 / max(compress_time, 1e-9),
+        "decompress_throughput": sample_bytes / 1e6 / max(decompress_time, 1e-9),
+        "max_error": float(difference.max()),
+        "rmse": float(np.sqrt(mse)),
+        "psnr": float(20 * np.log10(value_range) - 10 * np.log10(mse)) if mse > 0 and value_range > 0 else float("inf"),
+        "value_range": value_range,
+        "original": preview(sample[middle]),
+        "decompressed": preview(decompressed[middle]),
+        "min": data_min,
+        "max": data_max,
+    }
+
+def search_error_bound(dimension: str, data_file: str, compress_command: str, decompress_command: str, target: str,
+                       target_value: float, work_dir: str, is_float64: bool=False, eb_mode: str="ABS", sample_layers: int=4,
+                       max_trials: int=8, tolerance: float=None, probes: dict=None):
+    # Finds the error bound that just meets a target on the sampled layers of trial_compression: the smallest
+    # bound with a compression ratio >= target_value (target "ratio") or the largest bound with a PSNR >=
+    # target_value dB (target "psnr"). The bracket is found in decades and then bisected in log space, each
+    # step interpolated between the bracketing probes. The search stops early once a probe meets the target
+    # within tolerance (relative for the ratio, dB for the PSNR) or the bracket is narrower than 3 significant
+    # digits. probes maps error bounds to results of earlier searches with the same commands and sample, they
+    # are not compressed again. Returns the bound, its probe, all probes and the number of new trials.
+    import os
+    import time
+    import uuid
+    import math
+    import subprocess
+    import numpy as np
+    dimension = [int(dim) for dim in dimension.split()]
+    if len(dimension) == 2:
+        dimension = dimension + [1]
+    data_type = np.float32 if not is_float64 else np.float64
+    volume = np.memmap(data_file, dtype=data_type, mode='r', shape=(dimension[2], dimension[0], dimension[1]))
+    layers = np.unique(np.linspace(0, dimension[2] - 1, max(1, min(sample_layers, dimension[2]))).round().astype(np.int64))
+    sample = np.ascontiguousarray(volume[layers])
+    del volume
+    finite = np.isfinite(sample)
+    original_values = sample[finite].astype(np.float64)
+    if original_values.size == 0:
+        return {"error": "the sampled layers contain no finite value"}
+    value_range = float(original_values.max() - original_values.min())
+    # REL bounds are relative to the value range already, the search works on the relative bound
+    scale = 1.0 if eb_mode == "REL" else (value_range if value_range > 0 else 1.0)
+    if tolerance is None:
+        tolerance = 0.05 if target == "ratio" else 0.5
+    probes = dict(probes or {})
+
+    trial_dir = os.path.join(work_dir, ".ocelot_cache", "trials")
+    os.makedirs(trial_dir, exist_ok=True)
+    name = os.path.join(trial_dir, f"{os.path.basename(data_file)}.{uuid.uuid4().hex}")
+    paths = {"input": name + ".sample", "compressed": name + ".sample.cmp", "decompressed": name + ".sample.out"}
+
+    def probe(error_bound):
+        start = time.perf_counter()
+        subprocess.run(compress_command.format(eb=error_bound, **paths), shell=True, check=True, capture_output=True)
+        compress_time = time.perf_counter() - start
+        subprocess.run(decompress_command.format(eb=error_bound, **paths), shell=True, check=True, capture_output=True)
+        decompressed = np.fromfile(paths["decompressed"], dtype=data_type)
+        if decompressed.size != sample.size:
+            raise ValueError(f"decompressed {decompressed.size} values instead of {sample.size}")
+        difference = decompressed.reshape(sample.shape)[finite].astype(np.float64) - original_values
+        mse = float(np.mean(difference ** 2))
+        return {
+            "ratio": sample.nbytes / max(os.path.getsize(paths["compressed"]), 1),
+            "psnr": float(20 * np.log10(value_range) - 10 * np.log10(mse)) if mse > 0 and value_range > 0 else float("inf"),
+            "max_error": float(np.abs(difference).max()),
+            "compress_time": compress_time,
+        }
+
+    def good(result):
+        return result[target] >= target_value
+
+    def metric(result):
+        # both are close to linear in the log of the error bound
+        return math.log(result["ratio"]) if target == "ratio" else min(result["psnr"], 400.0)
+
+    def snap(relative_bound):
+        return float(f"{min(max(relative_bound, 1e-12), 1.0) * scale:.3g}")
+
+    increasing = target == "ratio" # a larger bound gives a larger ratio and a smaller PSNR
+    if target == "psnr":
+        # errors uniform in [-eb, eb] give PSNR = 20 log10(range / eb) + 4.77 dB, so eb / range is the relative
+        # bound, snap scales it by the range only in ABS mode
+        error_bound = snap(10 ** (-(target_value - 4.77) / 20))
+    else:
+        error_bound = snap(1e-3)
+    good_bound, bad_bound = None, None
+    trials = 0
+    converged = False
+    try:
+        sample.tofile(paths["input"])
+        for _ in range(3 * max_trials):
+            if error_bound not in probes:
+                if trials >= max_trials:
+                    break
+                probes[error_bound] = probe(error_bound)
+                trials += 1
+            result = probes[error_bound]
+            if good(result):
+                if good_bound is None or (error_bound < good_bound) == increasing:
+                    good_bound = error_bound
+                close = result["ratio"] <= target_value * (1 + tolerance) if target == "ratio" else result["psnr"] <= target_value + tolerance
+                if close:
+                    converged = True
+                    break
+            elif bad_bound is None or (error_bound > bad_bound) == increasing:
+                bad_bound = error_bound
+            if good_bound is None:
+                step = 10.0 if increasing else 0.1
+                next_bound = snap(bad_bound * step / scale)
+            elif bad_bound is None:
+                step = 0.1 if increasing else 10.0
+                next_bound = snap(good_bound * step / scale)
+            else:
+                good_metric, bad_metric = metric(probes[good_bound]), metric(probes[bad_bound])
+                target_metric = math.log(target_value) if target == "ratio" else target_value
+                fraction = (target_metric - good_metric) / (bad_metric - good_metric) if bad_metric != good_metric else 0.5
+                fraction = min(max(fraction, 0.1), 0.9)
+                log_bound = math.log(good_bound) + fraction * (math.log(bad_bound) - math.log(good_bound))
+                next_bound = snap(math.exp(log_bound) / scale)
+            if next_bound in (good_bound, bad_bound, error_bound):
+                # the bracket is resolved to 3 significant digits or the bound hit its limits
+                converged = good_bound is not None and bad_bound is not None
+                break
+            error_bound = next_bound
+    except subprocess.CalledProcessError as e:
+        return {"error": f"{e.cmd} failed: {e.stderr.decode(errors='replace').strip()}", "probes": probes}
+    except (OSError, ValueError) as e:
+        return {"error": str(e), "probes": probes}
+    finally:
+        for path in paths.values():
+            if os.path.exists(path):
+                os.remove(path)
+    return {
+        "error_bound": good_bound,
+        "result": probes[good_bound] if good_bound is not None else None,
+        "probes": probes,
+        "trials": trials,
+        "converged": converged,
+        "value_range": value_range,
+        "layers": layers.tolist(),
+    }
+
+def get_compression_features(dimension: str, data_file: str, error_bound: float, is_float64: bool=False,
+                             sample_blocks: int=64, block_size: int=32, value_range: tuple=None, seed: int=0):
+    # Features of the compressibility of a file at an absolute error bound, computed on randomly sampled
+    # block_size cubes (squares for 2D data) so the cost does not depend on the file size:
+    # min/max/valueRange (or the given value_range), avg_lorenzo (mean absolute Lorenzo prediction error),
+    # p0 (share of zero quantized Lorenzo residuals), quant_entropy (entropy of those residuals) and
+    # entropy (entropy of the quantization bins). Used by compression_predictor.CompressionPredictor.
+    import numpy as np
+    dimension = [int(dim) for dim in dimension.split()]
+    data_type = np.float32 if not is_float64 else np.float64
+    if len(dimension) == 2:
+        dimension = dimension + [1]
+    volume = np.memmap(data_file, dtype=data_type, mode='r', shape=(dimension[2], dimension[0], dimension[1]))
+    block = [min(block_size, length) for length in volume.shape]
+    rng = np.random.default_rng(seed)
+    origins = np.stack([rng.integers(0, length - size + 1, sample_blocks) for length, size in zip(volume.shape, block)], axis=1)
+    blocks = np.stack([volume[z:z + block[0], y:y + block[1], x:x + block[2]] for z, y, x in origins]).astype(np.float64)
+    del volume
+    blocks = np.where(np.isfinite(blocks), blocks, 0.0)
+
+    def lorenzo(values):
+        # 3D Lorenzo prediction error inside every block, values outside a block count as zero
+        padded = np.pad(values, ((0, 0), (1, 0), (1, 0), (1, 0)))
+        return (padded[:, 1:, 1:, 1:] - padded[:, :-1, 1:, 1:] - padded[:, 1:, :-1, 1:] - padded[:, 1:, 1:, :-1]
+                + padded[:, :-1, :-1, 1:] + padded[:, :-1, 1:, :-1] + padded[:, 1:, :-1, :-1] - padded[:, :-1, :-1, :-1])
+
+    def entropy(symbols):
+        _, counts = np.unique(symbols, return_counts=True)
+        probability = counts / counts.sum()
+        return float(-(probability * np.log2(probability)).sum())
+
+    quantized = np.rint(blocks / (2 * error_bound)).astype(np.int64)
+    residual = lorenzo(quantized)
+    data_min, data_max = (float(blocks.min()), float(blocks.max())) if value_range is None else (float(value_range[0]), float(value_range[1]))
+    return {
+        "min": data_min,
+        "max": data_max,
+        "valueRange": data_max - data_min,
+        "avg_lorenzo": float(np.abs(lorenzo(blocks)).mean()),
+        "p0": float(np.mean(residual == 0)),
+        "quant_entropy": entropy(residual),
+        "entropy": entropy(quantized),
+        "error_bound": float(error_bound),
+        "itemsize": np.dtype(data_type).itemsize,
+    }
+
+def verify_decompression(dimension: str, original_file: str, decompressed_file: str, error_bound: float, eb_mode: str="ABS",
+                         is_float64: bool=False, value_range: tuple=None, chunk_elements: int=1 << 22, workers: int=None,
+                         report_file: str=None, regions: list=None, ranges: list=None, layer_range: tuple=None):
+    # Checks that a decompressed file honors the error bound, streaming both files through memmap slabs of
+    # chunk_elements values on a thread pool so the memory stays bounded for any file size. REL bounds are
+    # relative to value_range, which costs an extra min/max pass when it is not given. ABS_AND_REL checks
+    # against min(error_bound, error_bound * value_range), like sz3 given the one value the client passes for
+    # both bounds. Other modes are rejected. The output of a batch
+    # job is checked once the job is done (after_job in pyqt5app). Returns the max absolute error, RMSE, PSNR,
+    # range-relative error, the number of values beyond the bound (with a float rounding slack) and of NaN/Inf
+    # mismatches, and saves them as JSON to report_file ("save_error" tells why that failed).
+    # Returns {"error": message} when a file is unusable.
+    # SZ_REGION outputs pass their regions as (start_x, start_y, length_x, length_y, eb) rectangles of every
+    # XY layer or their ranges as (low, high, eb) of the original values, with absolute bounds. Every value
+    # is then checked against the tightest bound that covers it (error_bound outside of all of them) and the
+    # report gets the errors of every region or range and of the "default" rest, from the same pass.
+    # layer_range (start, stop) limits the check to the XY layers that a partial decompression filled.
+    import os
+    import json
+    import time
+    import numpy as np
+    from concurrent.futures import ThreadPoolExecutor
+    start_time = time.perf_counter()
+    dimension = [int(dim) for dim in dimension.split()]
+    if len(dimension) == 2:
+        dimension = dimension + [1]
+    data_type = np.dtype(np.float32 if not is_float64 else np.float64)
+    elements = int(np.prod(dimension))
+    if eb_mode not in ("ABS", "REL", "ABS_AND_REL"):
+        return {"error": f"{eb_mode} error bounds are not verified"}
+    for path in (original_file, decompressed_file):
+        if not os.path.exists(path):
+            return {"error": f"{path} does not exist"}
+        if os.path.getsize(path) != elements * data_type.itemsize:
+            return {"error": f"{path} has {os.path.getsize(path)} bytes instead of {elements * data_type.itemsize} for {dimension}"}
+    original = np.memmap(original_file, dtype=data_type, mode='r', shape=(elements,))
+    decompressed = np.memmap(decompressed_file, dtype=data_type, mode='r', shape=(elements,))
+    # slabs are whole layers or parts of one layer, so the region masks of a layer line up with every slab
+    layer_size = dimension[0] * dimension[1]
+    first_element, last_element = (0, elements) if layer_range is None else (layer_range[0] * layer_size, layer_range[1] * layer_size)
+    if layer_size <= chunk_elements:
+        step = chunk_elements // layer_size * layer_size
+        slabs = [(start, min(start + step, last_element)) for start in range(first_element, last_element, step)]
+    else:
+        slabs = [(layer_start + start, layer_start + min(start + chunk_elements, layer_size))
+                 for layer_start in range(first_element, last_element, layer_size) for start in range(0, layer_size, chunk_elements)]
+    workers = workers or min(8, os.cpu_count() or 1)
+    groups = []
+    for start_x, start_y, length_x, length_y, eb in regions or []:
+        mask = np.zeros((dimension[0], dimension[1]), dtype=bool)
+        mask[start_y:start_y + length_y, start_x:start_x + length_x] = True
+        groups.append({"region": [start_x, start_y, length_x, length_y], "eb": float(eb), "mask": mask.ravel()})
+    for low, high, eb in ranges or []:
+        groups.append({"range": [float(low), float(high)], "eb": float(eb)})
+
+    def slab_range(slab):
+        values = original[slab[0]:slab[1]]
+        values = values[np.isfinite(values)]
+        return (float(values.min()), float(values.max())) if values.size > 0 else (np.inf, -np.inf)
+
+    def slab_errors(slab):
+        # rows of the slab are layers (or one part of a layer) so region masks broadcast over them
+        width = min(slab[1] - slab[0], layer_size)
+        offset = slab[0] % layer_size
+        a = original[slab[0]:slab[1]].astype(np.float64).reshape(-1, width)
+        b = decompressed[slab[0]:slab[1]].astype(np.float64).reshape(-1, width)
+        finite_a, finite_b = np.isfinite(a), np.isfinite(b)
+        both = finite_a & finite_b
+        difference = np.abs(b - a)
+        if not both.all():
+            difference[~both] = 0.0
+        # rounding the reconstruction to the data type may add up to one ulp of the value
+        slack = np.abs(a) * np.finfo(data_type).eps
+        group_results = []
+        if len(groups) > 0:
+            value_bound = np.full(a.shape, np.inf)
+            covered = np.zeros(a.shape, dtype=bool)
+            for group in groups:
+                if "mask" in group:
+                    mask = np.broadcast_to(group["mask"][offset:offset + width], a.shape)
+                else:
+                    mask = (a >= group["range"][0]) & (a <= group["range"][1])
+                np.minimum(value_bound, group["eb"], out=value_bound, where=mask)
+                covered |= mask
+                masked = np.where(mask, difference, 0.0)
+                group_results.append((int(np.count_nonzero(mask & both)), float(masked.max()), float(np.vdot(masked, masked)),
+                                      int(np.count_nonzero(masked > group["eb"] + slack))))
+            value_bound[~covered] = bound
+            masked = np.where(covered, 0.0, difference)
+            group_results.append((int(np.count_nonzero(~covered & both)), float(masked.max()), float(np.vdot(masked, masked)),
+                                  int(np.count_nonzero(masked > bound + slack))))
+        else:
+            value_bound = bound
+        violated = (difference > value_bound + slack).ravel()
+        violations = int(np.count_nonzero(violated))
+        finite_values = a[finite_a] if not finite_a.all() else a
+        return {
+            "groups": group_results,
+            "count": int(np.count_nonzero(both)),
+            "max_error": float(difference.max()),
+            "squared_error": float(np.vdot(difference, difference)),
+            "violations": violations,
+            "first_violation": slab[0] + int(np.argmax(violated)) if violations > 0 else None,
+            "nan_mismatch": int(np.count_nonzero(finite_a != finite_b)),
+            "min": float(finite_values.min()) if finite_values.size > 0 else np.inf,
+            "max": float(finite_values.max()) if finite_values.size > 0 else -np.inf,
+        }
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        if value_range is None and eb_mode != "ABS":
+            slab_ranges = list(pool.map(slab_range, slabs))
+            value_range = (min(r[0] for r in slab_ranges), max(r[1] for r in slab_ranges))
+        data_range = float(value_range[1] - value_range[0]) if value_range is not None else None
+        if eb_mode == "ABS":
+            bound = float(error_bound)
+        elif eb_mode == "REL":
+            bound = float(error_bound) * data_range
+        else:
+            bound = min(float(error_bound), float(error_bound) * data_range)
+        results = list(pool.map(slab_errors, slabs))
+    del original, decompressed
+    if data_range is None:
+        data_range = max(r["max"] for r in results) - min(r["min"] for r in results)
+    count = sum(r["count"] for r in results)
+    max_error = max(r["max_error"] for r in results)
+    mse = sum(r["squared_error"] for r in results) / max(count, 1)
+    violations = sum(r["violations"] for r in results)
+    first_violation = next((r["first_violation"] for r in results if r["first_violation"] is not None), None)
+    if len(groups) > 0:
+        group_reports = []
+        for index, group in enumerate(groups + [{"default": True, "eb": bound}]):
+            group_count = sum(r["groups"][index][0] for r in results)
+            group_report = {key: value for key, value in group.items() if key != "mask"}
+            group_report.update({
+                "count": group_count,
+                "max_error": max(r["groups"][index][1] for r in results),
+                "rmse": float(np.sqrt(sum(r["groups"][index][2] for r in results) / max(group_count, 1))),
+                "violations": sum(r["groups"][index][3] for r in results),
+            })
+            group_reports.append(group_report)
+    elapsed = time.perf_counter() - start_time
+    report = {
+        "original": original_file,
+        "decompressed": decompressed_file,
+        "error_bound": float(error_bound),
+        "eb_mode": eb_mode,
+        "layer_range": None if layer_range is None else [int(layer_range[0]), int(layer_range[1])],
+        "absolute_bound": bound,
+        "count": count,
+        "max_error": max_error,
+        "rmse": float(np.sqrt(mse)),
+        "psnr": float(20 * np.log10(data_range) - 10 * np.log10(mse)) if mse > 0 and data_range > 0 else float("inf"),
+        "value_range": data_range,
+        "max_relative_error": max_error / data_range if data_range > 0 else float("inf"),
+        "violations": violations,
+        "violation_ratio": violations / max(count, 1),
+        # (layer, row, col) of the first value beyond the bound
+        "first_violation": None if first_violation is None else [first_violation // layer_size, first_violation % layer_size // dimension[1], first_violation % dimension[1]],
+        "nan_mismatch": sum(r["nan_mismatch"] for r in results),
+        "elapsed": elapsed,
+        "throughput": 2 * (last_element - first_element) * data_type.itemsize / 1e6 / max(elapsed, 1e-9),
+    }
+    if len(groups) > 0:
+        report["groups"] = group_reports
+    if report_file is not None:
+        try:
+            with open(report_file, 'w') as f:
+                json.dump(report, f, indent=2)
+            report["report"] = report_file
+        except OSError as e:
+            report["save_error"] = str(e)
+    return report
+
+def get_error_map(dimension: str, original_file: str, decompressed_file: str, layer_number: int, is_float64: bool=False,
+                  target_shape: tuple=(400, 600), axis: str="xy", signed: bool=False):
+    # Error of the decompressed file on one plane, reduced to at most target_shape pixels by keeping the
+    # largest error of every block, so a single bad value still shows up. signed keeps the sign of that
+    # error. Values that are finite in only one of the files count as the largest error of the plane.
+    # Returns the map quantized to uint8 (0 error is 0, or 128 when signed), the scale of the largest error
+    # and the max error, RMSE and NaN/Inf mismatches of the full plane, or {"error": message}.
+    import os
+    import numpy as np
+    dimension = [int(dim) for dim in dimension.split()]
+    if len(dimension) == 2:
+        dimension = dimension + [1]
+    data_type = np.dtype(np.float32 if not is_float64 else np.float64)
+    shape = (dimension[2], dimension[0], dimension[1])
+    for path in (original_file, decompressed_file):
+        if not os.path.exists(path):
+            return {"error": f"{path} does not exist"}
+        if os.path.getsize(path) != int(np.prod(shape)) * data_type.itemsize:
+            return {"error": f"{path} has {os.path.getsize(path)} bytes instead of {int(np.prod(shape)) * data_type.itemsize} for {dimension}"}
+
+    if layer_number < 0 or layer_number >= plane_count(shape, axis):
+        return {"error": f"plane {layer_number} is not in the {axis} axis of {dimension}"}
+    planes = []
+    for path in (original_file, decompressed_file):
+        flat = np.memmap(path, dtype=data_type, mode='r', shape=(int(np.prod(shape)),))
+        plane_shape, read_rows = plane_reader(flat, shape, axis, layer_number)
+        planes.append(read_rows(np.arange(plane_shape[0]), 1).astype(np.float64))
+        del flat
+    original, decompressed = planes
+    finite_original, finite_decompressed = np.isfinite(original), np.isfinite(decompressed)
+    both = finite_original & finite_decompressed
+    error = np.where(both, decompressed - original, 0.0)
+    mismatch = finite_original != finite_decompressed
+    max_error = float(np.abs(error).max())
+    rmse = float(np.sqrt(np.mean(error[both] ** 2))) if both.any() else 0.0
+    error[mismatch] = max(max_error, np.finfo(np.float64).tiny)
+
+    # max-preserving block reduction, the padding does not add any error
+    rows, cols = error.shape
+    step_y, step_x = max(1, -(-rows // target_shape[0])), max(1, -(-cols // target_shape[1]))
+    padded = np.zeros((-(-rows // step_y) * step_y, -(-cols // step_x) * step_x))
+    padded[:rows, :cols] = error
+    blocks = padded.reshape(padded.shape[0] // step_y, step_y, padded.shape[1] // step_x, step_x).transpose(0, 2, 1, 3)
+    blocks = blocks.reshape(blocks.shape[0], blocks.shape[1], step_y * step_x)
+    largest = np.take_along_axis(blocks, np.abs(blocks).argmax(axis=2)[:, :, None], axis=2)[:, :, 0]
+    scale = float(np.abs(largest).max())
+    if signed:
+        quantized = np.rint(largest / scale * 127.5 + 127.5) if scale > 0 else np.full(largest.shape, 128.0)
+    else:
+        quantized = np.rint(np.abs(largest) / scale * 255) if scale > 0 else np.zeros(largest.shape)
+    return {
+        "map": np.clip(quantized, 0, 255).astype(np.uint8),
+        "signed": signed,
+        "scale": scale,
+        "max_error": max_error,
+        "rmse": rmse,
+        "mismatch": int(np.count_nonzero(mismatch)),
+        "plane_shape": [rows, cols],
+    }
+
+def compress_layer_groups(dimension: str, data_file: str, archive_file: str, compress_command: str, decompress_command: str,
+                          error_bound, depth: int, is_float64: bool=False, workers: int=1, compressor: str="sz_split", eb_mode: str="ABS",
+                          staging_dir: str=None, staging_limit: int=8 << 30):
+    # Compresses every group of `depth` XY layers as its own stream and appends the streams to archive_file
+    # as they complete, with a manifest of the stream offsets and checksums in archive_file + ".manifest.json"
+    # (see write_manifest), so a layer range can be decompressed without the rest (see decompress_layer_range).
+    # The commands contain {input}, {compressed}, {decompressed}, {eb} and {layers} placeholders, {layers}
+    # being the group's layer count. Up to `workers` groups are compressed at once, each by its own
+    # compressor process, never more than the cores this process may run on (None uses all of them).
+    # The compressors read files, so every group in flight is staged in staging_dir (next to the archive by
+    # default) together with its stream. Fewer groups run at once when their staging would exceed
+    # staging_limit bytes or the free space of staging_dir.
+    import os
+    import json
+    import time
+    import uuid
+    import zlib
+    import shutil
+    import subprocess
+    import numpy as np
+    from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+    dimension = [int(dim) for dim in dimension.split()]
+    if len(dimension) == 2:
+        dimension = dimension + [1]
+    data_type = np.dtype(np.float32 if not is_float64 else np.float64)
+    volume = np.memmap(data_file, dtype=data_type, mode='r', shape=(dimension[2], dimension[0], dimension[1]))
+    cores = len(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else os.cpu_count() or 1
+    workers = max(1, min(workers or cores, cores))
+    staging_dir = staging_dir or os.path.dirname(os.path.abspath(archive_file))
+    # a group in flight stages its layers and a stream of at most about the same size
+    group_staging = 2 * depth * dimension[0] * dimension[1] * data_type.itemsize
+    staging_budget = min(staging_limit, shutil.disk_usage(staging_dir).free)
+    if group_staging > staging_budget:
+        del volume
+        return {"error": f"a group of {depth} layers needs {group_staging} bytes of staging in {staging_dir}, {staging_budget} are available"}
+    workers = min(workers, staging_budget // group_staging)
+    name = os.path.join(staging_dir, f"{os.path.basename(archive_file)}.{uuid.uuid4().hex}")
+
+    def compress_group(first_layer):
+        # the compressors run as processes, threads are enough to keep them all busy
+        layers = min(depth, dimension[2] - first_layer)
+        paths = {"input": f"{name}.{first_layer}.group", "compressed": f"{name}.{first_layer}.group.cmp"}
+        try:
+            volume[first_layer:first_layer + layers].tofile(paths["input"])
+            subprocess.run(compress_command.format(eb=error_bound, layers=layers, **paths), shell=True, check=True, capture_output=True)
+        finally:
+            if os.path.exists(paths["input"]):
+                os.remove(paths["input"])
+        return first_layer, layers, paths["compressed"]
+
+    groups = []
+    start_time = time.perf_counter()
+    first_layers = iter(range(0, dimension[2], depth))
+    running = set()
+    try:
+        with open(archive_file, 'wb') as archive, ThreadPoolExecutor(max_workers=workers) as pool:
+            while True:
+                # only `workers` groups are staged at once, the next one starts when one is in the archive
+                for first_layer in first_layers:
+                    running.add(pool.submit(compress_group, first_layer))
+                    if len(running) >= workers:
+                        break
+                if len(running) == 0:
+                    break
+                finished, running = wait(running, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    first_layer, layers, compressed = future.result()
+                    offset, crc = archive.tell(), 0
+                    try:
+                        with open(compressed, 'rb') as f:
+                            while True:
+                                block = f.read(1 << 24)
+                                if len(block) == 0:
+                                    break
+                                crc = zlib.crc32(block, crc)
+                                archive.write(block)
+                    finally:
+                        os.remove(compressed)
+                    groups.append({"first_layer": first_layer, "layers": layers, "offset": offset, "size": archive.tell() - offset,
+                                   "crc32": f"{crc:08x}"})
+    except subprocess.CalledProcessError as e:
+        return {"error": f"{e.cmd} failed: {e.stderr.decode(errors='replace').strip()}"}
+    except OSError as e:
+        return {"error": str(e)}
+    finally:
+        # the pool has finished every group by now, streams of groups that did not make it into the archive remain
+        for path in (f"{name}.{first_layer}.group{suffix}" for first_layer in range(0, dimension[2], depth) for suffix in ("", ".cmp")):
+            if os.path.exists(path):
+                os.remove(path)
+        del volume
+    # streams are in the archive in the order they completed, the manifest lists them in layer order
+    groups.sort(key=lambda group: group["first_layer"])
+    compressed_size = sum(group["size"] for group in groups)
+    manifest = {
+        "format": "ocelot",
+        "version": 2,
+        "compressor": compressor,
+        "layout": "layer_groups",
+        "dimension": dimension,
+        "dtype": data_type.name,
+        "eb_mode": eb_mode,
+        "error_bound": float(error_bound),
+        "depth": depth,
+        "decompress_command": decompress_command,
+        "original": {"path": data_file, "size": os.path.getsize(data_file)},
+        "size": compressed_size,
+        "chunks": groups,
+        "created": time.time(),
+    }
+    with open(archive_file + ".manifest.json", 'w') as f:
+        json.dump(manifest, f, indent=1)
+    return {
+        "archive": archive_file,
+        "manifest": archive_file + ".manifest.json",
+        "groups": len(groups),
+        "ratio": int(np.prod(dimension)) * data_type.itemsize / max(compressed_size, 1),
+        "compress_time": time.perf_counter() - start_time,
+        "workers": workers,
+    }
+
+def decompress_layer_range(archive_file: str, layer_start: int, layer_stop: int, output_file: str=None, workers: int=1):
+    # Decompresses only the layer groups of an archive written by compress_layer_groups that overlap
+    # [layer_start, layer_stop) into output_file (archive_file + ".partial" by default). The output is a
+    # sparse file with the shape of the whole volume, so the preview, the error map and the verification
+    # read it like a full decompression, and groups decompressed by earlier calls are kept and not repeated.
+    # Up to `workers` groups are decompressed at once, capped like in compress_layer_groups.
+    import os
+    import json
+    import time
+    import uuid
+    import subprocess
+    import numpy as np
+    from concurrent.futures import ThreadPoolExecutor
+    start_time = time.perf_counter()
+    try:
+        with open(archive_file + ".manifest.json", 'r') as f:
+            index = json.load(f)
+    except (OSError, ValueError) as e:
+        return {"error": f"{archive_file} has no usable layer index: {e}"}
+    dimension = index["dimension"]
+    data_type = np.dtype(index["dtype"])
+    shape = (dimension[2], dimension[0], dimension[1])
+    output_file = output_file or archive_file + ".partial"
+    state_file = output_file + ".groups.json"
+    archive_stat = os.stat(archive_file)
+    identity = [archive_stat.st_size, archive_stat.st_mtime_ns]
+    filled = []
+    try:
+        with open(state_file, 'r') as f:
+            state = json.load(f)
+        if state["identity"] == identity and os.path.getsize(output_file) == int(np.prod(shape)) * data_type.itemsize:
+            filled = state["filled"]
+    except (OSError, ValueError, KeyError):
+        pass
+    if len(filled) == 0:
+        # truncate allocates no blocks, only the decompressed layers take space
+        with open(output_file, 'wb') as f:
+            f.truncate(int(np.prod(shape)) * data_type.itemsize)
+    layer_start, layer_stop = max(0, layer_start), min(dimension[2], layer_stop)
+    wanted = [i for i, group in enumerate(index["chunks"])
+              if group["first_layer"] < layer_stop and group["first_layer"] + group["layers"] > layer_start and i not in filled]
+    name = f"{output_file}.{uuid.uuid4().hex}"
+    output = np.memmap(output_file, dtype=data_type, mode='r+', shape=shape)
+    cores = len(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else os.cpu_count() or 1
+    workers = max(1, min(workers or cores, cores))
+
+    def decompress_group(i):
+        # every group fills its own layers of the output
+        group = index["chunks"][i]
+        paths = {"compressed": f"{name}.{i}.group.cmp", "decompressed": f"{name}.{i}.group.out"}
+        try:
+            with open(archive_file, 'rb') as archive, open(paths["compressed"], 'wb') as f:
+                archive.seek(group["offset"])
+                f.write(archive.read(group["size"]))
+            subprocess.run(index["decompress_command"].format(eb=index["error_bound"], layers=group["layers"], **paths),
+                           shell=True, check=True, capture_output=True)
+            values = np.fromfile(paths["decompressed"], dtype=data_type)
+            if values.size != group["layers"] * dimension[0] * dimension[1]:
+                raise ValueError(f"group {i} decompressed to {values.size} values instead of {group['layers'] * dimension[0] * dimension[1]}")
+            output[group["first_layer"]:group["first_layer"] + group["layers"]] = values.reshape(group["layers"], dimension[0], dimension[1])
+            filled.append(i)
+        finally:
+            for path in paths.values():
+                if os.path.exists(path):
+                    os.remove(path)
+
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            for _ in pool.map(decompress_group, wanted):
+                pass
+    except subprocess.CalledProcessError as e:
+        return {"error": f"{e.cmd} failed: {e.stderr.decode(errors='replace').strip()}"}
+    except (OSError, ValueError) as e:
+        return {"error": str(e)}
+    finally:
+        output.flush()
+        del output
+        with open(state_file, 'w') as f:
+            json.dump({"identity": identity, "filled": sorted(filled)}, f)
+    return {
+        "output": output_file,
+        "dimension": " ".join(str(dim) for dim in dimension),
+        "error_bound": index["error_bound"],
+        "eb_mode": index.get("eb_mode", "ABS"),
+        "dtype": index["dtype"],
+        "original": index.get("original"),
+        "layers": [layer_start, layer_stop],
+        "decompressed_groups": len(wanted),
+        "workers": workers,
+        "cached_groups": sum(1 for i in filled if i not in wanted and index["chunks"][i]["first_layer"] < layer_stop
+                             and index["chunks"][i]["first_layer"] + index["chunks"][i]["layers"] > layer_start),
+        "time": time.perf_counter() - start_time,
+    }
+
+def write_manifest(compressed_file: str, manifest: dict):
+    # Describes a compressed output in compressed_file + ".manifest.json": the dimension, data type,
+    # compressor, error bound and mode, the decompression command template with {compressed}, {decompressed}
+    # and {eb} placeholders, the original file, and the chunk layout with a CRC32 per chunk. Outputs of a
+    # single stream are one chunk of all layers. Without a dtype in the manifest it follows from the size of
+    # the original file. The output of a batch job is described once the job is done (after_job in pyqt5app).
+    import os
+    import json
+    import time
+    import zlib
+    if not os.path.exists(compressed_file):
+        return {"error": f"{compressed_file} does not exist"}
+    size = os.path.getsize(compressed_file)
+    dimension = [int(dim) for dim in manifest["dimension"]]
+    if len(dimension) == 2:
+        dimension = dimension + [1]
+    chunks = manifest.get("chunks") or [{"first_layer": 0, "layers": dimension[2], "offset": 0, "size": size}]
+    with open(compressed_file, 'rb') as f:
+        for chunk in chunks:
+            f.seek(chunk["offset"])
+            crc, remaining = 0, chunk["size"]
+            while remaining > 0:
+                block = f.read(min(remaining, 1 << 24))
+                if len(block) == 0:
+                    return {"error": f"{compressed_file} ends before its chunk at offset {chunk['offset']}"}
+                crc = zlib.crc32(block, crc)
+                remaining -= len(block)
+            chunk["crc32"] = f"{crc:08x}"
+    original = manifest.get("original")
+    if isinstance(original, str):
+        original = {"path": original, "size": os.path.getsize(original) if os.path.exists(original) else None}
+    if "dtype" not in manifest:
+        element_size = original["size"] // (dimension[0] * dimension[1] * dimension[2]) if original is not None and original.get("size") else 4
+        if element_size not in (4, 8):
+            return {"error": f"{original['path']} has {original['size']} bytes, not float32 or float64 values of {dimension}"}
+        manifest = dict(manifest, dtype="float32" if element_size == 4 else "float64")
+    manifest = dict(manifest, format="ocelot", version=2, original=original, size=size, chunks=chunks, created=time.time())
+    manifest.setdefault("layout", "stream" if len(chunks) == 1 else "layer_groups")
+    with open(compressed_file + ".manifest.json", 'w') as f:
+        json.dump(manifest, f, indent=1)
+    return {
+        "manifest": compressed_file + ".manifest.json",
+        "chunks": len(chunks),
+        "size": size,
+        "ratio": original["size"] / max(size, 1) if original is not None and original.get("size") else None,
+    }
+
+def read_manifest(compressed_file: str, verify_checksums: bool=False):
+    # The manifest of a compressed output (see write_manifest). verify_checksums adds "checksum_errors", the
+    # chunks whose CRC32 does not match, e.g. after an incomplete transfer.
+    import os
+    import json
+    import zlib
+    if not os.path.exists(compressed_file + ".manifest.json"):
+        return {"error": f"{compressed_file} has no manifest"}
+    try:
+        with open(compressed_file + ".manifest.json", 'r') as f:
+            manifest = json.load(f)
+    except (OSError, ValueError) as e:
+        return {"error": f"the manifest of {compressed_file} is not readable: {e}"}
+    if verify_checksums:
+        if not os.path.exists(compressed_file):
+            return {"error": f"{compressed_file} does not exist"}
+        errors = []
+        size = os.path.getsize(compressed_file)
+        with open(compressed_file, 'rb') as f:
+            for i, chunk in enumerate(manifest["chunks"]):
+                if chunk["offset"] + chunk["size"] > size:
+                    errors.append(i)
+                    continue
+                if "crc32" not in chunk:
+                    continue
+                f.seek(chunk["offset"])
+                crc, remaining = 0, chunk["size"]
+                while remaining > 0:
+                    block = f.read(min(remaining, 1 << 24))
+                    crc = zlib.crc32(block, crc)
+                    remaining -= len(block)
+                if f"{crc:08x}" != chunk["crc32"]:
+                    errors.append(i)
+        manifest["checksum_errors"] = errors
+    return manifest
+
+def prepare_shards(manifest_file: str, manifest: dict, scripts: list):
+    # Writes the shard manifest of a file compressed by several independent Slurm jobs and the batch script
+    # of every shard, next to the shard outputs. The manifest holds the data file, dimension, dtype, compressor,
+    # error bound mode and value, layer depth, decompression command template and the shards with their first
+    # layer, layer count, output and script. The id of every submitted job is appended to output + ".jobs"
+    # (record_shard_job) and the job leaves output + ".done" on success. Without a dtype it follows from the
+    # data file size.
+    import os
+    import json
+    if "dtype" not in manifest:
+        dimension = manifest["dimension"]
+        element_size = os.path.getsize(manifest["data_file"]) // (dimension[0] * dimension[1] * dimension[2])
+        if element_size not in (4, 8):
+            return {"error": f"{manifest['data_file']} does not hold float32 or float64 values of {dimension}"}
+        manifest = dict(manifest, dtype="float32" if element_size == 4 else "float64")
+    for shard, script in zip(manifest["shards"], scripts):
+        os.makedirs(os.path.dirname(shard["script"]), exist_ok=True)
+        with open(shard["script"], 'w') as f:
+            f.write(script)
+        # markers of an earlier run would pass its shards off as this one's
+        for path in (shard["output"] + ".done", shard["output"] + ".jobs"):
+            if os.path.exists(path):
+                os.remove(path)
+    with open(manifest_file, 'w') as f:
+        json.dump(manifest, f, indent=1)
+    return {"manifest": manifest_file, "shards": [{"index": shard["index"], "output": shard["output"], "script": shard["script"]}
+                                                  for shard in manifest["shards"]]}
+
+def record_shard_job(output: str, job_id: str):
+    # appends the id of a job submitted for the shard writing output, check_shards follows the last one
+    with open(output + ".jobs", 'a') as f:
+        f.write(f"{job_id}\n")
+    return 0
+
+def check_shards(manifest_file: str):
+    # State of every shard of a shard manifest (see prepare_shards): "done" once its job left the done
+    # marker, "queued" while squeue lists its latest job (pending or running), "failed" otherwise, "pending"
+    # before any job was submitted, "unknown" without squeue (the result then has a "warning"). Failed and
+    # pending shards can be resubmitted on their own.
+    import os
+    import json
+    import subprocess
+    try:
+        with open(manifest_file, 'r') as f:
+            manifest = json.load(f)
+    except (OSError, ValueError) as e:
+        return {"error": f"the shard manifest {manifest_file} is not readable: {e}"}
+    queued, warning = None, None
+    try:
+        queued = set(subprocess.run(["squeue", "-h", "-o", "%i"], capture_output=True, text=True).stdout.split())
+    except OSError as e:
+        warning = f"cannot check the jobs, squeue is not available: {e}"
+    shards = []
+    for shard in manifest["shards"]:
+        job_ids = []
+        if os.path.exists(shard["output"] + ".jobs"):
+            with open(shard["output"] + ".jobs", 'r') as f:
+                job_ids = f.read().split()
+        if os.path.exists(shard["output"] + ".done") and os.path.exists(shard["output"]):
+            status = "done"
+        elif len(job_ids) > 0 and queued is None:
+            status = "unknown"
+        elif len(job_ids) > 0 and job_ids[-1] in queued:
+            status = "queued"
+        elif len(job_ids) > 0:
+            status = "failed"
+        else:
+            status = "pending"
+        shards.append({"index": shard["index"], "status": status, "jobs": job_ids, "output": shard["output"], "script": shard["script"]})
+    result = {
+        "manifest": manifest_file,
+        "archive": manifest["archive"],
+        "shards": shards,
+        "done": sum(1 for shard in shards if shard["status"] == "done"),
+        "queued": sum(1 for shard in shards if shard["status"] == "queued"),
+        "retry": [shard["index"] for shard in shards if shard["status"] in ("failed", "pending")],
+    }
+    if warning is not None:
+        result["warning"] = warning
+    return result
+
+def assemble_shards(manifest_file: str, remove_shards: bool=False):
+    # Concatenates the outputs of all shards of a shard manifest into one indexed archive with a chunk per
+    # shard, readable by decompress_layer_range like the archives of compress_layer_groups. The shards
+    # are aligned to the layer depth, so every shard decompresses with the same command as a single job.
+    import os
+    import json
+    import time
+    import zlib
+    try:
+        with open(manifest_file, 'r') as f:
+            manifest = json.load(f)
+    except (OSError, ValueError) as e:
+        return {"error": f"the shard manifest {manifest_file} is not readable: {e}"}
+    missing = [shard["index"] for shard in manifest["shards"]
+               if not (os.path.exists(shard["output"] + ".done") and os.path.exists(shard["output"]))]
+    if len(missing) > 0:
+        return {"error": f"shards {missing} are not done yet"}
+    start_time = time.perf_counter()
+    chunks = []
+    archive_file = manifest["archive"]
+    with open(archive_file, 'wb') as archive:
+        for shard in manifest["shards"]:
+            offset, crc = archive.tell(), 0
+            with open(shard["output"], 'rb') as f:
+                while True:
+                    block = f.read(1 << 24)
+                    if len(block) == 0:
+                        break
+                    crc = zlib.crc32(block, crc)
+                    archive.write(block)
+            chunks.append({"first_layer": shard["first_layer"], "layers": shard["layers"], "offset": offset,
+                           "size": archive.tell() - offset, "crc32": f"{crc:08x}"})
+    size = os.path.getsize(archive_file)
+    original_size = os.path.getsize(manifest["data_file"]) if os.path.exists(manifest["data_file"]) else None
+    archive_manifest = {
+        "format": "ocelot",
+        "version": 2,
+        "compressor": manifest["compressor"],
+        "layout": "layer_groups",
+        "dimension": manifest["dimension"],
+        "dtype": manifest["dtype"],
+        "eb_mode": manifest["eb_mode"],
+        "error_bound": manifest["error_bound"],
+        "depth": manifest["depth"],
+        "decompress_command": manifest["decompress_command"],
+        "original": {"path": manifest["data_file"], "size": original_size},
+        "size": size,
+        "chunks": chunks,
+        "created": time.time(),
+    }
+    with open(archive_file + ".manifest.json", 'w') as f:
+        json.dump(archive_manifest, f, indent=1)
+    if remove_shards:
+        for shard in manifest["shards"]:
+            for path in (shard["output"], shard["output"] + ".done"):
+                if os.path.exists(path):
+                    os.remove(path)
+    return {
+        "archive": archive_file,
+        "manifest": archive_file + ".manifest.json",
+        "shards": len(chunks),
+        "size": size,
+        "ratio": original_size / max(size, 1) if original_size else None,
+        "time": time.perf_counter() - start_time,
+    }
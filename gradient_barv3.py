@@ -6,6 +6,7 @@ from PyQt5 import QtGui, QtCore
 
 from matplotlib import pyplot as plt
 from pydantic import BaseModel
+import numpy as np
 
 
 class Marker:
@@ -57,6 +58,8 @@ class GradientBar(QWidget):
         self.cmap = cmap
         self.data_min = None
         self.data_max = None
+        self.histogram = None
+        self.bin_edges = None
         self.show_tick_marks = True
         # Draw gradient
         self.updateGradient()
@@ -76,6 +79,16 @@ class GradientBar(QWidget):
             for marker in self.markers:
                 self.gradient.setColorAt(marker.pos, marker.color)
 
+    def getColorLookupTable(self, size=256):
+        # ARGB colors ordered from data_min to data_max, the bar itself is drawn with data_max on top
+        positions = 1 - np.linspace(0, 1, size)
+        if self.cmap is not None:
+            rgba = np.asarray(self.cmap(positions))
+        else:
+            rgba = np.array([getColorAtPosition(self.gradient, pos).getRgbF() for pos in positions])
+        rgb = np.rint(rgba[:, :3] * 255).astype(np.uint32)
+        return (np.uint32(0xFF) << 24) | (rgb[:, 0] << 16) | (rgb[:, 1] << 8) | rgb[:, 2]
+
     def resizeEvent(self, a0: QResizeEvent | None) -> None:
         super().resizeEvent(a0)
         self.updateGradient()
@@ -87,6 +100,13 @@ class GradientBar(QWidget):
     def setDataRange(self, data_min, data_max):
         self.data_min = data_min
         self.data_max = data_max
+        self.update()
+
+    def setHistogram(self, histogram, bin_edges):
+        # value distribution drawn over the gradient so markers can be placed where the data actually is
+        self.histogram = np.asarray(histogram)
+        self.bin_edges = np.asarray(bin_edges)
+        self.update()
 
     def showContextMenu(self, position, marker_index):
         contextMenu = QMenu(self)
@@ -157,6 +177,9 @@ class GradientBar(QWidget):
 
         painter.fillRect(self.rect(), self.gradient)
 
+        if self.histogram is not None:
+            self.drawHistogram(painter)
+
         painter.setPen(QPen(Qt.white, 2)) 
         # Draw Ticks
         if self.show_tick_marks:
@@ -170,6 +193,24 @@ class GradientBar(QWidget):
 
         
     
+    def drawHistogram(self, painter):
+        if self.data_min is None or self.data_max is None or self.data_max <= self.data_min:
+            return
+        counts = np.log1p(self.histogram.astype(np.float64))
+        if counts.max() <= 0:
+            return
+        counts = counts / counts.max()
+        value_range = self.data_max - self.data_min
+        # data_max is drawn at the top of the bar
+        tops = (1 - (self.bin_edges[1:] - self.data_min) / value_range) * self.height()
+        bottoms = (1 - (self.bin_edges[:-1] - self.data_min) / value_range) * self.height()
+        painter.setPen(Qt.NoPen)
+        painter.setBrush(QBrush(QColor(0, 0, 0, 110)))
+        for top, bottom, count in zip(tops, bottoms, counts):
+            if count <= 0 or bottom < 0 or top > self.height():
+                continue
+            painter.drawRect(QRectF(0, top, count * self.width(), max(bottom - top, 1)))
+
     def drawTicks(self, painter):
         tickCount = 10  # Number of ticks
         interval = self.height() / (tickCount - 1)
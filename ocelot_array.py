@@ -0,0 +1,151 @@
+import os
+import sys
+import json
+import shutil
+import tempfile
+import threading
+import subprocess
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+
+class CompressedArray:
+    # Read-only NumPy-style view of a compressed Ocelot output, shaped like the raw file in memory,
+    # (d2, d0, d1) for the dimension "d0 d1 d2". Indexing decompresses only the chunks that hold the selected
+    # layers: the layer groups of a .szg archive (compress_layer_groups in globus_compute_util), or the whole
+    # file for a single SZ3/SZ_SPLIT stream. The layout comes from the output's manifest (write_manifest in
+    # globus_compute_util), outputs without one need their metadata as arguments. Decompressed chunks are kept
+    # in an LRU cache of cache_bytes and missing chunks are decompressed in parallel on a thread pool, the
+    # compressors run as subprocesses.
+    def __init__(self, path: str, dimension=None, decompress_command: str = None, error_bound=None, is_float64: bool = False,
+                 cache_bytes: int = 1 << 30, workers: int = None, temp_dir: str = None):
+        self.path = path
+        if os.path.exists(path + ".manifest.json"):
+            with open(path + ".manifest.json", 'r') as f:
+                index = json.load(f)
+            dimension = index["dimension"] + [1] * (3 - len(index["dimension"]))
+            self.dtype = np.dtype(index["dtype"])
+            self.decompress_command = decompress_command or index["decompress_command"]
+            self.error_bound = index["error_bound"]
+            self.groups = index["chunks"]
+        else:
+            # a plain stream is one chunk, its metadata has to be given
+            if dimension is None or decompress_command is None or error_bound is None:
+                raise ValueError(f"{path} has no manifest, dimension, decompress_command and error_bound are needed")
+            dimension = [int(dim) for dim in dimension.split()] if isinstance(dimension, str) else list(dimension)
+            if len(dimension) == 2:
+                dimension = dimension + [1]
+            self.dtype = np.dtype(np.float64 if is_float64 else np.float32)
+            self.decompress_command = decompress_command
+            self.error_bound = error_bound
+            self.groups = [{"first_layer": 0, "layers": dimension[2], "offset": 0, "size": os.path.getsize(path)}]
+        self.dimension = dimension
+        self.shape = (dimension[2], dimension[0], dimension[1])
+        # chunk of every layer
+        self.layerChunk = np.repeat(np.arange(len(self.groups)), [group["layers"] for group in self.groups])
+        self.cache = OrderedDict()
+        self.cacheBytes = 0
+        self.cacheLimit = cache_bytes
+        self.lock = threading.Lock()
+        self.pool = ThreadPoolExecutor(max_workers=workers or min(8, os.cpu_count() or 1))
+        self.tempDir = tempfile.mkdtemp(prefix="ocelot-array-", dir=temp_dir)
+
+    @property
+    def ndim(self):
+        return 3
+
+    @property
+    def size(self):
+        return int(np.prod(self.shape))
+
+    @property
+    def nbytes(self):
+        return self.size * self.dtype.itemsize
+
+    def __len__(self):
+        return self.shape[0]
+
+    def __repr__(self):
+        return f"CompressedArray({self.path!r}, shape={self.shape}, dtype={self.dtype.name}, chunks={len(self.groups)})"
+
+    def decompressChunk(self, chunk_id: int) -> np.ndarray:
+        group = self.groups[chunk_id]
+        paths = {"compressed": os.path.join(self.tempDir, f"{chunk_id}.cmp"),
+                 "decompressed": os.path.join(self.tempDir, f"{chunk_id}.out")}
+        try:
+            if len(self.groups) == 1 and group["offset"] == 0 and group["size"] == os.path.getsize(self.path):
+                paths["compressed"] = self.path
+            else:
+                with open(self.path, 'rb') as archive, open(paths["compressed"], 'wb') as f:
+                    archive.seek(group["offset"])
+                    f.write(archive.read(group["size"]))
+            subprocess.run(self.decompress_command.format(eb=self.error_bound, layers=group["layers"], **paths),
+                           shell=True, check=True, capture_output=True)
+            values = np.fromfile(paths["decompressed"], dtype=self.dtype)
+        finally:
+            for path in paths.values():
+                if path != self.path and os.path.exists(path):
+                    os.remove(path)
+        return values.reshape(group["layers"], self.shape[1], self.shape[2])
+
+    def getChunks(self, chunk_ids) -> dict:
+        chunks = {}
+        with self.lock:
+            for chunk_id in chunk_ids:
+                if chunk_id in self.cache:
+                    self.cache.move_to_end(chunk_id)
+                    chunks[chunk_id] = self.cache[chunk_id]
+        missing = [chunk_id for chunk_id in chunk_ids if chunk_id not in chunks]
+        for chunk_id, values in zip(missing, self.pool.map(self.decompressChunk, missing)):
+            chunks[chunk_id] = values
+            with self.lock:
+                self.cache[chunk_id] = values
+                self.cacheBytes += values.nbytes
+                # the chunks of this request stay even when they do not fit
+                while self.cacheBytes > self.cacheLimit and len(self.cache) > 1 and next(iter(self.cache)) not in chunk_ids:
+                    _, evicted = self.cache.popitem(last=False)
+                    self.cacheBytes -= evicted.nbytes
+        return chunks
+
+    def __getitem__(self, key):
+        key = np.index_exp[key]
+        if any(k is Ellipsis for k in key):
+            position = next(i for i, k in enumerate(key) if k is Ellipsis)
+            key = key[:position] + (slice(None),) * (3 - len(key) + 1) + key[position + 1:]
+        key = key + (slice(None),) * (3 - len(key))
+        layers = np.arange(self.shape[0])[key[0]]
+        chunks = self.getChunks([int(chunk_id) for chunk_id in np.unique(self.layerChunk[np.atleast_1d(layers)])])
+        planes = [chunks[self.layerChunk[layer]][layer - self.groups[self.layerChunk[layer]]["first_layer"]][key[1:]]
+                  for layer in np.atleast_1d(layers)]
+        if np.ndim(layers) == 0:
+            return planes[0]
+        return np.stack(planes) if len(planes) > 0 else np.empty((0,) + np.empty(self.shape[1:])[key[1:]].shape, dtype=self.dtype)
+
+    def __array__(self, dtype=None):
+        values = self[:]
+        return values if dtype is None else values.astype(dtype)
+
+    def close(self):
+        self.pool.shutdown()
+        self.cache.clear()
+        self.cacheBytes = 0
+        shutil.rmtree(self.tempDir, ignore_errors=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+def open_compressed(path: str, **kwargs) -> CompressedArray:
+    return CompressedArray(path, **kwargs)
+
+
+if __name__ == '__main__':
+    # python ocelot_array.py archive.szg 10 prints the statistics of layer 10
+    with open_compressed(sys.argv[1]) as array:
+        layer = array[int(sys.argv[2]) if len(sys.argv) > 2 else array.shape[0] // 2]
+        print(array, f"layer min {np.nanmin(layer)}, max {np.nanmax(layer)}, mean {np.nanmean(layer)}")
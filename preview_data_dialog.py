@@ -15,12 +15,13 @@ from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg as FigureCanvas
 from matplotlib.figure import Figure
 
 from typing import List
+from collections import OrderedDict
 
 from pydantic import BaseModel
 
 import random
 
-from globus_compute_util import get_preview_data, get_partial_preview_data
+from globus_compute_util import get_partial_preview_data, get_projection_preview, get_compressibility_map, get_volume_statistics, trial_compression, get_compression_features, get_error_map, decompress_layer_range
 
 def generate_random_color_hex():
     """Generate a random color in hexadecimal format."""
@@ -39,6 +40,32 @@ class DataRange(BaseModel):
     high: float = 0
     eb: float = 0
 
+def propose_regions(block_mask: np.ndarray, max_regions: int = 5, min_blocks: int = 4):
+    # Greedy cover of the marked blocks with non-overlapping rectangles: the largest rectangle made only of
+    # marked blocks is taken and cleared until max_regions are found or the rest is smaller than min_blocks.
+    # Returns (row_start, col_start, row_end, col_end) in blocks, ends exclusive.
+    mask = np.array(block_mask, dtype=bool)
+    regions = []
+    while len(regions) < max_regions and mask.any():
+        best_area, best = 0, None
+        heights = np.zeros(mask.shape[1] + 1, dtype=np.int64) # the sentinel column flushes the stack
+        for row in range(mask.shape[0]):
+            heights[:-1] = np.where(mask[row], heights[:-1] + 1, 0)
+            # largest rectangle under the histogram of marked blocks ending at this row
+            stack = []
+            for col, height in enumerate(heights):
+                start = col
+                while stack and stack[-1][1] >= height:
+                    start, top = stack.pop()
+                    if top * (col - start) > best_area:
+                        best_area, best = top * (col - start), (row - top + 1, start, row + 1, col)
+                stack.append((start, height))
+        if best_area < min_blocks:
+            break
+        regions.append(best)
+        mask[best[0]:best[2], best[1]:best[3]] = False
+    return regions
+
 class RectObject:
     def __init__(self, rect: QRect, dataRect: DataRect, color: QColor, eb: float):
         self.rect = rect
@@ -63,10 +90,16 @@ class ImageLabel(QLabel):
         self.pen = QPen(Qt.GlobalColor.red, 1)
         self.setFocusPolicy(Qt.FocusPolicy.StrongFocus)
         self.selectedRectIndex = None
+        self.overlay = None # translucent QImage stretched over the preview, e.g. the compressibility heatmap
+        self.regionsEnabled = True # regions are XY rectangles, they can only be drawn on XY layers
 
     def getRects(self) -> list[RectObject]:
         return self.rects
 
+    def setOverlay(self, overlay):
+        self.overlay = overlay
+        self.update()
+
     def toggleTickMark(self, show_tick_marks: bool):
         self.show_tick_marks = show_tick_marks
         self.update()
@@ -93,7 +126,7 @@ class ImageLabel(QLabel):
 
         # the clicked position is not in existing rectangle
         self.selectedRectIndex = None
-        if event.button() == Qt.LeftButton:
+        if event.button() == Qt.LeftButton and self.regionsEnabled:
             # Adjust for the position of the imageLabel
             self.startPoint = event.pos()
             self.endPoint = self.startPoint
@@ -158,6 +191,8 @@ class ImageLabel(QLabel):
                 rect_obj.dataRect = self.convertMousePositionToData(rect.topLeft(), rect.bottomRight())
                 self.selectedRectIndex = None
                 return
+            if not self.previewRect:
+                return
             self.endPoint = event.pos()
             self.printRect()
             
@@ -181,11 +216,12 @@ class ImageLabel(QLabel):
             self.update()
     
     def convertMousePositionToData(self, startPos, endPos):
+        # the displayed pixmap is a reduced image scaled to the label, so map through the true data dimension
         dataRect = DataRect()
-        dataRect.start_x = int(startPos.x() / self.width() * self.dim_x)
-        dataRect.start_y = int(startPos.y() / self.height() * self.dim_y)
-        dataRect.end_x = int(endPos.x() / self.width() * self.dim_x)
-        dataRect.end_y = int(endPos.y() / self.height() * self.dim_y)
+        dataRect.start_x = min(max(int(startPos.x() / self.width() * self.dim_x), 0), self.dim_x)
+        dataRect.start_y = min(max(int(startPos.y() / self.height() * self.dim_y), 0), self.dim_y)
+        dataRect.end_x = min(max(int(endPos.x() / self.width() * self.dim_x), 0), self.dim_x)
+        dataRect.end_y = min(max(int(endPos.y() / self.height() * self.dim_y), 0), self.dim_y)
         dataRect.length_x = dataRect.end_x - dataRect.start_x
         dataRect.length_y = dataRect.end_y - dataRect.start_y
         print(dataRect)
@@ -201,6 +237,8 @@ class ImageLabel(QLabel):
     def paintEvent(self, event):
         super().paintEvent(event)
         painter = QPainter(self)
+        if self.overlay is not None and self.currentImage is not None:
+            painter.drawImage(self.rect(), self.overlay)
         if self.startPoint and self.endPoint and self.previewRect:
             rect = QRect(self.startPoint, self.endPoint)
             painter.setPen(self.pen)
@@ -253,10 +291,88 @@ class ImageLabel(QLabel):
             painter.setFont(QFont("Arial", 8))
             painter.drawText(x - 4, self.height() - 15, label)
 
+class LayerSparkline(QWidget):
+    # per-layer min/max band and mean line of the XY layers, clicking selects a layer
+    layerSelected = pyqtSignal(int)
+
+    def __init__(self):
+        super().__init__()
+        self.setMinimumHeight(36)
+        self.setMaximumHeight(48)
+        self.setToolTip("Per-layer min/max (band), mean (line) and NaN/Inf layers (red), click to jump to a layer")
+        self.layerStats = None
+        self.currentLayer = 0
+
+    def setStatistics(self, stats):
+        self.layerStats = stats
+        self.update()
+
+    def setCurrentLayer(self, layer_number):
+        self.currentLayer = layer_number
+        self.update()
+
+    def layerAt(self, x):
+        num_layers = len(self.layerStats["layer_mean"])
+        return min(max(int(x / max(self.width(), 1) * num_layers), 0), num_layers - 1)
+
+    def mousePressEvent(self, event):
+        if self.layerStats is not None and event.button() == Qt.LeftButton:
+            self.layerSelected.emit(self.layerAt(event.pos().x()))
+
+    def paintEvent(self, event):
+        super().paintEvent(event)
+        if self.layerStats is None:
+            return
+        painter = QPainter(self)
+        painter.fillRect(self.rect(), QColor(245, 245, 245))
+        layer_min, layer_max = self.layerStats["layer_min"], self.layerStats["layer_max"]
+        layer_mean = self.layerStats["layer_mean"]
+        num_layers = len(layer_mean)
+        valid = np.isfinite(layer_min) & np.isfinite(layer_max)
+        width, height = self.width(), self.height() - 4
+        if valid.any():
+            low, high = float(layer_min[valid].min()), float(layer_max[valid].max())
+            scale = (height - 1) / (high - low) if high > low else 0.0
+            xs = (np.arange(num_layers) + 0.5) / num_layers * width
+            # layers without finite values sit on the baseline
+            to_y = lambda values: height - 1 - (np.where(valid, values, low) - low) * scale
+            band = [QPointF(x, y) for x, y in zip(xs, to_y(layer_max))] + \
+                   [QPointF(x, y) for x, y in zip(xs[::-1], to_y(layer_min)[::-1])]
+            painter.setPen(Qt.NoPen)
+            painter.setBrush(QColor(100, 149, 237, 80))
+            painter.drawPolygon(QPolygonF(band))
+            painter.setPen(QPen(QColor(25, 25, 112), 1))
+            painter.drawPolyline(QPolygonF([QPointF(x, y) for x, y in zip(xs, to_y(layer_mean))]))
+        painter.setPen(QPen(Qt.red, 1))
+        for layer in np.flatnonzero(self.layerStats["layer_nan_count"]):
+            x = int((layer + 0.5) / num_layers * width)
+            painter.drawLine(x, self.height() - 4, x, self.height())
+        painter.setPen(QPen(Qt.black, 1))
+        x = int((self.currentLayer + 0.5) / num_layers * width)
+        painter.drawLine(x, 0, x, self.height())
+
 class PreviewDialog(QDialog):
+    # emitted from the Globus Compute callback threads, delivered to the GUI thread as a queued signal
+    layerLoaded = pyqtSignal(object, object)
+    overlayLoaded = pyqtSignal(object, object)
+    trialLoaded = pyqtSignal(object)
+    featuresLoaded = pyqtSignal(object)
+    errorMapLoaded = pyqtSignal(object, object)
+    layerRangeLoaded = pyqtSignal(object, object)
+    statisticsLoaded = pyqtSignal(object, bool)
+    # ways to jump to an interesting XY layer using the per-layer statistics
+    layerJumps = {
+        "largest std": lambda stats: np.argmax(stats["layer_std"]),
+        "largest max": lambda stats: np.argmax(np.where(np.isfinite(stats["layer_max"]), stats["layer_max"], -np.inf)),
+        "smallest min": lambda stats: np.argmin(np.where(np.isfinite(stats["layer_min"]), stats["layer_min"], np.inf)),
+        "largest mean change": lambda stats: np.argmax(np.abs(np.diff(stats["layer_mean"], prepend=stats["layer_mean"][0]))),
+        "most NaN/Inf": lambda stats: np.argmax(stats["layer_nan_count"]),
+    }
+
     def __init__(self, window_title = 'Tensor Data Preivew',
                  gce = None, file_path = "./data/CLDHGH_1_1800_3600.dat", dataDimension = "1800 3600",
-                 default_eb = 0.1):
+                 default_eb = 0.1, cache_dir = None, stats_dir = None, work_dir = None, trial_commands = None,
+                 predictor = None, prediction_threads = 1, decompressed_path = None):
         super().__init__()
        
         self.colorBar = GradientBar(cmap=plt.get_cmap('rainbow').reversed())
@@ -267,13 +383,59 @@ class PreviewDialog(QDialog):
         # temporary fake data
         self.imageLabel = ImageLabel()
         self.imageLabel.setDimension(self.dimension)
+        self.imageLabel.setScaledContents(True)
         
         self.gce = gce
         self.file_path = file_path
         self.dataDimensionTxt = dataDimension
         self.default_eb = default_eb
+        self.cache_dir = cache_dir # endpoint directory for the preview cache, usually inside work_dir
+        self.cache_limit = 512 * 1024 * 1024
+        self.preview_output = "uint8" # "uint8"/"uint16" ship quantized arrays, "png" renders on the endpoint
+        self.colorLookupTables = {}
+        # decoded layers, least recently used first
+        self.layerCache = OrderedDict()
+        self.layerCacheSize = 64
+        self.prefetchRadius = 2 # how many neighbor layers on each side are fetched in the background
+        self.pendingLayers = set()
+        self.currentLayerKey = None
+        # a layer that is not cached is first shown from cheap strided passes at 1/8 and 1/2 of the preview size
+        self.progressiveDivisors = (8, 2)
+        self.coarseLevelShown = -1
+        self.layerLoaded.connect(self.on_layer_loaded)
+        # per-block compressibility heatmaps, keyed by the layer key and the estimator settings
+        self.overlayCache = OrderedDict()
+        self.currentOverlayKey = None
+        self.overlayLoaded.connect(self.on_overlay_loaded)
+        self.suggestPending = False
+        self.suggestActive = False # suggestions follow the controls once they have been requested
+        self.suggestedRects = [] # rects placed by suggestRegions, the only ones it replaces
+        # whole-volume statistics, once loaded they fix the color scale and the value ranges
+        self.volumeStats = None
+        self.stats_dir = stats_dir # fallback endpoint directory for the statistics sidecar
+        # trial_commands(sample_dimension) returns the compress and decompress commands of the selected compressor
+        # with {input}, {compressed}, {decompressed} and {eb} placeholders, the trial runs inside work_dir
+        self.work_dir = work_dir
+        self.trial_commands = trial_commands
+        self.trialSampleLayers = 4
+        self.trialMaxSampleElements = 1 << 24
+        self.trialResult = None
+        self.trialLoaded.connect(self.on_trial_loaded)
+        # a CompressionPredictor estimates every compressor it was trained for from sampled features,
+        # sz_split runs with prediction_threads threads
+        self.predictor = predictor
+        self.prediction_threads = prediction_threads
+        self.predictionSampleBlocks = 64
+        self.featuresLoaded.connect(self.on_features_loaded)
+        # the decompressed output compared against file_path in the error maps, asked for when it is not known
+        self.decompressed_path = decompressed_path
+        self.errorMapLoaded.connect(self.on_error_map_loaded)
+        self.layerRangeLoaded.connect(self.on_layer_range_loaded)
+        self.statisticsLoaded.connect(self.on_statistics_loaded)
         # init UI
         self.initUI(window_title)
+        # a sidecar left by an earlier scan is picked up right away
+        self.loadVolumeStatistics(scan=False)
     
     def toggleTickMark(self):
         flag = self.toggle_tick_mark_checkbox.isChecked()
@@ -302,13 +464,30 @@ class PreviewDialog(QDialog):
         self.accept_button.clicked.connect(self.accept)
         self.cancel_button = QPushButton('Cancel')
         self.cancel_button.clicked.connect(self.reject)
+        self.volumeStatsButton = QPushButton('Volume Stats')
+        self.volumeStatsButton.setToolTip("Scan the whole file once for its value range, histogram and per-layer statistics")
+        self.volumeStatsButton.clicked.connect(lambda: self.loadVolumeStatistics(scan=True))
 
         buttonLayout = QHBoxLayout()
         buttonLayout.addWidget(self.loadImageButton)
+        buttonLayout.addWidget(self.volumeStatsButton)
+        self.trialButton = QPushButton('Try Compression')
+        self.trialButton.setToolTip("Compress and decompress a few sampled layers with the selected compressor and error bound")
+        self.trialButton.setEnabled(self.trial_commands is not None and self.work_dir is not None)
+        self.trialButton.clicked.connect(self.runTrialCompression)
+        buttonLayout.addWidget(self.trialButton)
+        self.predictButton = QPushButton('Predict')
+        self.predictButton.setToolTip("Predict the compression ratio, time and PSNR at the error bound from sampled blocks")
+        self.predictButton.setEnabled(self.predictor is not None)
+        self.predictButton.clicked.connect(self.predictCompression)
+        buttonLayout.addWidget(self.predictButton)
         buttonLayout.addWidget(self.accept_button)
         buttonLayout.addWidget(self.cancel_button)
 
         containerLayout.addLayout(buttonLayout)
+        self.predictionLabel = QLabel()
+        self.predictionLabel.setVisible(False)
+        containerLayout.addWidget(self.predictionLabel)
 
         checkboxLayout = QHBoxLayout()
         
@@ -325,12 +504,95 @@ class PreviewDialog(QDialog):
         self.floatButtonGroup.addButton(self.float64RadioButton)
         checkboxLayout.addWidget(self.float32RadioButton)
         checkboxLayout.addWidget(self.float64RadioButton)
+
+        self.downsampleComboBox = QComboBox()
+        self.downsampleComboBox.addItems(["mean", "max", "min", "stride"])
+        self.downsampleComboBox.setToolTip("How the endpoint reduces the data to the preview size")
+        checkboxLayout.addWidget(self.downsampleComboBox)
+
+        self.compressibilityCheckBox = QCheckBox('compressibility')
+        self.compressibilityCheckBox.setToolTip("Overlay the estimated bits per value of every block at the error bound (green compresses well)")
+        self.compressibilityCheckBox.toggled.connect(self.on_compressibility_toggled)
+        checkboxLayout.addWidget(self.compressibilityCheckBox)
+        self.estimatorComboBox = QComboBox()
+        self.estimatorComboBox.addItems(["lorenzo", "quantization"])
+        self.estimatorComboBox.setToolTip("Entropy of the Lorenzo prediction residuals or of the quantization bins")
+        self.estimatorComboBox.currentTextChanged.connect(lambda _: self.on_compressibility_toggled(self.compressibilityCheckBox.isChecked()))
+        checkboxLayout.addWidget(self.estimatorComboBox)
+        self.errorMapButton = QPushButton('Error Map')
+        self.errorMapButton.setToolTip("Show the largest error of the decompressed output in every pixel of the current layer")
+        self.errorMapButton.clicked.connect(self.requestErrorMap)
+        checkboxLayout.addWidget(self.errorMapButton)
+        self.errorMapComboBox = QComboBox()
+        self.errorMapComboBox.addItems(["absolute error", "signed error"])
+        checkboxLayout.addWidget(self.errorMapComboBox)
         containerLayout.addLayout(checkboxLayout)
         # containerLayout.addWidget(self.toggle_tick_mark_checkbox)
         # Limit the button height
         self.loadImageButton.setMaximumHeight(40)
 
         containerLayout.addWidget(self.imageLabel)
+
+        suggestLayout = QHBoxLayout()
+        self.suggestRegionsButton = QPushButton('Suggest Regions')
+        self.suggestRegionsButton.setToolTip("Cover the blocks above the bits per value threshold with regions using a looser error bound")
+        self.suggestRegionsButton.clicked.connect(self.suggestRegions)
+        suggestLayout.addWidget(self.suggestRegionsButton)
+        self.suggestThresholdSlider = QSlider(Qt.Horizontal)
+        self.suggestThresholdSlider.setRange(0, 160) # tenths of a bit per value
+        self.suggestThresholdSlider.setValue(60)
+        self.suggestThresholdLabel = QLabel("6.0 bits")
+        self.suggestThresholdSlider.valueChanged.connect(self.on_suggest_settings_changed)
+        suggestLayout.addWidget(self.suggestThresholdSlider)
+        suggestLayout.addWidget(self.suggestThresholdLabel)
+        self.suggestEbFactorSpinBox = QDoubleSpinBox()
+        self.suggestEbFactorSpinBox.setPrefix("eb x ")
+        self.suggestEbFactorSpinBox.setRange(1, 1000)
+        self.suggestEbFactorSpinBox.setValue(10)
+        self.suggestEbFactorSpinBox.valueChanged.connect(self.on_suggest_settings_changed)
+        suggestLayout.addWidget(self.suggestEbFactorSpinBox)
+        self.suggestCountSpinBox = QSpinBox()
+        self.suggestCountSpinBox.setPrefix("max ")
+        self.suggestCountSpinBox.setRange(1, 32)
+        self.suggestCountSpinBox.setValue(5)
+        self.suggestCountSpinBox.valueChanged.connect(self.on_suggest_settings_changed)
+        suggestLayout.addWidget(self.suggestCountSpinBox)
+        containerLayout.addLayout(suggestLayout)
+
+        if len(self.dimension) == 3:
+            layerLayout = QHBoxLayout()
+            self.axisComboBox = QComboBox()
+            self.axisComboBox.addItems(["XY", "XZ", "YZ"])
+            self.axisComboBox.currentTextChanged.connect(self.on_axis_changed)
+            layerLayout.addWidget(self.axisComboBox)
+            self.layerSlider = QSlider(Qt.Horizontal)
+            self.layerSlider.setRange(0, self.dimension[2] - 1)
+            self.layerSpinBox = QSpinBox()
+            self.layerSpinBox.setRange(0, self.dimension[2] - 1)
+            self.layerSlider.valueChanged.connect(self.layerSpinBox.setValue)
+            self.layerSpinBox.valueChanged.connect(self.layerSlider.setValue)
+            self.layerSlider.valueChanged.connect(self.on_layer_changed)
+            self.layerSlider.sliderReleased.connect(lambda: self.showLayer(self.layerSlider.value()))
+            layerLayout.addWidget(QLabel("layer"))
+            layerLayout.addWidget(self.layerSlider)
+            layerLayout.addWidget(self.layerSpinBox)
+            self.layerJumpComboBox = QComboBox()
+            self.layerJumpComboBox.addItems(["jump to..."] + list(self.layerJumps.keys()))
+            self.layerJumpComboBox.setEnabled(False)
+            self.layerJumpComboBox.activated.connect(self.on_layer_jump)
+            layerLayout.addWidget(self.layerJumpComboBox)
+            self.projectionComboBox = QComboBox()
+            self.projectionComboBox.addItems(["layer", "max projection", "min projection", "mean projection"])
+            self.projectionComboBox.setToolTip("Show one layer or project the whole depth along the axis")
+            self.projectionComboBox.currentTextChanged.connect(self.on_projection_changed)
+            layerLayout.addWidget(self.projectionComboBox)
+            self.layerSparkline = LayerSparkline()
+            self.layerSparkline.setVisible(False)
+            self.layerSparkline.layerSelected.connect(self.jumpToLayer)
+            self.layerSlider.valueChanged.connect(self.layerSparkline.setCurrentLayer)
+            containerLayout.addWidget(self.layerSparkline)
+            containerLayout.addLayout(layerLayout)
+
         mainLayout.addLayout(containerLayout)
 
         # Add the color bar to the main layout
@@ -339,6 +601,9 @@ class PreviewDialog(QDialog):
         self.setLayout(mainLayout)
 
     def getRects(self):
+        # SZ_REGION applies the rects to every XY layer, rects of the XZ/YZ planes would be misread as XY regions
+        if self.currentAxis() != "xy":
+            return []
         return self.imageLabel.getRects()
     
     def getRanges(self):
@@ -367,40 +632,508 @@ class PreviewDialog(QDialog):
             ranges.append(DataRange(low=low, high=high, eb=self.default_eb))
         return ranges
 
-    def image_loaded_callback(self, buf, data_min, data_max):
+    def quantizedToQImage(self, quantized: np.ndarray) -> QImage:
+        height, width = quantized.shape
+        levels = int(np.iinfo(quantized.dtype).max) + 1
+        if levels not in self.colorLookupTables:
+            self.colorLookupTables[levels] = self.colorBar.getColorLookupTable(levels)
+        lut = self.colorLookupTables[levels]
+        if quantized.dtype == np.uint8:
+            data = np.ascontiguousarray(quantized)
+            qimage = QImage(data.tobytes(), width, height, data.strides[0], QImage.Format_Indexed8)
+            qimage.setColorTable(lut.tolist())
+        else:
+            data = np.ascontiguousarray(lut[quantized])
+            qimage = QImage(data.tobytes(), width, height, data.strides[0], QImage.Format_RGB32)
+        # detach from the temporary buffer
+        return qimage.copy()
+
+    def decodePayload(self, payload) -> QImage:
+        if isinstance(payload, np.ndarray):
+            return self.quantizedToQImage(payload)
         qimage = QImage()
-        qimage.loadFromData(buf.getvalue(), 'PNG')
-        self.colorBar.setDataRange(data_min, data_max)
+        qimage.loadFromData(payload.getvalue(), 'PNG')
+        return qimage
+
+    def displayImage(self, qimage, data_min, data_max):
+        if self.volumeStats is None:
+            self.colorBar.setDataRange(data_min, data_max)
         pixmap = QPixmap.fromImage(qimage)
         self.imageLabel.setPixmap(pixmap)
         self.imageLabel.currentImage = pixmap.toImage()
         self.update()
 
-    def loadImage(self):
-        is_float64 = self.float64RadioButton.isChecked()
-        if len(self.dimension) == 3:
-            # Ask the user to select which layer to preview.
-            input_dialog_prompt = f"please select which layer to preivew in the range [0, {self.dimension[2]}]"
-            layer_number, ok = QInputDialog.getInt(self, "Select Layer", input_dialog_prompt,
-                                               value=0, min=0, max=self.dimension[2])
-            if not ok:
-                QMessageBox.information(self, "Layer selection error", "The layer you selected is not valid")
+    def image_loaded_callback(self, payload, data_min, data_max):
+        self.displayImage(self.decodePayload(payload), data_min, data_max)
+
+    def currentAxis(self):
+        return self.axisComboBox.currentText().lower() if len(self.dimension) == 3 else "xy"
+
+    def planeDimension(self, axis):
+        # [rows, cols] of the plane, and how many planes there are along the axis
+        if axis == "xz":
+            return [self.dimension[2], self.dimension[1]], self.dimension[0]
+        if axis == "yz":
+            return [self.dimension[2], self.dimension[0]], self.dimension[1]
+        return self.dimension[:2], self.dimension[2] if len(self.dimension) == 3 else 1
+
+    def on_axis_changed(self, axis_text):
+        plane_dimension, plane_count = self.planeDimension(axis_text.lower())
+        # regions drawn on another plane do not describe this one
+        self.imageLabel.rects = []
+        self.imageLabel.regionsEnabled = axis_text.lower() == "xy"
+        self.imageLabel.setDimension(plane_dimension)
+        self.layerSlider.blockSignals(True)
+        self.layerSpinBox.blockSignals(True)
+        self.layerSlider.setRange(0, plane_count - 1)
+        self.layerSpinBox.setRange(0, plane_count - 1)
+        self.layerSlider.setValue(min(self.layerSlider.value(), plane_count - 1))
+        self.layerSpinBox.setValue(self.layerSlider.value())
+        self.layerSlider.blockSignals(False)
+        self.layerSpinBox.blockSignals(False)
+        self.updateLayerStatisticsWidgets()
+        if self.imageLabel.currentImage is not None:
+            self.showLayer(self.layerSlider.value())
+
+    def currentProjection(self):
+        if len(self.dimension) != 3 or self.projectionComboBox.currentText() == "layer":
+            return None
+        return self.projectionComboBox.currentText().split()[0]
+
+    def layerKey(self, layer_number):
+        # everything that changes the rendered layer is part of the key, a projection covers every layer
+        value_range = None if self.volumeStats is None else (self.volumeStats["min"], self.volumeStats["max"])
+        projection = self.currentProjection()
+        return (self.currentAxis(), 0 if projection else layer_number, self.float64RadioButton.isChecked(),
+                self.downsampleComboBox.currentText(), self.preview_output, value_range, projection)
+
+    def on_projection_changed(self, projection_text):
+        # rectangles drawn on a projection are valid across the whole depth, so they are kept
+        self.layerSlider.setEnabled(projection_text == "layer")
+        self.layerSpinBox.setEnabled(projection_text == "layer")
+        self.showLayer(self.layerSlider.value())
+
+    def requestLayer(self, key, progressive=False):
+        if key in self.layerCache or key in self.pendingLayers:
+            return
+        axis, layer_number, is_float64, method, output, value_range, projection = key
+        # the endpoint reduces the layer to the viewport, ImageLabel maps clicks back with the true dimension
+        target_shape = (self.maxImageHeight, self.maxImageWidth)
+        plane_dimension, _ = self.planeDimension(axis)
+        if progressive and projection is None and self.gce != None and plane_dimension[0] * plane_dimension[1] > target_shape[0] * target_shape[1]:
+            # small separate tasks finish long before the full read and are swapped in as they arrive
+            for level, divisor in enumerate(self.progressiveDivisors):
+                coarse_shape = (max(1, target_shape[0] // divisor), max(1, target_shape[1] // divisor))
+                self.submitPreview(("coarse", level, key), get_partial_preview_data,
+                                   (self.dataDimensionTxt, self.file_path, layer_number, is_float64, coarse_shape, "stride",
+                                    output, self.cache_dir, self.cache_limit, axis, value_range))
+        self.pendingLayers.add(key)
+        if projection is None:
+            self.submitPreview(key, get_partial_preview_data, (self.dataDimensionTxt, self.file_path, layer_number, is_float64,
+                                                               target_shape, method, output, self.cache_dir, self.cache_limit,
+                                                               axis, value_range))
+        else:
+            self.submitPreview(key, get_projection_preview, (self.dataDimensionTxt, self.file_path, projection, is_float64,
+                                                             target_shape, method, output, self.cache_dir, self.cache_limit,
+                                                             axis, value_range))
+
+    def submitPreview(self, key, function, args):
+        if self.gce == None:
+            self.on_layer_loaded(key, function(*args))
+        else:
+            future = self.gce.submit(function, *args)
+            future.add_done_callback(lambda f: self.layerLoaded.emit(key, f))
+
+    def on_layer_loaded(self, key, result):
+        is_coarse = key[0] == "coarse"
+        if not is_coarse:
+            self.pendingLayers.discard(key)
+        if not isinstance(result, tuple):
+            try:
+                result = result.result()
+            except Exception as e:
+                print(f"failed to load {key[0]} plane {key[1]}:", e)
                 return
-            
+        payload, data_min, data_max = result
+        if isinstance(payload, int):
+            print(f"the endpoint could not preview {key[0]} plane {key[1]}")
+            return
+        if is_coarse:
+            # only a finer pass replaces a coarse one, and none replaces the full preview
+            _, level, final_key = key
+            if final_key == self.currentLayerKey and final_key not in self.layerCache and level > self.coarseLevelShown:
+                self.coarseLevelShown = level
+                self.displayImage(self.decodePayload(payload), data_min, data_max)
+            return
+        self.layerCache[key] = (self.decodePayload(payload), data_min, data_max)
+        while len(self.layerCache) > self.layerCacheSize:
+            self.layerCache.popitem(last=False)
+        if key == self.currentLayerKey:
+            self.displayImage(*self.layerCache[key])
+
+    def overlayKey(self, key):
+        plane_dimension, _ = self.planeDimension(key[0])
+        # about 128 blocks along the longer side of the plane, small blocks cannot show high entropies
+        block_size = max(16, -(-max(plane_dimension) // 128))
+        return key + (self.estimatorComboBox.currentText(), float(self.default_eb), block_size)
+
+    def requestOverlay(self, key):
+        overlay_key = self.overlayKey(key)
+        self.currentOverlayKey = overlay_key
+        if overlay_key in self.overlayCache:
+            self.overlayCache.move_to_end(overlay_key)
+            self.imageLabel.setOverlay(self.overlayCache[overlay_key][0])
+            return
+        self.imageLabel.setOverlay(None)
+        axis, layer_number, is_float64, method, output, value_range, projection, estimator, error_bound, block_size = overlay_key
+        args = (self.dataDimensionTxt, self.file_path, layer_number, estimator, error_bound, is_float64, block_size, axis,
+                projection, self.cache_dir, self.cache_limit)
+        if self.gce == None:
+            self.on_overlay_loaded(overlay_key, get_compressibility_map(*args))
+        else:
+            future = self.gce.submit(get_compressibility_map, *args)
+            future.add_done_callback(lambda f: self.overlayLoaded.emit(overlay_key, f))
+
+    def on_overlay_loaded(self, overlay_key, result):
+        if not isinstance(result, tuple):
+            try:
+                result = result.result()
+            except Exception as e:
+                print("failed to estimate the compressibility:", e)
+                return
+        bits, bits_min, bits_max = result
+        if isinstance(bits, int):
+            print("the endpoint could not estimate the compressibility")
+            return
+        # green for few bits per value, red for many, on a fixed scale so that layers can be compared
+        value_bits = 64 if overlay_key[2] else 32
+        rgba = plt.get_cmap('RdYlGn_r')(np.clip(bits / 16, 0, 1), bytes=True)
+        rgba[..., 3] = 110
+        rgba = np.ascontiguousarray(rgba)
+        overlay = QImage(rgba.tobytes(), rgba.shape[1], rgba.shape[0], rgba.strides[0], QImage.Format_RGBA8888).copy()
+        self.overlayCache[overlay_key] = (overlay, bits)
+        while len(self.overlayCache) > self.layerCacheSize:
+            self.overlayCache.popitem(last=False)
+        print(f"compressibility: {bits_min:.2f} to {bits_max:.2f} bits per value, estimated ratio {value_bits / max(float(bits.mean()), 1e-3):.1f}")
+        if overlay_key == self.currentOverlayKey:
+            self.imageLabel.setOverlay(overlay)
+            if self.suggestPending:
+                self.suggestRegions()
+
+    def suggestRegions(self):
+        # needs the block map of the current layer, which comes with the compressibility overlay
+        if self.currentLayerKey is None:
+            QMessageBox.information(self, "Suggest Regions", "Load the data before suggesting regions")
+            return
+        if self.currentAxis() != "xy":
+            QMessageBox.information(self, "Suggest Regions", "Regions are XY rectangles, switch to the XY plane to suggest them")
+            self.suggestActive = False
+            return
+        if not self.compressibilityCheckBox.isChecked():
+            self.suggestPending = True
+            self.compressibilityCheckBox.setChecked(True)
+            return
+        if self.currentOverlayKey not in self.overlayCache:
+            self.suggestPending = True
+            return
+        self.suggestPending = False
+        self.suggestActive = True
+        bits = self.overlayCache[self.currentOverlayKey][1]
+        block_size = self.currentOverlayKey[-1]
+        threshold = self.suggestThresholdSlider.value() / 10
+        eb = float(self.default_eb) * self.suggestEbFactorSpinBox.value()
+        label = self.imageLabel
+        # the regions drawn by the user stay, only the previous suggestions are replaced
+        drawn = [rect_obj for rect_obj in label.rects if not any(rect_obj is suggested for suggested in self.suggestedRects)]
+        rects = []
+        for index, (row_start, col_start, row_end, col_end) in enumerate(propose_regions(bits >= threshold, self.suggestCountSpinBox.value())):
+            dataRect = DataRect(start_x=col_start * block_size, start_y=row_start * block_size,
+                                end_x=min(col_end * block_size, label.dim_x), end_y=min(row_end * block_size, label.dim_y))
+            dataRect.length_x = dataRect.end_x - dataRect.start_x
+            dataRect.length_y = dataRect.end_y - dataRect.start_y
+            rect = QRect(QPoint(int(dataRect.start_x / label.dim_x * label.width()), int(dataRect.start_y / label.dim_y * label.height())),
+                         QPoint(int(dataRect.end_x / label.dim_x * label.width()), int(dataRect.end_y / label.dim_y * label.height())))
+            color_index = len(drawn) + index
+            color = QColor(label.colors[color_index]) if color_index < len(label.colors) else QColor(generate_random_color_hex())
+            rects.append(RectObject(rect, dataRect, color, eb))
+        self.suggestedRects = rects
+        label.rects = drawn + rects
+        label.update()
+
+    def on_suggest_settings_changed(self, *args):
+        self.suggestThresholdLabel.setText(f"{self.suggestThresholdSlider.value() / 10:.1f} bits")
+        if self.suggestActive and self.currentOverlayKey in self.overlayCache:
+            self.suggestRegions()
+
+    def trialSampleDimension(self):
+        # the same few evenly spaced layers are sampled on the endpoint
+        layer_size = self.dimension[0] * self.dimension[1]
+        depth = self.dimension[2] if len(self.dimension) == 3 else 1
+        sample_layers = max(1, min(self.trialSampleLayers, depth, self.trialMaxSampleElements // layer_size))
+        if len(self.dimension) == 2:
+            return [str(dim) for dim in self.dimension], 1
+        return [str(self.dimension[0]), str(self.dimension[1]), str(sample_layers)], sample_layers
+
+    def runTrialCompression(self):
+        sample_dimension, sample_layers = self.trialSampleDimension()
+        compress_command, decompress_command = self.trial_commands(sample_dimension)
+        args = (self.dataDimensionTxt, self.file_path, compress_command, decompress_command, self.default_eb, self.work_dir,
+                self.float64RadioButton.isChecked(), sample_layers, (self.maxImageHeight, self.maxImageWidth))
+        self.trialButton.setEnabled(False)
+        if self.gce == None:
+            self.on_trial_loaded(trial_compression(*args))
+        else:
+            future = self.gce.submit(trial_compression, *args)
+            future.add_done_callback(lambda f: self.trialLoaded.emit(f))
+
+    def on_trial_loaded(self, result):
+        self.trialButton.setEnabled(True)
+        if not isinstance(result, dict):
+            try:
+                result = result.result()
+            except Exception as e:
+                QMessageBox.information(self, "Try Compression", f"The trial compression failed: {e}")
+                return
+        if "error" in result:
+            QMessageBox.information(self, "Try Compression", f"The trial compression failed: {result['error']}")
+            return
+        self.trialResult = result
+        self.showTrialResult(result)
+
+    def showTrialResult(self, result):
+        # original and decompressed middle sample layer side by side, colorized on the original's scale
+        dialog = QDialog(self)
+        dialog.setWindowTitle(f"Trial compression at error bound {self.default_eb}")
+        layout = QVBoxLayout()
+        imagesLayout = QHBoxLayout()
+        for title, key in (("original", "original"), ("decompressed", "decompressed")):
+            column = QVBoxLayout()
+            column.addWidget(QLabel(f"{title}, layer {result['layers'][len(result['layers']) // 2]}"))
+            image = QLabel()
+            image.setPixmap(QPixmap.fromImage(self.quantizedToQImage(result[key])).scaled(360, 240, Qt.KeepAspectRatio))
+            column.addWidget(image)
+            imagesLayout.addLayout(column)
+        layout.addLayout(imagesLayout)
+        layout.addWidget(QLabel(
+            f"layers {result['layers']}: ratio {result['ratio']:.2f}, "
+            f"compression {result['compress_throughput']:.1f} MB/s, decompression {result['decompress_throughput']:.1f} MB/s\n"
+            f"max error {result['max_error']:.6g}, RMSE {result['rmse']:.6g}, PSNR {result['psnr']:.2f} dB "
+            f"(value range {result['value_range']:.6g})"))
+        dialog.setLayout(layout)
+        dialog.show()
+
+    def predictCompression(self):
+        # the whole-volume range is used once it is known, otherwise the sampled blocks give the range
+        value_range = None if self.volumeStats is None else (self.volumeStats["min"], self.volumeStats["max"])
+        args = (self.dataDimensionTxt, self.file_path, self.default_eb, self.float64RadioButton.isChecked(),
+                self.predictionSampleBlocks, 32, value_range)
+        self.predictButton.setEnabled(False)
+        if self.gce == None:
+            self.on_features_loaded(get_compression_features(*args))
+        else:
+            future = self.gce.submit(get_compression_features, *args)
+            future.add_done_callback(lambda f: self.featuresLoaded.emit(f))
+
+    def on_features_loaded(self, result):
+        self.predictButton.setEnabled(True)
+        if not isinstance(result, dict):
+            try:
+                result = result.result()
+            except Exception as e:
+                QMessageBox.information(self, "Predict", f"Failed to sample the compression features: {e}")
+                return
+        original_size = int(np.prod(self.dimension)) * result["itemsize"]
+        predictions = self.predictor.predict(result, original_size, self.prediction_threads)
+        print("compression features:", result)
+        lines = []
+        for compressor_name, prediction in predictions.items():
+            print(f"predicted {compressor_name}: {prediction}")
+            lines.append(f"{compressor_name}: ratio {prediction['cr']:.2f}, "
+                         f"compression {prediction['compress_time']:.2f} s, PSNR {prediction['psnr']:.2f} dB")
+        self.predictionLabel.setText(f"Predicted at error bound {self.default_eb} (p0 {result['p0']:.3f}, "
+                                     f"quantization entropy {result['quant_entropy']:.2f} bits)\n" + "\n".join(lines))
+        self.predictionLabel.setVisible(True)
+
+    def requestErrorMap(self):
+        decompressed_path, ok = QInputDialog.getText(self, "Error Map", "Decompressed file on the endpoint",
+                                                     text=self.decompressed_path or self.file_path + ".sz.dp")
+        if not ok or decompressed_path.strip() == "":
+            return
+        self.decompressed_path = decompressed_path.strip()
+        axis = self.currentAxis()
+        layer_number = self.layerSlider.value() if len(self.dimension) == 3 else 0
+        self.errorMapButton.setEnabled(False)
+        if self.decompressed_path.endswith(".szg"):
+            # an indexed archive only decompresses the groups of the layer, other planes need all of them
+            layer_range = (layer_number, layer_number + 1) if axis == "xy" else (0, self.dimension[2])
             if self.gce == None:
-                img, data_min, data_max = get_partial_preview_data(self.dataDimensionTxt, self.file_path, layer_number, is_float64)
-                self.image_loaded_callback(img, data_min, data_max)
+                self.on_layer_range_loaded((axis, layer_number), decompress_layer_range(self.decompressed_path, *layer_range))
             else:
-                future = self.gce.submit(get_partial_preview_data, self.dataDimensionTxt, self.file_path, layer_number, is_float64)
-                future.add_done_callback(lambda f: self.image_loaded_callback(*f.result()))
+                future = self.gce.submit(decompress_layer_range, self.decompressed_path, *layer_range)
+                future.add_done_callback(lambda f: self.layerRangeLoaded.emit((axis, layer_number), f))
+            return
+        self.submitErrorMap(self.decompressed_path, axis, layer_number)
+
+    def on_layer_range_loaded(self, plane, result):
+        if not isinstance(result, dict):
+            try:
+                result = result.result()
+            except Exception as e:
+                result = {"error": str(e)}
+        if "error" in result:
+            self.errorMapButton.setEnabled(True)
+            QMessageBox.information(self, "Error Map", f"Failed to decompress the layers: {result['error']}")
+            return
+        print(f"decompressed {result['decompressed_groups']} layer groups of {self.decompressed_path} in {result['time']:.2f} s")
+        self.submitErrorMap(result["output"], *plane)
+
+    def submitErrorMap(self, decompressed_file, axis, layer_number):
+        signed = self.errorMapComboBox.currentText() == "signed error"
+        args = (self.dataDimensionTxt, self.file_path, decompressed_file, layer_number, self.float64RadioButton.isChecked(),
+                (self.maxImageHeight, self.maxImageWidth), axis, signed)
+        if self.gce == None:
+            self.on_error_map_loaded((axis, layer_number), get_error_map(*args))
+        else:
+            future = self.gce.submit(get_error_map, *args)
+            future.add_done_callback(lambda f: self.errorMapLoaded.emit((axis, layer_number), f))
 
+    def on_error_map_loaded(self, plane, result):
+        self.errorMapButton.setEnabled(True)
+        if not isinstance(result, dict):
+            try:
+                result = result.result()
+            except Exception as e:
+                QMessageBox.information(self, "Error Map", f"Failed to compute the error map: {e}")
+                return
+        if "error" in result:
+            QMessageBox.information(self, "Error Map", f"Failed to compute the error map: {result['error']}")
+            return
+        # diverging colors around 0 for the signed error, dark to bright for the absolute error
+        cmap = plt.get_cmap('coolwarm' if result["signed"] else 'inferno')
+        rgb = np.rint(np.asarray(cmap(np.linspace(0, 1, 256)))[:, :3] * 255).astype(np.uint32)
+        lut = ((np.uint32(0xFF) << 24) | (rgb[:, 0] << 16) | (rgb[:, 1] << 8) | rgb[:, 2]).tolist()
+        data = np.ascontiguousarray(result["map"])
+        qimage = QImage(data.tobytes(), data.shape[1], data.shape[0], data.strides[0], QImage.Format_Indexed8)
+        qimage.setColorTable(lut)
+        dialog = QDialog(self)
+        dialog.setWindowTitle(f"{'Signed' if result['signed'] else 'Absolute'} error of {plane[0].upper()} layer {plane[1]}")
+        layout = QVBoxLayout()
+        image = QLabel()
+        image.setPixmap(QPixmap.fromImage(qimage.copy()).scaled(self.maxImageWidth, self.maxImageHeight, Qt.KeepAspectRatio))
+        layout.addWidget(image)
+        scale = f"[-{result['scale']:.6g}, {result['scale']:.6g}]" if result["signed"] else f"[0, {result['scale']:.6g}]"
+        layout.addWidget(QLabel(
+            f"{self.decompressed_path}\ncolors span {scale}, largest error of every pixel of the {result['plane_shape'][0]}x{result['plane_shape'][1]} plane\n"
+            f"max error {result['max_error']:.6g} (error bound {self.default_eb}), RMSE {result['rmse']:.6g}, "
+            f"{result['mismatch']} NaN/Inf mismatches"))
+        dialog.setLayout(layout)
+        dialog.show()
+
+    def on_compressibility_toggled(self, checked):
+        if checked and self.currentLayerKey is not None:
+            self.requestOverlay(self.currentLayerKey)
+        else:
+            self.currentOverlayKey = None
+            self.imageLabel.setOverlay(None)
+
+    def prefetchNeighbors(self, layer_number):
+        if len(self.dimension) != 3 or self.currentProjection() is not None:
+            return
+        _, plane_count = self.planeDimension(self.currentAxis())
+        for offset in range(1, self.prefetchRadius + 1):
+            for neighbor in (layer_number + offset, layer_number - offset):
+                if 0 <= neighbor < plane_count:
+                    self.requestLayer(self.layerKey(neighbor))
+
+    def showLayer(self, layer_number):
+        key = self.layerKey(layer_number)
+        if key != self.currentLayerKey:
+            self.coarseLevelShown = -1
+        self.currentLayerKey = key
+        if key in self.layerCache:
+            self.layerCache.move_to_end(key)
+            self.displayImage(*self.layerCache[key])
+        else:
+            self.requestLayer(key, progressive=True)
+        if self.compressibilityCheckBox.isChecked():
+            self.requestOverlay(key)
+        self.prefetchNeighbors(layer_number)
+
+    def on_layer_changed(self, layer_number):
+        key = self.layerKey(layer_number)
+        if key in self.layerCache:
+            self.showLayer(layer_number)
+        elif not self.layerSlider.isSliderDown():
+            # while dragging only cached layers are shown, the release triggers the remote request
+            self.showLayer(layer_number)
+
+    def loadVolumeStatistics(self, scan=True):
+        # with scan=False only an existing statistics sidecar is read, nothing is scanned
+        is_float64 = self.float64RadioButton.isChecked()
+        args = (self.dataDimensionTxt, self.file_path, is_float64, 256, 1 << 22, self.stats_dir, scan)
+        self.volumeStatsButton.setEnabled(False)
+        if self.gce == None:
+            try:
+                result = get_volume_statistics(*args)
+            except OSError as e:
+                result = None
+                print("failed to compute the volume statistics:", e)
+            self.on_statistics_loaded(result, scan)
+        else:
+            future = self.gce.submit(get_volume_statistics, *args)
+            future.add_done_callback(lambda f: self.statisticsLoaded.emit(f, scan))
+
+    def on_statistics_loaded(self, result, scanned=True):
+        self.volumeStatsButton.setEnabled(True)
+        if result is not None and not isinstance(result, dict):
+            try:
+                result = result.result()
+            except Exception as e:
+                print("failed to compute the volume statistics:", e)
+                return
+        if result is None:
+            if scanned:
+                QMessageBox.information(self, "Volume Stats", "The file does not contain any finite value")
+            return
+        print(f"volume statistics: min {result['min']}, max {result['max']}, mean {result['mean']}, std {result['std']}, NaN/Inf {result['nan_count']}")
+        if "sidecar" in result:
+            print("statistics sidecar:", result["sidecar"])
+        self.volumeStats = result
+        self.colorBar.setDataRange(result["min"], result["max"])
+        self.colorBar.setHistogram(result["histogram"], result["bin_edges"])
+        self.updateLayerStatisticsWidgets()
+        if self.imageLabel.currentImage is not None:
+            # re-render the current layer on the volume color scale
+            self.showLayer(self.layerSlider.value() if len(self.dimension) == 3 else 0)
+
+    def updateLayerStatisticsWidgets(self):
+        # the per-layer statistics describe XY layers only
+        if len(self.dimension) != 3:
+            return
+        has_layer_stats = self.volumeStats is not None and "layer_mean" in self.volumeStats and self.currentAxis() == "xy"
+        self.layerSparkline.setStatistics(self.volumeStats if has_layer_stats else None)
+        self.layerSparkline.setCurrentLayer(self.layerSlider.value())
+        self.layerSparkline.setVisible(has_layer_stats)
+        self.layerJumpComboBox.setEnabled(has_layer_stats)
+
+    def jumpToLayer(self, layer_number):
+        self.layerSlider.setValue(int(layer_number))
+        if self.imageLabel.currentImage is None:
+            self.showLayer(self.layerSlider.value())
+
+    def on_layer_jump(self, index):
+        if index <= 0 or self.volumeStats is None:
+            return
+        self.jumpToLayer(self.layerJumps[self.layerJumpComboBox.itemText(index)](self.volumeStats))
+        self.layerJumpComboBox.setCurrentIndex(0)
+
+    def loadImage(self):
+        if len(self.dimension) == 3:
+            self.showLayer(self.layerSlider.value())
         elif len(self.dimension) == 2:
-            if self.gce == None:
-                img, data_min, data_max = get_preview_data(self.dataDimensionTxt, self.file_path, is_float64)
-                self.image_loaded_callback(img, data_min, data_max)
-            else:
-                future = self.gce.submit(get_preview_data, self.dataDimensionTxt, self.file_path, is_float64)
-                future.add_done_callback(lambda f: self.image_loaded_callback(*f.result()))
+            self.showLayer(0)
+        else:
+            QMessageBox.information(self, "Preview error", "Only 2D and 3D tensors can be previewed")
         
 
 if __name__ == '__main__':
@@ -6,10 +6,13 @@ from PyQt5 import QtGui, QtCore
 from PyQt5.QtCore import *
 
 import os
+import re
+import json
 import globus_utils
 import globus_sdk
 
 import yaml
+import numpy as np
 
 from tabulate import tabulate
 from functools import partial
@@ -17,17 +20,24 @@ from functools import partial
 from globus_compute_sdk import Client, Executor
 from globus_compute_sdk.serialize import CombinedCode
 
-from globus_compute_util import list_dir, list_cpu, remove_files, run_command, build_sbatch_file, save_str_to_file
+from globus_compute_util import list_dir, list_cpu, remove_files, run_command, build_sbatch_file, save_str_to_file, get_volume_statistics
+from globus_compute_util import ResidentExecutor, helper_source, get_resident_version, OCELOT_HELPER_VERSION, search_error_bound, verify_decompression
+from globus_compute_util import compress_layer_groups, decompress_layer_range, write_manifest, read_manifest
+from globus_compute_util import prepare_shards, record_shard_job, check_shards, assemble_shards
 from collections import defaultdict
 
 from pathlib import Path
 from typing import List
 
 from preview_data_dialog import PreviewDialog
+from thumbnail_gallery_dialog import ThumbnailGalleryDialog
+from compression_predictor import CompressionPredictor
 
 from enum import Enum
 
 APP_NAME = "Ocelot"
+# written next to every compressed output, see write_manifest
+MANIFEST_SUFFIX = ".manifest.json"
 
 class MessageLevel(Enum):
     WARNING = 1
@@ -49,16 +59,16 @@ class TransferThread(QThread):
 
 class CompressorCmdFactory():
     @staticmethod
-    def make_sz3_compress_cmd(excutable, filename, compressedFilename, dimension: List, mode, errorbound) -> str:
-        command = [excutable, "-f", "-i", filename,
+    def make_sz3_compress_cmd(excutable, filename, compressedFilename, dimension: List, mode, errorbound, is_float64: bool = False) -> str:
+        command = [excutable, "-d" if is_float64 else "-f", "-i", filename,
                    "-z", compressedFilename, "-M", mode,
                    errorbound, f"-{len(dimension)}"] + dimension
         command_str = " ".join(command)
         return command_str
     
     @staticmethod
-    def make_sz3_decompress_cmd(executable, filename, decompressedFilename, dimension: List, mode, errorbound) -> str:
-        command = [executable, "-f", "-z", filename,
+    def make_sz3_decompress_cmd(executable, filename, decompressedFilename, dimension: List, mode, errorbound, is_float64: bool = False) -> str:
+        command = [executable, "-d" if is_float64 else "-f", "-z", filename,
                    "-o", decompressedFilename, "-M", mode,
                    errorbound, f"-{len(dimension)}"] + dimension
         command_str = " ".join(command)
@@ -228,6 +238,7 @@ class UI(QDialog):
         self.dataset_directory_lineEdit = self.findChild(QLineEdit, "dataset_directory_lineEdit")
         self.list_dataset_button = self.findChild(QPushButton, "list_dataset_button")
         self.preview_data_button = self.findChild(QPushButton, "preview_data_button")
+        self.thumbnails_button = self.findChild(QPushButton, "thumbnails_button")
         self.dataset_dir_listWidget = self.findChild(QListWidget, "dataset_dir_listWidget")
         self.dataset_dir_listWidget.setSelectionMode(QtWidgets.QAbstractItemView.ExtendedSelection)
         self.machine_a_radio_button = self.findChild(QRadioButton, "machine_a_radio_button")
@@ -238,6 +249,7 @@ class UI(QDialog):
 
         self.list_dataset_button.clicked.connect(self.on_click_list_dataset_button)
         self.preview_data_button.clicked.connect(self.on_click_preview_selected_button)
+        self.thumbnails_button.clicked.connect(self.on_click_thumbnails_button)
         self.compress_selected_button.clicked.connect(self.on_click_compress_selected_button)
         self.decompress_selected_button.clicked.connect(self.on_click_decompress_selected_button)
         self.transfer_selected_button.clicked.connect(self.on_click_transfer_selected_button)
@@ -259,6 +271,10 @@ class UI(QDialog):
         # SZ3 config
         self.sz3_data_dimension_lineEdit = self.SZ3_tab.findChild(QLineEdit, "data_dimension_lineEdit")
         self.sz3_error_bound_lineEdit = self.SZ3_tab.findChild(QLineEdit, "error_bound_lineEdit")
+        self.sz3_search_eb_button = self.SZ3_tab.findChild(QPushButton, "search_eb_button")
+        self.sz3_search_eb_button.clicked.connect(self.on_click_search_eb_button)
+        self.sz3ParallelSlabsCheckBox = self.SZ3_tab.findChild(QCheckBox, "parallel_slabs_checkbox")
+        self.sz3Float64CheckBox = self.SZ3_tab.findChild(QCheckBox, "float64_checkbox")
         self.sz3_executable_lineEdit_MA = self.SZ3_tab.findChild(QLineEdit, "sz3_executable_lineEdit_MA")
         self.sz3_executable_lineEdit_MB = self.SZ3_tab.findChild(QLineEdit, "sz3_executable_lineEdit_MB")
         self.sz3_eb_mode_abs_radiobutton = self.SZ3_tab.findChild(QRadioButton, "abs_mode_radio_button")
@@ -288,6 +304,10 @@ class UI(QDialog):
         self.szSplitnTaskSpinBox = self.SZ_SPLIT_tab.findChild(QSpinBox, "szSplitnTaskSpinBox")
         self.szSplitmpiModecheckBox = self.SZ_SPLIT_tab.findChild(QCheckBox, "szSplitmpiModecheckBox")
         self.szSplitLayerDepthSpinBox = self.SZ_SPLIT_tab.findChild(QSpinBox, "szSplitLayerDepthSpinBox")
+        self.szSplitIndexedCheckBox = self.SZ_SPLIT_tab.findChild(QCheckBox, "szSplitIndexedCheckBox")
+        self.szSplitShardSpinBox = self.SZ_SPLIT_tab.findChild(QSpinBox, "szSplitShardSpinBox")
+        self.szSplitShardButton = self.SZ_SPLIT_tab.findChild(QPushButton, "szSplitShardButton")
+        self.szSplitShardButton.clicked.connect(self.on_click_shards_button)
         self.checkSZsplitJobConfigButton = self.SZ_SPLIT_tab.findChild(QPushButton, "checkSZsplitJobConfigButton")
         self.sz_split_executable_lineEdit_MA = self.SZ_SPLIT_tab.findChild(QLineEdit, "sz_split_executable_lineEdit_MA")
         self.sz_split_executable_lineEdit_MB = self.SZ_SPLIT_tab.findChild(QLineEdit, "sz_split_executable_lineEdit_MB")
@@ -356,6 +376,25 @@ class UI(QDialog):
         self.referencePathMA = ""
         self.referencePathMB = ""
 
+        # compression ratio/time/PSNR predictors trained with compression_predictor.py, set by the machine configs
+        self.predictor_a = None
+        self.predictor_b = None
+
+        # trial compressions of earlier error bound searches, keyed by the machine, file and commands
+        self.eb_search_probes = {}
+
+        # CPUs lscpu reports on the endpoints, sizes the parallel slab compression
+        self.machine_cpus = {"A": None, "B": None}
+
+        # volume statistics the preview loaded, (machine, file path) -> statistics, reported before compression
+        self.volume_statistics = {}
+
+        # actions waiting for batch jobs to leave the queue, job id -> callables, see after_job
+        self.job_actions = {"A": {}, "B": {}}
+        self.job_action_timer = QTimer(self)
+        self.job_action_timer.setInterval(30000)
+        self.job_action_timer.timeout.connect(self.check_pending_jobs)
+
         # SZ_REGION properties
         self.ranges = None
         self.rects = None
@@ -416,6 +455,7 @@ class UI(QDialog):
             future = self.gce_machine_a.submit(run_command, f"squeue -u {self.machine_a_job_config['user']}")
             print("submitted check job status request for machine A!")
             future.add_done_callback(lambda f: QTimer.singleShot(0, partial(self._check_job_status_callback, f)))
+            self.check_pending_jobs()
         elif self.machine_b_radio_button.isChecked():
             print("machine_b job config:", self.machine_b_job_config)
             if "user" not in self.machine_b_job_config:
@@ -424,9 +464,112 @@ class UI(QDialog):
             future = self.gce_machine_b.submit(run_command, f"squeue -u {self.machine_b_job_config['user']}")
             print("submitted check job status request for machine B!")
             future.add_done_callback(lambda f: QTimer.singleShot(0, partial(self._check_job_status_callback, f)))
+            self.check_pending_jobs()
         else:
             print("Please select which machine's job status to check")
 
+    def get_endpoint_cache_dir(self, work_dir: str, name: str = "previews"):
+        if work_dir.strip() == "":
+            return None
+        return str(Path(work_dir.strip()) / ".ocelot_cache" / name)
+
+    def load_predictor(self, defaults: dict):
+        # the predictor is optional, without a model the preview dialog just does not offer predictions
+        if "predictor_model" not in defaults:
+            return None
+        try:
+            return CompressionPredictor.load(defaults["predictor_model"])
+        except (OSError, ValueError, KeyError) as e:
+            print(f"predictor model {defaults['predictor_model']} cannot be loaded, prediction disabled: {e}")
+            return None
+
+    def guess_decompressed_path(self, work_dir: str, filename: str):
+        # where the decompression of the selected compressor leaves the output of filename
+        if self.compressorTabWidget.currentIndex() == self.SZ_SPLIT_tab_index:
+            return str(Path(work_dir) / (filename + ".szsplit.dp"))
+        if self.compressorTabWidget.currentIndex() == self.SZ_REGION_tab_index:
+            return str(Path(work_dir) / (filename + ".szr.dpr"))
+        return str(Path(work_dir) / (filename + ".sz.dp"))
+
+    def make_group_commands(self, machine: str, threads: int):
+        # sz_split commands for one layer group of an indexed archive, {layers} is the layer count of the group
+        executable = (self.sz_split_executable_lineEdit_MA if machine == "A" else self.sz_split_executable_lineEdit_MB).text()
+        dimension = self.sz3_data_dimension_lineEdit.text().split()[:2] + ["{layers}"]
+        return (CompressorCmdFactory.make_szsplit_compress_cmd(executable, "{input}", "{compressed}", dimension, "{eb}", "{layers}", threads, False),
+                CompressorCmdFactory.make_szsplit_decompress_cmd(executable, "{compressed}", "{decompressed}", dimension, "{eb}", "{layers}", threads, False))
+
+    def make_slab_commands(self, machine: str, mode: str, is_float64: bool = False):
+        # sz3 commands for one slab of a parallel slab archive, {layers} is the layer count of the slab
+        executable = (self.sz3_executable_lineEdit_MA if machine == "A" else self.sz3_executable_lineEdit_MB).text()
+        dimension = self.sz3_data_dimension_lineEdit.text().split()
+        if len(dimension) == 3:
+            dimension = dimension[:2] + ["{layers}"]
+        return (CompressorCmdFactory.make_sz3_compress_cmd(executable, "{input}", "{compressed}", dimension, mode, "{eb}", is_float64),
+                CompressorCmdFactory.make_sz3_decompress_cmd(executable, "{compressed}", "{decompressed}", dimension, mode, "{eb}", is_float64))
+
+    def _layer_groups_callback(self, future, machine):
+        try:
+            result = future.result()
+        except Exception as e:
+            result = {"error": str(e)}
+        if "error" in result:
+            self.add_message_to_current_status(f"Indexed layer group compression failed: {result['error']}", MessageLevel.ALERT)
+            return
+        self.add_message_to_current_status(f"{Path(result['archive']).name}: {result['groups']} layer groups, ratio {result['ratio']:.2f}, "
+                                           f"{result['compress_time']:.1f} s on {result['workers']} cores, described by {Path(result['manifest']).name}.",
+                                           MessageLevel.SUCCESS)
+        if machine == "A":
+            self.on_click_list_workdir_button_a()
+        else:
+            self.on_click_list_workdir_button_b()
+
+    def decompress_archive_layers(self, gce, machine: str, compressed_file: str, output_file: str):
+        # indexed archives decompress only the groups of the requested layers, on all the CPUs lscpu reported
+        parsed_dimension = [int(dim) for dim in self.sz3_data_dimension_lineEdit.text().split()]
+        depth = parsed_dimension[2] if len(parsed_dimension) == 3 else 1
+        layer_range, ok = QInputDialog.getText(self, "Decompress Layers", "Layer range to decompress (start stop)", text=f"0 {depth}")
+        if not ok or len(layer_range.split()) != 2:
+            return
+        future = gce.submit(decompress_layer_range, compressed_file, *[int(layer) for layer in layer_range.split()], output_file,
+                            self.machine_cpus[machine])
+        future.add_done_callback(lambda f: QTimer.singleShot(0, partial(self._layer_range_callback, f, gce, compressed_file)))
+
+    def _layer_range_callback(self, future, gce, compressed_file):
+        try:
+            result = future.result()
+        except Exception as e:
+            result = {"error": str(e)}
+        if "error" in result:
+            self.add_message_to_current_status(f"Partial decompression failed: {result['error']}", MessageLevel.ALERT)
+            return
+        self.add_message_to_current_status(f"Layers {result['layers'][0]}-{result['layers'][1] - 1} of {Path(compressed_file).name} are in {result['output']} "
+                                           f"({result['decompressed_groups']} groups decompressed on {result['workers']} cores, "
+                                           f"{result['cached_groups']} already there, {result['time']:.1f} s).")
+        self.verify_decompressed_file(gce, compressed_file, result["output"], f"{result['error_bound']:g}", result["eb_mode"],
+                                      layer_range=tuple(result["layers"]), dimension=result["dimension"],
+                                      manifest={"original": result["original"], "dtype": result["dtype"]})
+
+    def make_trial_commands(self, machine: str):
+        # builds the compress/decompress command templates of the selected compressor for a trial on a sample
+        if self.compressorTabWidget.currentIndex() == self.SZ3_tab_index:
+            executable = (self.sz3_executable_lineEdit_MA if machine == "A" else self.sz3_executable_lineEdit_MB).text()
+            mode = "REL" if self.sz3_eb_mode_rel_radiobutton.isChecked() else "ABS"
+            if self.sz3_eb_mode_abs_and_rel_radiobutton.isChecked():
+                mode = "ABS_AND_REL"
+            return lambda dimension: (
+                CompressorCmdFactory.make_sz3_compress_cmd(executable, "{input}", "{compressed}", dimension, mode, "{eb}"),
+                CompressorCmdFactory.make_sz3_decompress_cmd(executable, "{compressed}", "{decompressed}", dimension, mode, "{eb}"))
+        if self.compressorTabWidget.currentIndex() == self.SZ_SPLIT_tab_index:
+            executable = (self.sz_split_executable_lineEdit_MA if machine == "A" else self.sz_split_executable_lineEdit_MB).text()
+            depth = self.szSplitLayerDepthSpinBox.value()
+            threads = self.szSplitnTaskSpinBox.value()
+            return lambda dimension: (
+                CompressorCmdFactory.make_szsplit_compress_cmd(executable, "{input}", "{compressed}", dimension, "{eb}",
+                                                               min(depth, int(dimension[-1])), threads, False),
+                CompressorCmdFactory.make_szsplit_decompress_cmd(executable, "{compressed}", "{decompressed}", dimension, "{eb}",
+                                                                 min(depth, int(dimension[-1])), threads, False))
+        return None
+
     def on_click_preview_data_button_ma(self):
         gce = self.gce_machine_a
         filename = self.workdir_listwidget_a.selectedItems()[0].text()
@@ -437,8 +580,17 @@ class UI(QDialog):
             QMessageBox.information(self, "Preview Error", "You need to set data dimension before preview!", QMessageBox.StandardButton.Close)
             return
         filepath = str(Path(self.workdir_lineedit_a.text()) / filename) 
-        preview_dialog = PreviewDialog(gce=gce, dataDimension=dimension, file_path=filepath, default_eb=float(self.sz3_error_bound_lineEdit.text()))
-        if preview_dialog.exec_() == QDialog.Accepted:
+        preview_dialog = PreviewDialog(gce=gce, dataDimension=dimension, file_path=filepath, default_eb=float(self.sz3_error_bound_lineEdit.text()),
+                                       cache_dir=self.get_endpoint_cache_dir(self.workdir_lineedit_a.text()),
+                                       stats_dir=self.get_endpoint_cache_dir(self.workdir_lineedit_a.text(), "stats"),
+                                       work_dir=self.workdir_lineedit_a.text().strip() or None, trial_commands=self.make_trial_commands("A"),
+                                       predictor=self.predictor_a, prediction_threads=self.szSplitnTaskSpinBox.value(),
+                                       decompressed_path=self.guess_decompressed_path(self.workdir_lineedit_a.text(), filename))
+        accepted = preview_dialog.exec_() == QDialog.Accepted
+        if preview_dialog.volumeStats is not None:
+            self.volume_statistics[("A", filepath)] = preview_dialog.volumeStats
+            self.report_layer_statistics(preview_dialog.volumeStats, self.sz3_error_bound_lineEdit.text(), self.szSplitLayerDepthSpinBox.value())
+        if accepted:
             self.rects = preview_dialog.getRects()
             self.regions = [rect[1] for rect in self.rects]
             self.ranges = preview_dialog.getRanges()
@@ -452,8 +604,17 @@ class UI(QDialog):
         filename = self.workdir_listwidget_b.selectedItems()[0].text()
         dimension = self.sz3_data_dimension_lineEdit.text()
         filepath = str(Path(self.workdir_lineedit_b.text()) / filename) 
-        preview_dialog = PreviewDialog(gce=gce, dataDimension=dimension, file_path=filepath, default_eb=float(self.sz3_error_bound_lineEdit.text()))
-        if preview_dialog.exec_() == QDialog.Accepted:
+        preview_dialog = PreviewDialog(gce=gce, dataDimension=dimension, file_path=filepath, default_eb=float(self.sz3_error_bound_lineEdit.text()),
+                                       cache_dir=self.get_endpoint_cache_dir(self.workdir_lineedit_b.text()),
+                                       stats_dir=self.get_endpoint_cache_dir(self.workdir_lineedit_b.text(), "stats"),
+                                       work_dir=self.workdir_lineedit_b.text().strip() or None, trial_commands=self.make_trial_commands("B"),
+                                       predictor=self.predictor_b, prediction_threads=self.szSplitnTaskSpinBox.value(),
+                                       decompressed_path=self.guess_decompressed_path(self.workdir_lineedit_b.text(), filename))
+        accepted = preview_dialog.exec_() == QDialog.Accepted
+        if preview_dialog.volumeStats is not None:
+            self.volume_statistics[("B", filepath)] = preview_dialog.volumeStats
+            self.report_layer_statistics(preview_dialog.volumeStats, self.sz3_error_bound_lineEdit.text(), self.szSplitLayerDepthSpinBox.value())
+        if accepted:
             self.rects = preview_dialog.getRects()
             self.regions = [rect.dataRect for rect in self.rects]
             self.ranges = preview_dialog.getRanges()
@@ -547,13 +708,70 @@ class UI(QDialog):
         future = self.gce_machine_b.submit(run_command, " ".join([executable, "--help"]))
         future.add_done_callback(lambda f: print("Machine B FastqZip Test Executable result: ", f.result()))
     
-    def _submit_sbatch_job(self, filepath, machine):
+    def report_layer_statistics(self, stats, eb, layer_depth):
+        value_range = stats["max"] - stats["min"]
+        relative_eb = float(eb) / value_range if value_range > 0 else float("inf")
+        self.add_message_to_current_status(f"Data range [{stats['min']:.6g}, {stats['max']:.6g}], error bound {eb} is {relative_eb:.3g} of the range.")
+        if "layer_min" in stats:
+            # value range of every group of layer_depth layers that sz_split compresses together
+            group_starts = np.arange(0, len(stats["layer_min"]), max(layer_depth, 1))
+            group_min = np.minimum.reduceat(stats["layer_min"], group_starts)
+            group_max = np.maximum.reduceat(stats["layer_max"], group_starts)
+            group_range = np.where(np.isfinite(group_max - group_min), group_max - group_min, 0)
+            widest = int(np.argmax(group_range))
+            self.add_message_to_current_status(f"Widest layer group starts at layer {group_starts[widest]} with range {group_range[widest]:.6g}.")
+            nan_layers = np.count_nonzero(stats["layer_nan_count"])
+            if nan_layers > 0:
+                self.add_message_to_current_status(f"{nan_layers} layers contain NaN/Inf values!", MessageLevel.WARNING)
+
+    def _submit_sbatch_job(self, filepath, machine, on_submitted=None):
+        # on_submitted(job_id) runs on the GUI thread once sbatch accepted the job
         if machine == "A":
             future = self.gce_machine_a.submit(run_command, f"sbatch {filepath}")
             future.add_done_callback(lambda f: print("submitted sbatch script to machine A: ", f.result()))
         else:
             future = self.gce_machine_b.submit(run_command, f"sbatch {filepath}")
             future.add_done_callback(lambda f: print("submitted sbatch script to machine B: ", f.result()))
+        if on_submitted is not None:
+            future.add_done_callback(lambda f: QTimer.singleShot(0, partial(self._sbatch_submitted_callback, f, on_submitted)))
+
+    def after_job(self, machine: str, job_id: str, action):
+        # action() runs on the GUI thread once squeue no longer lists the job, the client polls so that no
+        # endpoint worker is held for the whole job
+        self.job_actions[machine].setdefault(str(job_id), []).append(action)
+        if not self.job_action_timer.isActive():
+            self.job_action_timer.start()
+
+    def check_pending_jobs(self):
+        for machine, actions in self.job_actions.items():
+            if len(actions) == 0:
+                continue
+            gce = self.gce_machine_a if machine == "A" else self.gce_machine_b
+            future = gce.submit(run_command, "squeue -h -o %i")
+            future.add_done_callback(lambda f, machine=machine: QTimer.singleShot(0, partial(self._pending_jobs_callback, f, machine)))
+
+    def _pending_jobs_callback(self, future, machine):
+        try:
+            queued = set(future.result().split())
+        except Exception as e:
+            print(f"cannot list the queued jobs on machine {machine}:", e)
+            return
+        for job_id in [job_id for job_id in self.job_actions[machine] if job_id not in queued]:
+            for action in self.job_actions[machine].pop(job_id):
+                action()
+        if not any(self.job_actions.values()):
+            self.job_action_timer.stop()
+
+    def _sbatch_submitted_callback(self, future, on_submitted):
+        try:
+            job_id = re.search(r"Submitted batch job (\d+)", future.result())
+        except Exception as e:
+            print("the sbatch submission failed:", e)
+            return
+        if job_id is None:
+            print("no job id in the sbatch output:", future.result())
+            return
+        on_submitted(job_id.group(1))
 
     def on_click_build_index(self):
         reference_path = self.referencePath_lineEdit.text()
@@ -631,14 +849,43 @@ class UI(QDialog):
         filename = self.dataset_dir_listWidget.selectedItems()[0].text()
         if self.machine_a_radio_button.isChecked():
             gce = self.gce_machine_a
+            work_dir = self.workdir_lineedit_a.text()
+            machine = "A"
         elif self.machine_b_radio_button.isChecked():
             gce = self.gce_machine_b
+            work_dir = self.workdir_lineedit_b.text()
+            machine = "B"
         else:
             QMessageBox.information(self, "Preview Data", "You need to select which machine the data is on", QMessageBox.StandardButton.Close)
             return
-        dimension = self.sz3_data_dimension_lineEdit.text()
         filepath = str(Path(self.dataset_directory_lineEdit.text()) / filename) 
-        preview_dialog = PreviewDialog(gce=gce, dataDimension=dimension, file_path=filepath, default_eb=float(self.sz3_error_bound_lineEdit.text()))
+        listed = [self.dataset_dir_listWidget.item(i).text() for i in range(self.dataset_dir_listWidget.count())]
+        if filename + MANIFEST_SUFFIX in listed:
+            # a compressed output previews the data it was compressed from, with the metadata of its manifest
+            self.load_manifest(gce, filepath, partial(self.open_preview_dialog, gce, work_dir, machine, filepath, filename), verify_checksums=False)
+            return
+        self.open_preview_dialog(gce, work_dir, machine, filepath, filename)
+
+    def open_preview_dialog(self, gce, work_dir, machine, filepath, filename, manifest=None):
+        dimension = self.sz3_data_dimension_lineEdit.text()
+        default_eb = float(self.sz3_error_bound_lineEdit.text())
+        decompressed_path = self.guess_decompressed_path(work_dir, filename)
+        if manifest is not None:
+            if manifest.get("original") is None:
+                self.add_message_to_current_status(f"The manifest of {filename} does not name the original data to preview.", MessageLevel.WARNING)
+                return
+            dimension = " ".join(str(dim) for dim in manifest["dimension"])
+            default_eb = manifest["error_bound"]
+            # the error map of an indexed archive decompresses the shown layer from the archive itself
+            decompressed_path = filepath if filename.endswith(".szg") else str(Path(work_dir) / (filename + (".dpr" if filename.endswith(".szr") else ".dp")))
+            filepath = manifest["original"]["path"]
+        preview_dialog = PreviewDialog(gce=gce, dataDimension=dimension, file_path=filepath, default_eb=default_eb,
+                                       cache_dir=self.get_endpoint_cache_dir(work_dir),
+                                       stats_dir=self.get_endpoint_cache_dir(work_dir, "stats"),
+                                       work_dir=work_dir.strip() or None, trial_commands=self.make_trial_commands(machine),
+                                       predictor=self.predictor_a if machine == "A" else self.predictor_b,
+                                       prediction_threads=self.szSplitnTaskSpinBox.value(),
+                                       decompressed_path=decompressed_path)
         if preview_dialog.exec_() == QDialog.Accepted:
             self.rects = preview_dialog.getRects()
             self.regions = self.rects
@@ -648,6 +895,99 @@ class UI(QDialog):
         else:
             print("Use clicked cancel in the preview dialog")
 
+    def on_click_thumbnails_button(self):
+        filenames = [self.dataset_dir_listWidget.item(i).text() for i in range(self.dataset_dir_listWidget.count())]
+        if len(filenames) == 0:
+            QMessageBox.information(self, "Thumbnails", "You need to list the dataset first", QMessageBox.StandardButton.Close)
+            return
+        if self.machine_a_radio_button.isChecked():
+            gce = self.gce_machine_a
+        elif self.machine_b_radio_button.isChecked():
+            gce = self.gce_machine_b
+        else:
+            QMessageBox.information(self, "Thumbnails", "You need to select which machine the data is on", QMessageBox.StandardButton.Close)
+            return
+        dimension = self.sz3_data_dimension_lineEdit.text()
+        if dimension.strip() == "":
+            QMessageBox.information(self, "Thumbnails", "You need to set data dimension before preview!", QMessageBox.StandardButton.Close)
+            return
+        # one remote call renders the whole directory
+        gallery_dialog = ThumbnailGalleryDialog(gce=gce, data_dir=self.dataset_directory_lineEdit.text().strip(),
+                                                filenames=filenames, dataDimension=dimension)
+        if gallery_dialog.exec_() == QDialog.Accepted and gallery_dialog.getSelectedFile() is not None:
+            matches = self.dataset_dir_listWidget.findItems(gallery_dialog.getSelectedFile(), Qt.MatchExactly)
+            self.dataset_dir_listWidget.clearSelection()
+            matches[0].setSelected(True)
+            self.on_click_preview_selected_button()
+
+    def on_click_search_eb_button(self):
+        if self.compressorTabWidget.currentIndex() not in (self.SZ3_tab_index, self.SZ_SPLIT_tab_index):
+            QMessageBox.information(self, "Search Error Bound", "The search works with the SZ3 and SZ_SPLIT compressors", QMessageBox.StandardButton.Close)
+            return
+        if len(self.dataset_dir_listWidget.selectedItems()) == 0:
+            QMessageBox.information(self, "Search Error Bound", "You need to select one file in the dataset", QMessageBox.StandardButton.Close)
+            return
+        if self.machine_a_radio_button.isChecked():
+            gce, work_dir, machine = self.gce_machine_a, self.workdir_lineedit_a.text().strip(), "A"
+        elif self.machine_b_radio_button.isChecked():
+            gce, work_dir, machine = self.gce_machine_b, self.workdir_lineedit_b.text().strip(), "B"
+        else:
+            QMessageBox.information(self, "Search Error Bound", "You need to select which machine the data is on", QMessageBox.StandardButton.Close)
+            return
+        if gce is None:
+            QMessageBox.information(self, "Search Error Bound", f"You need to register Globus Compute for machine {machine} first", QMessageBox.StandardButton.Close)
+            return
+        dimension = self.sz3_data_dimension_lineEdit.text().split()
+        if len(dimension) not in (2, 3):
+            QMessageBox.information(self, "Search Error Bound", "You need to set a 2D or 3D data dimension first", QMessageBox.StandardButton.Close)
+            return
+        target_text, ok = QInputDialog.getItem(self, "Search Error Bound", "Target", ["compression ratio", "PSNR (dB)"], 0, False)
+        if not ok:
+            return
+        target = "ratio" if target_text == "compression ratio" else "psnr"
+        target_value, ok = QInputDialog.getDouble(self, "Search Error Bound", f"Minimum {target_text}",
+                                                  value=20.0 if target == "ratio" else 80.0, min=1.0, max=1000.0, decimals=2)
+        if not ok:
+            return
+        # the trials run on a few evenly spaced layers, like the trial compression of the preview
+        sample_layers = 1
+        if len(dimension) == 3:
+            sample_layers = max(1, min(4, int(dimension[2]), (1 << 24) // (int(dimension[0]) * int(dimension[1]))))
+        sample_dimension = dimension[:2] + [str(sample_layers)] if len(dimension) == 3 else dimension
+        compress_command, decompress_command = self.make_trial_commands(machine)(sample_dimension)
+        eb_mode = "REL" if self.compressorTabWidget.currentIndex() == self.SZ3_tab_index and self.sz3_eb_mode_rel_radiobutton.isChecked() else "ABS"
+        filepath = str(Path(self.dataset_directory_lineEdit.text()) / self.dataset_dir_listWidget.selectedItems()[0].text())
+        key = (machine, filepath, " ".join(dimension), compress_command, decompress_command)
+        self.sz3_search_eb_button.setEnabled(False)
+        self.add_message_to_current_status(f"Searching the error bound for {target_text} >= {target_value} on {sample_layers} sampled layers...")
+        future = gce.submit(search_error_bound, " ".join(dimension), filepath, compress_command, decompress_command, target, target_value,
+                            work_dir, False, eb_mode, sample_layers, 8, None, self.eb_search_probes.get(key))
+        future.add_done_callback(lambda f: QTimer.singleShot(0, partial(self._search_eb_callback, f, key, target, target_value)))
+
+    def _search_eb_callback(self, future, key, target, target_value):
+        self.sz3_search_eb_button.setEnabled(True)
+        try:
+            result = future.result()
+        except Exception as e:
+            self.add_message_to_current_status(f"The error bound search failed: {e}", MessageLevel.ALERT)
+            return
+        if "probes" in result:
+            self.eb_search_probes[key] = result["probes"]
+        if "error" in result:
+            self.add_message_to_current_status(f"The error bound search failed: {result['error']}", MessageLevel.ALERT)
+            return
+        target_text = "compression ratio" if target == "ratio" else "PSNR"
+        if result["error_bound"] is None:
+            best = max(result["probes"].values(), key=lambda probe: probe[target])
+            self.add_message_to_current_status(f"No error bound reaches {target_text} {target_value}, the best trial gave {best[target]:.2f}.", MessageLevel.WARNING)
+            return
+        self.sz3_error_bound_lineEdit.setText(f"{result['error_bound']:g}")
+        probe = result["result"]
+        level = MessageLevel.SUCCESS if result["converged"] else MessageLevel.WARNING
+        self.add_message_to_current_status(f"Error bound {result['error_bound']:g}: ratio {probe['ratio']:.2f}, PSNR {probe['psnr']:.2f} dB "
+                                           f"on the sampled layers {result['layers']} ({result['trials']} new trials"
+                                           f"{'' if result['converged'] else ', stopped before converging'}).", level)
+
     def sz3_compress_data_machine_a(self):
         dimension = self.sz3_data_dimension_lineEdit.text().split()
         errorbound = self.sz3_error_bound_lineEdit.text()
@@ -665,9 +1005,11 @@ class UI(QDialog):
         executable = self.sz3_executable_lineEdit_MA.text()
         compressed_filename = str(Path(self.workdir_lineedit_a.text()) / (filename + ".sz"))
         command = CompressorCmdFactory.make_sz3_compress_cmd(executable, filepath, compressed_filename, dimension, mode, errorbound)
+        manifest = self.make_manifest("sz3", filepath, dimension, mode, errorbound,
+                                      CompressorCmdFactory.make_sz3_decompress_cmd(executable, "{compressed}", "{decompressed}", dimension, mode, "{eb}"))
         future = self.gce_machine_a.submit(run_command, command)
         print("Machine A compression task has been submitted")
-        future.add_done_callback(lambda f: (print("machine A compression result:", f.result()), self.on_click_list_workdir_button_a()))
+        future.add_done_callback(lambda f: QTimer.singleShot(0, partial(self._compressed_callback, f, self.gce_machine_a, compressed_filename, manifest, "A")))
         QMessageBox.information(self, "Compress", "The compression task on Machine A has been submitted!", QMessageBox.StandardButton.Close)
 
     def sz_region_compress_data_machine_a(self):
@@ -688,10 +1030,10 @@ class UI(QDialog):
             QMessageBox.information(self, "Compress Selected", "You need to select a compression method to proceed!", QMessageBox.StandardButton.Close)
             return
         print("sz_region compress command: ", command)
+        manifest = self.make_region_manifest(executable, filepath, dimension, errorbound)
         future = self.gce_machine_a.submit(run_command, command)
-            
         print("compression task has been submitted!")
-        future.add_done_callback(lambda f: self._compress_selected_callback(f, "A"))
+        future.add_done_callback(lambda f: QTimer.singleShot(0, partial(self._compressed_callback, f, self.gce_machine_a, compressed_filename, manifest, "A")))
 
     def sz_split_compress_data_machine_a(self):
         if len(self.workdir_listwidget_a.selectedItems()) != 1:
@@ -737,9 +1079,11 @@ class UI(QDialog):
         executable = self.sz3_executable_lineEdit_MB.text()
         compressed_filename = str(Path(self.workdir_lineedit_b.text()) / (filename + ".sz"))
         command = CompressorCmdFactory.make_sz3_compress_cmd(executable, filepath, compressed_filename, dimension, mode, errorbound)
+        manifest = self.make_manifest("sz3", filepath, dimension, mode, errorbound,
+                                      CompressorCmdFactory.make_sz3_decompress_cmd(executable, "{compressed}", "{decompressed}", dimension, mode, "{eb}"))
         future = self.gce_machine_b.submit(run_command, command)
         print("Machine B compression task has been submitted")
-        future.add_done_callback(lambda f: (print("machine B compression result:", f.result()), self.on_click_list_workdir_button_b()))
+        future.add_done_callback(lambda f: QTimer.singleShot(0, partial(self._compressed_callback, f, self.gce_machine_b, compressed_filename, manifest, "B")))
         QMessageBox.information(self, "Compress", "The compression task on Machine B has been submitted!", QMessageBox.StandardButton.Close)
 
     def sz_region_compress_data_machine_b(self):
@@ -760,9 +1104,10 @@ class UI(QDialog):
             QMessageBox.information(self, "Compress Selected", "You need to select a compression method to proceed!", QMessageBox.StandardButton.Close)
             return
         print("sz_region compress command: ", command)
+        manifest = self.make_region_manifest(executable, filepath, dimension, errorbound)
         future = self.gce_machine_b.submit(run_command, command)
         print("compression task has been submitted!")
-        future.add_done_callback(lambda f: self._compress_selected_callback(f, "B"))
+        future.add_done_callback(lambda f: QTimer.singleShot(0, partial(self._compressed_callback, f, self.gce_machine_b, compressed_filename, manifest, "B")))
     
     def sz_split_compress_data_machine_b(self):
         if len(self.workdir_listwidget_b.selectedItems()) != 1:
@@ -806,10 +1151,10 @@ class UI(QDialog):
         filepath = str(Path(self.workdir_lineedit_a.text()) / filename)
         executable = self.sz3_executable_lineEdit_MA.text()
         decompressed_filename = str(Path(self.workdir_lineedit_a.text()) / (filename + ".dp"))
-        command = CompressorCmdFactory.make_sz3_decompress_cmd(executable, filepath, decompressed_filename, dimension, mode, errorbound)
-        future = self.gce_machine_a.submit(run_command, command)
+        self.load_manifest(self.gce_machine_a, filepath, partial(self.sz3_decompress_with_manifest, self.gce_machine_a, executable, filepath,
+                                                               decompressed_filename, dimension, mode, errorbound,
+                                                               on_done=self.on_click_list_workdir_button_a))
         print("Machine A decompression task has been submitted")
-        future.add_done_callback(lambda f: (print("machine A decompression result:", f.result()), self.on_click_list_workdir_button_a()))
 
         QMessageBox.information(self, "Decompress", "The decompression task on machine A has been submitted!", QMessageBox.StandardButton.Close)
 
@@ -822,18 +1167,8 @@ class UI(QDialog):
         executable = self.sz_region_executable_lineEdit_MA.text()
 
         filepath = str(Path(self.workdir_lineedit_a.text()) / filename)
-        if self.multi_region_compress_radio_button.isChecked():
-            command = CompressorCmdFactory.make_sz_region_decompress_cmd(executable, filepath, decompressed_filename, dimension, mode, errorbound, regions=self.regions)
-        elif self.multi_range_compress_radio_button.isChecked():
-            command = CompressorCmdFactory.make_sz_region_decompress_cmd(executable, filepath, decompressed_filename, dimension, mode, errorbound, ranges=self.ranges)
-        else:
-            print("neither multi-range nor multi-region is checked!")
-            QMessageBox.information(self, "Decompress Selected", "You need to select a compression method to proceed!", QMessageBox.StandardButton.Close)
-            return
-        print("sz_region decompress command: ", command)
-        future = self.gce_machine_a.submit(run_command, command)
-        print("compression task has been submitted!")
-        future.add_done_callback(lambda f: self._compress_selected_callback(f, "A"))
+        self.load_manifest(self.gce_machine_a, filepath, partial(self.sz_region_decompress_with_manifest, self.gce_machine_a, "A", executable,
+                                                                 filepath, decompressed_filename, dimension, mode, errorbound))
     
     def sz_split_decompress_machine_a(self):
         if len(self.workdir_listwidget_a.selectedItems()) != 1:
@@ -878,10 +1213,10 @@ class UI(QDialog):
         filepath = str(Path(self.workdir_lineedit_b.text()) / filename)
         executable = self.sz3_executable_lineEdit_MB.text()
         decompressed_filename = str(Path(self.workdir_lineedit_b.text()) / (filename + ".dp"))
-        command = CompressorCmdFactory.make_sz3_decompress_cmd(executable, filepath, decompressed_filename, dimension, mode, errorbound)
-        future = self.gce_machine_b.submit(run_command, command)
+        self.load_manifest(self.gce_machine_b, filepath, partial(self.sz3_decompress_with_manifest, self.gce_machine_b, executable, filepath,
+                                                               decompressed_filename, dimension, mode, errorbound,
+                                                               on_done=self.on_click_list_workdir_button_b))
         print("Machine B decompression task has been submitted")
-        future.add_done_callback(lambda f: (print("machine B decompression result:", f.result()), self.on_click_list_workdir_button_b()))
         QMessageBox.information(self, "Decompress", "The decompression task on machine B has been submitted!", QMessageBox.StandardButton.Close)
 
     def sz_region_decompress_machine_b(self):
@@ -893,18 +1228,8 @@ class UI(QDialog):
         executable = self.sz_region_executable_lineEdit_MB.text()
 
         filepath = str(Path(self.workdir_lineedit_b.text()) / filename)
-        if self.multi_region_compress_radio_button.isChecked():
-            command = CompressorCmdFactory.make_sz_region_decompress_cmd(executable, filepath, decompressed_filename, dimension, mode, errorbound, regions=self.regions)
-        elif self.multi_range_compress_radio_button.isChecked():
-            command = CompressorCmdFactory.make_sz_region_decompress_cmd(executable, filepath, decompressed_filename, dimension, mode, errorbound, ranges=self.ranges)
-        else:
-            print("neither multi-range nor multi-region is checked!")
-            QMessageBox.information(self, "Decompress Selected", "You need to select a compression method to proceed!", QMessageBox.StandardButton.Close)
-            return
-        print("sz_region decompress command: ", command)
-        future = self.gce_machine_b.submit(run_command, command)
-        print("compression task has been submitted!")
-        future.add_done_callback(lambda f: self._compress_selected_callback(f, "B"))
+        self.load_manifest(self.gce_machine_b, filepath, partial(self.sz_region_decompress_with_manifest, self.gce_machine_b, "B", executable,
+                                                                 filepath, decompressed_filename, dimension, mode, errorbound))
 
     def sz_split_decompress_machine_b(self):
         if len(self.workdir_listwidget_b.selectedItems()) != 1:
@@ -943,6 +1268,147 @@ class UI(QDialog):
             print("submitted a request to list workdir b")
 
 
+    def region_verification_settings(self):
+        # the same rectangles and ranges that make_sz_region_compress_cmd passes to the compressor, ranges rounded like there
+        if self.multi_region_compress_radio_button.isChecked() and self.regions is not None:
+            regions = [(region.dataRect.start_x, region.dataRect.start_y, region.dataRect.length_x, region.dataRect.length_y, region.eb)
+                       for region in self.regions]
+            return regions, None
+        if self.multi_range_compress_radio_button.isChecked() and self.ranges is not None:
+            return None, [(round(cur_range.low, 2), round(cur_range.high, 2), cur_range.eb) for cur_range in self.ranges]
+        return None, None
+
+    def verify_decompressed_file(self, gce, compressed_file: str, decompressed_file: str, eb: str, eb_mode: str = "ABS", job_id: str = None,
+                                 regions: list = None, ranges: list = None, layer_range: tuple = None, dimension: str = None,
+                                 manifest: dict = None, machine: str = None):
+        # the output of a batch job on machine is verified once the job has left the queue
+        if job_id is not None:
+            self.after_job(machine, job_id, partial(self.verify_decompressed_file, gce, compressed_file, decompressed_file, eb, eb_mode, None,
+                                                    regions, ranges, layer_range, dimension, manifest))
+            return
+        # the manifest knows the original, without one it is expected next to the compressed file under its name
+        # without the compressor suffix
+        original = (manifest or {}).get("original")
+        original_file = original["path"] if isinstance(original, dict) else original
+        compressed_path = Path(compressed_file)
+        if not original_file and compressed_path.suffix not in (".sz", ".szsplit", ".szr", ".szg"):
+            self.add_message_to_current_status(f"Cannot tell the original of {compressed_path.name}, the decompressed file is not verified.", MessageLevel.WARNING)
+            return
+        original_file = original_file or str(compressed_path.with_suffix(""))
+        dimension = dimension or self.sz3_data_dimension_lineEdit.text()
+        is_float64 = (manifest or {}).get("dtype") == "float64"
+        # verification reports are saved next to the decompressed output
+        future = gce.submit(verify_decompression, dimension, original_file, decompressed_file, float(eb), eb_mode, is_float64, None,
+                            1 << 22, None, decompressed_file + ".verify.json", regions, ranges, layer_range)
+        future.add_done_callback(lambda f: QTimer.singleShot(0, partial(self._verify_decompression_callback, f, decompressed_file)))
+
+    def _verify_decompression_callback(self, future, decompressed_file):
+        try:
+            report = future.result()
+        except Exception as e:
+            self.add_message_to_current_status(f"Verifying {Path(decompressed_file).name} failed: {e}", MessageLevel.ALERT)
+            return
+        if "error" in report:
+            self.add_message_to_current_status(f"{Path(decompressed_file).name} is not verified: {report['error']}", MessageLevel.WARNING)
+            return
+        print("verification report:", report)
+        checked = "" if report.get("layer_range") is None else " layers {}-{}".format(report["layer_range"][0], report["layer_range"][1] - 1)
+        self.add_message_to_current_status(f"{Path(decompressed_file).name}{checked}: max error {report['max_error']:.6g} (bound {report['absolute_bound']:.6g}), "
+                                           f"RMSE {report['rmse']:.6g}, PSNR {report['psnr']:.2f} dB, "
+                                           f"range-relative error {report['max_relative_error']:.3g}, checked at {report['throughput']:.0f} MB/s.")
+        if "save_error" in report:
+            self.add_message_to_current_status(f"The verification report was not saved: {report['save_error']}", MessageLevel.WARNING)
+        for group in report.get("groups", []):
+            if "region" in group:
+                name = "region x {} y {} size {}x{}".format(*group["region"])
+            elif "range" in group:
+                name = f"range [{group['range'][0]:.6g}, {group['range'][1]:.6g}]"
+            else:
+                name = "rest of the data"
+            self.add_message_to_current_status(f"{name} (bound {group['eb']:.6g}): max error {group['max_error']:.6g}, RMSE {group['rmse']:.6g}, "
+                                               f"{group['violations']} of {group['count']} values beyond the bound.",
+                                               MessageLevel.ALERT if group["violations"] > 0 else MessageLevel.INFO)
+        if report["violations"] > 0:
+            self.add_message_to_current_status(f"{report['violations']} values ({report['violation_ratio']:.3g}) exceed the error bound, "
+                                               f"the first at (layer, row, col) {tuple(report['first_violation'])}!", MessageLevel.ALERT)
+        elif report["nan_mismatch"] > 0:
+            self.add_message_to_current_status(f"{report['nan_mismatch']} NaN/Inf values were not preserved!", MessageLevel.WARNING)
+        else:
+            self.add_message_to_current_status("The error bound holds everywhere.", MessageLevel.SUCCESS)
+        if "report" in report:
+            self.add_message_to_current_status(f"Verification report saved to {report['report']}")
+
+    def make_manifest(self, compressor: str, original_file: str, dimension: List, mode: str, eb: str, decompress_command: str, **settings):
+        # what write_manifest records about an output, the command is a template with {compressed}, {decompressed} and {eb}
+        # without a dtype setting write_manifest takes it from the size of the original file
+        manifest = {"compressor": compressor, "dimension": [int(dim) for dim in dimension], "eb_mode": mode,
+                    "error_bound": float(eb), "decompress_command": decompress_command, "original": original_file}
+        manifest.update({key: value for key, value in settings.items() if value is not None})
+        return manifest
+
+    def make_region_manifest(self, executable: str, original_file: str, dimension: List, eb: str):
+        # the regions and ranges are recorded the way the verification checks them
+        regions, ranges = self.region_verification_settings()
+        command = CompressorCmdFactory.make_sz_region_decompress_cmd(executable, "{compressed}", "{decompressed}", dimension, "compress", "{eb}",
+                                                                     regions=self.regions if regions is not None else None,
+                                                                     ranges=self.ranges if ranges is not None else None)
+        return self.make_manifest("sz_region", original_file, dimension, "ABS", eb, command, regions=regions, ranges=ranges)
+
+    def _compressed_callback(self, future, gce, compressed_file: str, manifest: dict, machine: str):
+        try:
+            print("compression result:", future.result())
+        except Exception as e:
+            self.add_message_to_current_status(f"Compressing {Path(compressed_file).name} failed: {e}", MessageLevel.ALERT)
+            return
+        self.write_output_manifest(gce, compressed_file, manifest, machine)
+
+    def write_output_manifest(self, gce, compressed_file: str, manifest: dict, machine: str, job_id: str = None):
+        # the manifest of a batch job output is written once the job has left the queue
+        if job_id is not None:
+            self.after_job(machine, job_id, partial(self.write_output_manifest, gce, compressed_file, manifest, machine))
+            self.add_message_to_current_status(f"The manifest of {Path(compressed_file).name} is written when job {job_id} is done.")
+            return
+        future = gce.submit(write_manifest, compressed_file, manifest)
+        future.add_done_callback(lambda f: QTimer.singleShot(0, partial(self._write_manifest_callback, f, compressed_file, machine)))
+
+    def _write_manifest_callback(self, future, compressed_file: str, machine: str):
+        try:
+            result = future.result()
+        except Exception as e:
+            result = {"error": str(e)}
+        if "error" in result:
+            self.add_message_to_current_status(f"{Path(compressed_file).name} has no manifest: {result['error']}", MessageLevel.WARNING)
+        else:
+            ratio = "" if result["ratio"] is None else f", ratio {result['ratio']:.2f}"
+            self.add_message_to_current_status(f"{Path(compressed_file).name}: {result['size']} bytes in {result['chunks']} chunk(s){ratio}, "
+                                               f"described by {Path(result['manifest']).name}.", MessageLevel.SUCCESS)
+        if machine == "A":
+            self.on_click_list_workdir_button_a()
+        else:
+            self.on_click_list_workdir_button_b()
+
+    def load_manifest(self, gce, compressed_file: str, on_loaded, verify_checksums: bool = True):
+        # on_loaded(manifest) runs on the GUI thread, with None when there is no manifest and the settings in the app apply
+        future = gce.submit(read_manifest, compressed_file, verify_checksums)
+        future.add_done_callback(lambda f: QTimer.singleShot(0, partial(self._load_manifest_callback, f, compressed_file, on_loaded)))
+
+    def _load_manifest_callback(self, future, compressed_file: str, on_loaded):
+        try:
+            manifest = future.result()
+        except Exception as e:
+            manifest = {"error": str(e)}
+        if "error" in manifest:
+            self.add_message_to_current_status(f"{manifest['error']}, using the dimension and error bound set in the app.", MessageLevel.WARNING)
+            on_loaded(None)
+            return
+        if len(manifest.get("checksum_errors", [])) > 0:
+            self.add_message_to_current_status(f"{Path(compressed_file).name} is damaged or incomplete, chunks {manifest['checksum_errors']} "
+                                               f"do not match the manifest!", MessageLevel.ALERT)
+            return
+        self.add_message_to_current_status(f"{Path(compressed_file).name}: {manifest['compressor']}, dimension {' '.join(str(dim) for dim in manifest['dimension'])}, "
+                                           f"{manifest['eb_mode']} error bound {manifest['error_bound']:g}, from the manifest.")
+        on_loaded(manifest)
+
     def sz3_data_compression(self, filename):
         dimension = self.sz3_data_dimension_lineEdit.text().split()
         errorbound = self.sz3_error_bound_lineEdit.text()
@@ -961,18 +1427,69 @@ class UI(QDialog):
             QMessageBox.information(self, "Compress Selected", "You need to select a machine to proceed!", QMessageBox.StandardButton.Close)
             return
         filepath = str(Path(self.dataset_directory_lineEdit.text()) / filename) 
+        if self.sz3ParallelSlabsCheckBox.isChecked():
+            self.sz3_slab_compression(filepath, compressed_filename[:-len(".sz")] + ".szg", mode, errorbound)
+            return
         command = CompressorCmdFactory.make_sz3_compress_cmd(executable, filepath, compressed_filename, dimension, mode, errorbound)
         print("the sz3 compress command:", command)
+        manifest = self.make_manifest("sz3", filepath, dimension, mode, errorbound,
+                                      CompressorCmdFactory.make_sz3_decompress_cmd(executable, "{compressed}", "{decompressed}", dimension, mode, "{eb}"))
         if self.machine_a_radio_button.isChecked():
-            future = self.gce_machine_a.submit(run_command, command)
+            gce = self.gce_machine_a
             machine = "A"
         else:
-            future = self.gce_machine_b.submit(run_command, command)
+            gce = self.gce_machine_b
             machine = "B"
+        future = gce.submit(run_command, command)
         print("compression task has been submitted!")
-        future.add_done_callback(lambda f: self._compress_selected_callback(f, machine))
+        future.add_done_callback(lambda f: QTimer.singleShot(0, partial(self._compressed_callback, f, gce, compressed_filename, manifest, machine)))
         QMessageBox.information(self, "Compress Selected", "The compression task has been submitted!", QMessageBox.StandardButton.Close)
     
+    def sz3_slab_compression(self, filepath: str, archive_file: str, mode: str, errorbound: str):
+        # slabs compressed by concurrent sz3 processes on the endpoint, one per CPU lscpu reported. Several slabs
+        # per CPU balance the load and a slab stays within 1 GB, so the staging copies of the slabs in flight
+        # are small next to the data
+        machine = "A" if self.machine_a_radio_button.isChecked() else "B"
+        gce = self.gce_machine_a if machine == "A" else self.gce_machine_b
+        workers = self.machine_cpus[machine]
+        is_float64 = self.sz3Float64CheckBox.isChecked()
+        parsed_dimension = [int(dim) for dim in self.sz3_data_dimension_lineEdit.text().split()]
+        layers = parsed_dimension[2] if len(parsed_dimension) == 3 else 1
+        layer_bytes = parsed_dimension[0] * parsed_dimension[1] * (8 if is_float64 else 4)
+        depth = max(1, min(-(-layers // (4 * workers if workers else 16)), (1 << 30) // layer_bytes))
+        if mode == "REL":
+            # sz3 takes a REL bound relative to the range of its input, every slab would get its own bound, so it
+            # is turned into the ABS bound of the full volume range first
+            work_dir = (self.workdir_lineedit_a if machine == "A" else self.workdir_lineedit_b).text()
+            stats_future = gce.submit(get_volume_statistics, self.sz3_data_dimension_lineEdit.text(), filepath, is_float64, 256, 1 << 22,
+                                      self.get_endpoint_cache_dir(work_dir, "stats"))
+            stats_future.add_done_callback(lambda f: QTimer.singleShot(0, partial(self._slab_statistics_callback, f, gce, machine, filepath,
+                                                                                  archive_file, errorbound, depth, workers, is_float64)))
+            self.add_message_to_current_status(f"Reading the value range of {Path(filepath).name} for the REL error bound {errorbound}...")
+            return
+        self.submit_slab_compression(gce, machine, filepath, archive_file, mode, errorbound, depth, workers, is_float64)
+
+    def _slab_statistics_callback(self, future, gce, machine, filepath, archive_file, errorbound, depth, workers, is_float64):
+        try:
+            stats = future.result()
+        except Exception as e:
+            stats = {"error": str(e)}
+        if stats is None or "error" in stats:
+            reason = "no finite values" if stats is None else stats["error"]
+            self.add_message_to_current_status(f"Slab compression of {Path(filepath).name} needs the value range: {reason}", MessageLevel.ALERT)
+            return
+        value_range = stats["max"] - stats["min"]
+        abs_errorbound = f"{float(errorbound) * value_range:.6g}" if value_range > 0 else errorbound
+        self.add_message_to_current_status(f"REL error bound {errorbound} of the range {value_range:.6g} is the ABS bound {abs_errorbound}.")
+        self.submit_slab_compression(gce, machine, filepath, archive_file, "ABS", abs_errorbound, depth, workers, is_float64)
+
+    def submit_slab_compression(self, gce, machine, filepath, archive_file, mode, errorbound, depth, workers, is_float64):
+        compress_command, decompress_command = self.make_slab_commands(machine, mode, is_float64)
+        future = gce.submit(compress_layer_groups, self.sz3_data_dimension_lineEdit.text(), filepath, archive_file, compress_command,
+                            decompress_command, errorbound, depth, is_float64, workers, "sz3", mode)
+        future.add_done_callback(lambda f: QTimer.singleShot(0, partial(self._layer_groups_callback, f, machine)))
+        self.add_message_to_current_status(f"Compressing {Path(filepath).name} in slabs of {depth} layers on machine {machine}...")
+
     def sz3_data_decompression(self, filename):
         dimension = self.sz3_data_dimension_lineEdit.text().split()
         errorbound = self.sz3_error_bound_lineEdit.text()
@@ -990,14 +1507,35 @@ class UI(QDialog):
             QMessageBox.information(self, "Compress Selected", "You need to select a machine to proceed!", QMessageBox.StandardButton.Close)
             return
         filepath = str(Path(self.dataset_directory_lineEdit.text()) / filename) 
+        gce = self.gce_machine_a if self.machine_a_radio_button.isChecked() else self.gce_machine_b
+        if filename.endswith(".szg"):
+            self.decompress_archive_layers(gce, "A" if self.machine_a_radio_button.isChecked() else "B", filepath, decompressed_filename)
+            return
+        # the manifest of the output overrides the dimension, mode and error bound set in the app
+        self.load_manifest(gce, filepath, partial(self.sz3_decompress_with_manifest, gce, executable, filepath, decompressed_filename,
+                                                  dimension, mode, errorbound))
+        QMessageBox.information(self, "Decompress Selected", "You clicked the decompress selected button", QMessageBox.StandardButton.Close)
+
+    def sz3_decompress_with_manifest(self, gce, executable, filepath, decompressed_filename, dimension, mode, errorbound, manifest=None, on_done=None):
+        if manifest is not None:
+            dimension = [str(dim) for dim in manifest["dimension"]]
+            mode = manifest["eb_mode"]
+            errorbound = f"{manifest['error_bound']:g}"
         command = CompressorCmdFactory.make_sz3_decompress_cmd(executable, filepath, decompressed_filename, dimension, mode, errorbound)
-        if self.machine_a_radio_button.isChecked():
-            future = self.gce_machine_a.submit(run_command, command)
-        else:
-            future = self.gce_machine_b.submit(run_command, command)
+        future = gce.submit(run_command, command)
         print("decompression task has been submitted!")
-        future.add_done_callback(lambda f: print("decompression result:", f.result()))
-        QMessageBox.information(self, "Decompress Selected", "You clicked the decompress selected button", QMessageBox.StandardButton.Close)
+        future.add_done_callback(lambda f: QTimer.singleShot(0, partial(self._sz3_decompressed_callback, f, gce, filepath, decompressed_filename,
+                                                                        " ".join(dimension), mode, errorbound, on_done, manifest)))
+
+    def _sz3_decompressed_callback(self, future, gce, filepath, decompressed_filename, dimension, mode, errorbound, on_done=None, manifest=None):
+        try:
+            print("decompression result:", future.result())
+        except Exception as e:
+            self.add_message_to_current_status(f"Decompressing {Path(filepath).name} failed: {e}", MessageLevel.ALERT)
+            return
+        if on_done is not None:
+            on_done()
+        self.verify_decompressed_file(gce, filepath, decompressed_filename, errorbound, mode, dimension=dimension, manifest=manifest)
     
     def sz_region_data_compression(self, filename):
         dimension = self.sz3_data_dimension_lineEdit.text().split()
@@ -1023,14 +1561,16 @@ class UI(QDialog):
             QMessageBox.information(self, "Compress Selected", "You need to select a compression method to proceed!", QMessageBox.StandardButton.Close)
             return
         print("sz_region compress command: ", command)
+        manifest = self.make_region_manifest(executable, filepath, dimension, errorbound)
         if self.machine_a_radio_button.isChecked():
-            future = self.gce_machine_a.submit(run_command, command)
+            gce = self.gce_machine_a
             machine = "A"
         else:
-            future = self.gce_machine_b.submit(run_command, command)
+            gce = self.gce_machine_b
             machine = "B"
+        future = gce.submit(run_command, command)
         print("compression task has been submitted!")
-        future.add_done_callback(lambda f: self._compress_selected_callback(f, machine))
+        future.add_done_callback(lambda f: QTimer.singleShot(0, partial(self._compressed_callback, f, gce, compressed_filename, manifest, machine)))
 
 
     def sz_region_data_decompression(self, filename):
@@ -1048,23 +1588,38 @@ class UI(QDialog):
             QMessageBox.information(self, "Decompress Selected", "You need to select a machine to proceed!", QMessageBox.StandardButton.Close)
             return
         filepath = str(Path(self.dataset_directory_lineEdit.text()) / filename)
-        if self.multi_region_compress_radio_button.isChecked():
-            command = CompressorCmdFactory.make_sz_region_decompress_cmd(executable, filepath, decompressed_filename, dimension, mode, errorbound, regions=self.regions)
-        elif self.multi_range_compress_radio_button.isChecked():
-            command = CompressorCmdFactory.make_sz_region_decompress_cmd(executable, filepath, decompressed_filename, dimension, mode, errorbound, ranges=self.ranges)
-        else:
-            print("neither multi-range nor multi-region is checked!")
-            QMessageBox.information(self, "Decompress Selected", "You need to select a compression method to proceed!", QMessageBox.StandardButton.Close)
-            return
-        print("sz_region decompress command: ", command)
         if self.machine_a_radio_button.isChecked():
-            future = self.gce_machine_a.submit(run_command, command)
+            gce = self.gce_machine_a
             machine = "A"
         else:
-            future = self.gce_machine_b.submit(run_command, command)
+            gce = self.gce_machine_b
             machine = "B"
-        print("compression task has been submitted!")
-        future.add_done_callback(lambda f: self._compress_selected_callback(f, machine))
+        self.load_manifest(gce, filepath, partial(self.sz_region_decompress_with_manifest, gce, machine, executable, filepath,
+                                                  decompressed_filename, dimension, mode, errorbound))
+
+    def sz_region_decompress_with_manifest(self, gce, machine, executable, filepath, decompressed_filename, dimension, mode, errorbound, manifest=None):
+        # the manifest has the command, regions and ranges the output was compressed with, the app settings are the fallback
+        if manifest is not None:
+            dimension = [str(dim) for dim in manifest["dimension"]]
+            errorbound = f"{manifest['error_bound']:g}"
+            command = manifest["decompress_command"].format(compressed=filepath, decompressed=decompressed_filename, eb=errorbound)
+            regions, ranges = manifest.get("regions"), manifest.get("ranges")
+        else:
+            if self.multi_region_compress_radio_button.isChecked():
+                command = CompressorCmdFactory.make_sz_region_decompress_cmd(executable, filepath, decompressed_filename, dimension, mode, errorbound, regions=self.regions)
+            elif self.multi_range_compress_radio_button.isChecked():
+                command = CompressorCmdFactory.make_sz_region_decompress_cmd(executable, filepath, decompressed_filename, dimension, mode, errorbound, ranges=self.ranges)
+            else:
+                print("neither multi-range nor multi-region is checked!")
+                QMessageBox.information(self, "Decompress Selected", "You need to select a compression method to proceed!", QMessageBox.StandardButton.Close)
+                return
+            regions, ranges = self.region_verification_settings()
+        print("sz_region decompress command: ", command)
+        future = gce.submit(run_command, command)
+        print("decompression task has been submitted!")
+        future.add_done_callback(lambda f: (self._compress_selected_callback(f, machine),
+                                            QTimer.singleShot(0, partial(self.verify_decompressed_file, gce, filepath, decompressed_filename, errorbound,
+                                                                         "ABS", None, regions, ranges, dimension=" ".join(dimension), manifest=manifest))))
     
     def sz_split_data_compression(self, filename: str, data_dir: str, machine="auto"):
         data_file_path = str(Path(data_dir) / filename)
@@ -1083,6 +1638,12 @@ class UI(QDialog):
         else:
             QMessageBox.information(self, "szsplit compression", "Select machine before compression!", QMessageBox.StandardButton.Close)
             return
+        if self.szSplitIndexedCheckBox.isChecked():
+            self.sz_split_group_compression(filename, data_file_path, work_dir, gce, job_config.copy(), machine)
+            return
+        if self.szSplitShardSpinBox.value() > 1:
+            self.sz_split_shard_compression(filename, data_file_path, executable, work_dir, gce, job_config.copy(), machine)
+            return
         compressed_file = filename + ".szsplit"
         compressed_file_path = str(Path(work_dir) / compressed_file)
         ntask_per_node = self.szSplitnTaskSpinBox.value()
@@ -1103,6 +1664,9 @@ class UI(QDialog):
         eb = self.sz3_error_bound_lineEdit.text()
         command = CompressorCmdFactory.make_szsplit_compress_cmd(executable, data_file_path, compressed_file_path,
                                                                  parsed_dimension, eb, layer_depth, threads, is_mpi, total_processors)
+        # statistics the preview loaded tell what the error bound means for this data, nothing is submitted for them
+        if (machine, data_file_path) in self.volume_statistics:
+            self.report_layer_statistics(self.volume_statistics[(machine, data_file_path)], eb, layer_depth)
         job_config["name"] = "c-split"
         job_config["time"] = "01:00:00"
         job_config["nodes"] = nNodes
@@ -1112,7 +1676,188 @@ class UI(QDialog):
         print(sbatch_file)
         sbatch_file_path = str(Path(work_dir) / "szsplit_compress.sh")
         future = gce.submit(save_str_to_file, sbatch_file_path, sbatch_file)
-        future.add_done_callback(lambda f: self._submit_sbatch_job(sbatch_file_path, machine))
+        # the manifest is written once the compression job is done, its command decompresses without MPI
+        manifest = self.make_manifest("sz_split", data_file_path, parsed_dimension, "ABS", eb,
+                                      CompressorCmdFactory.make_szsplit_decompress_cmd(executable, "{compressed}", "{decompressed}", parsed_dimension,
+                                                                                       "{eb}", layer_depth, ntask_per_node, False), depth=layer_depth)
+        on_submitted = lambda job_id: self.write_output_manifest(gce, compressed_file_path, manifest, machine, job_id)
+        future.add_done_callback(lambda f: self._submit_sbatch_job(sbatch_file_path, machine, on_submitted))
+
+    def sz_split_group_compression(self, filename: str, data_file_path: str, work_dir: str, gce, job_config: dict, machine: str):
+        # every layer group becomes its own stream of a .szg archive, compressed by a single node job that runs
+        # compress_layer_groups as an inline script; the node's tasks are split between concurrent groups and the
+        # threads of every group's sz_split
+        dimension = self.sz3_data_dimension_lineEdit.text()
+        parsed_dimension = dimension.split()
+        layers = int(parsed_dimension[2]) if len(parsed_dimension) == 3 else 1
+        depth = self.szSplitLayerDepthSpinBox.value()
+        ntask_per_node = self.szSplitnTaskSpinBox.value()
+        workers = max(1, min(ntask_per_node, -(-layers // depth)))
+        compress_command, decompress_command = self.make_group_commands(machine, max(1, ntask_per_node // workers))
+        archive_file = str(Path(work_dir) / (filename + ".szg"))
+        script = self.make_helper_script(compress_layer_groups, dimension, data_file_path, archive_file, compress_command, decompress_command,
+                                         self.sz3_error_bound_lineEdit.text(), depth, self.sz3Float64CheckBox.isChecked(), workers)
+        job_config["name"] = "c-groups"
+        job_config["time"] = "01:00:00"
+        job_config["nodes"] = 1
+        job_config["memory"] = f"{max(4 * ntask_per_node, 32)}GB"
+        job_config["ntasks_per_node"] = ntask_per_node
+        sbatch_file = build_sbatch_file(job_config, f"python - <<'OCELOT_HELPER'\n{script}OCELOT_HELPER", work_dir=work_dir)
+        sbatch_file_path = str(Path(work_dir) / "szsplit_groups.sh")
+        future = gce.submit(save_str_to_file, sbatch_file_path, sbatch_file)
+        future.add_done_callback(lambda f: self._submit_sbatch_job(sbatch_file_path, machine, partial(self._group_job_submitted, gce, machine, archive_file)))
+        self.add_message_to_current_status(f"Compressing {filename} into indexed groups of {depth} layers, {workers} at once on {ntask_per_node} tasks "
+                                           f"of a batch job on machine {machine}...")
+
+    def make_helper_script(self, function, *args):
+        # a standalone script that runs a helper of globus_compute_util in a batch job, with the helpers it calls
+        return (f"{helper_source(function)}\n\n"
+                f"if __name__ == '__main__':\n"
+                f"    import json\n"
+                f"    result = {function.__name__}(*json.loads({json.dumps(args)!r}))\n"
+                f"    print(json.dumps(result))\n"
+                f"    if \"error\" in result:\n"
+                f"        raise SystemExit(result[\"error\"])\n")
+
+    def _group_job_submitted(self, gce, machine, archive_file, job_id):
+        self.add_message_to_current_status(f"Job {job_id} compresses {Path(archive_file).name}, it is checked once the job is done.")
+        self.after_job(machine, job_id, partial(self.load_manifest, gce, archive_file, partial(self._group_job_done, archive_file, machine, job_id)))
+
+    def _group_job_done(self, archive_file, machine, job_id, manifest=None):
+        if manifest is None:
+            self.add_message_to_current_status(f"Job {job_id} did not write {Path(archive_file).name}, see its log in the work directory.", MessageLevel.ALERT)
+            return
+        ratio = manifest["original"]["size"] / max(manifest["size"], 1) if manifest.get("original") else None
+        self.add_message_to_current_status(f"{Path(archive_file).name}: {len(manifest['chunks'])} layer groups"
+                                           + ("" if ratio is None else f", ratio {ratio:.2f}") + f", compressed by job {job_id}.", MessageLevel.SUCCESS)
+        if machine == "A":
+            self.on_click_list_workdir_button_a()
+        else:
+            self.on_click_list_workdir_button_b()
+
+    def sz_split_shard_compression(self, filename: str, data_file_path: str, executable: str, work_dir: str, gce, job_config: dict, machine: str):
+        # the layer range is split into shards of whole layer groups, each compressed by its own single node job
+        dimension = self.sz3_data_dimension_lineEdit.text().split()
+        if len(dimension) != 3:
+            QMessageBox.information(self, "szsplit compression", "Only 3D data can be sharded!", QMessageBox.StandardButton.Close)
+            return
+        if self.szSplitmpiModecheckBox.isChecked():
+            self.add_message_to_current_status("Shards run on one node each without MPI, the MPI mode is ignored.", MessageLevel.WARNING)
+        eb = self.sz3_error_bound_lineEdit.text()
+        depth = self.szSplitLayerDepthSpinBox.value()
+        threads = self.szSplitnTaskSpinBox.value()
+        groups = -(-int(dimension[2]) // depth)
+        groups_per_shard = -(-groups // self.szSplitShardSpinBox.value())
+        shard_dir = Path(work_dir) / (filename + ".shards")
+        shards, scripts = [], []
+        for index, first_group in enumerate(range(0, groups, groups_per_shard)):
+            first_layer = first_group * depth
+            layers = min(groups_per_shard * depth, int(dimension[2]) - first_layer)
+            output = str(shard_dir / f"shard-{index:03d}.szsplit")
+            slab = output + ".slab"
+            compress = CompressorCmdFactory.make_szsplit_compress_cmd(executable, slab, output, dimension[:2] + [str(layers)], eb, depth, threads, False)
+            # the job cuts its layers out of the data, a layer's bytes follow from the file size so any dtype works,
+            # and marks the shard done only when the compressor succeeded
+            command = "\n".join([f"layer_bytes=$(( $(stat -c %s {data_file_path}) / {dimension[2]} ))",
+                                 f"dd if={data_file_path} of={slab} bs=16M iflag=skip_bytes,count_bytes skip=$(( {first_layer} * layer_bytes )) "
+                                 f"count=$(( {layers} * layer_bytes )) status=none && {compress} && touch {output}.done",
+                                 f"rm -f {slab}"])
+            shard_config = dict(job_config, name=f"c-shard{index}", time="01:00:00", nodes=1, memory=f"{max(4 * threads, 32)}GB",
+                                ntasks_per_node=threads)
+            scripts.append(build_sbatch_file(shard_config, command, work_dir=str(shard_dir)))
+            shards.append({"index": index, "first_layer": first_layer, "layers": layers, "output": output,
+                           "script": str(shard_dir / f"shard-{index:03d}.sh")})
+        manifest = {
+            "version": 1,
+            "compressor": "sz_split",
+            "data_file": data_file_path,
+            "dimension": [int(dim) for dim in dimension],
+            "eb_mode": "ABS",
+            "error_bound": float(eb),
+            "depth": depth,
+            "archive": str(Path(work_dir) / (filename + ".szg")),
+            "decompress_command": CompressorCmdFactory.make_szsplit_decompress_cmd(executable, "{compressed}", "{decompressed}",
+                                                                                   dimension[:2] + ["{layers}"], "{eb}", depth, threads, False),
+            "shards": shards,
+        }
+        future = gce.submit(prepare_shards, str(Path(work_dir) / (filename + ".shards.json")), manifest, scripts)
+        future.add_done_callback(lambda f: QTimer.singleShot(0, partial(self._shards_prepared_callback, f, gce, machine)))
+
+    def _shards_prepared_callback(self, future, gce, machine):
+        try:
+            result = future.result()
+        except Exception as e:
+            self.add_message_to_current_status(f"Preparing the shard jobs failed: {e}", MessageLevel.ALERT)
+            return
+        if "error" in result:
+            self.add_message_to_current_status(f"Preparing the shard jobs failed: {result['error']}", MessageLevel.ALERT)
+            return
+        for shard in result["shards"]:
+            self.submit_shard_job(gce, machine, shard)
+        self.add_message_to_current_status(f"Submitted {len(result['shards'])} shard jobs recorded in {Path(result['manifest']).name}, "
+                                           f"press Shards to check, resubmit or assemble them.")
+
+    def submit_shard_job(self, gce, machine, shard):
+        # the job id is recorded as soon as sbatch accepts it, a shard waiting in the queue is not submitted again
+        self._submit_sbatch_job(shard["script"], machine, lambda job_id: gce.submit(record_shard_job, shard["output"], job_id))
+
+    def on_click_shards_button(self):
+        if len(self.dataset_dir_listWidget.selectedItems()) == 0:
+            QMessageBox.information(self, "Shards", "You need to select the sharded data file", QMessageBox.StandardButton.Close)
+            return
+        if self.machine_a_radio_button.isChecked():
+            gce, work_dir, machine = self.gce_machine_a, self.workdir_lineedit_a.text(), "A"
+        elif self.machine_b_radio_button.isChecked():
+            gce, work_dir, machine = self.gce_machine_b, self.workdir_lineedit_b.text(), "B"
+        else:
+            QMessageBox.information(self, "Shards", "Select machine before checking the shards!", QMessageBox.StandardButton.Close)
+            return
+        filename = self.dataset_dir_listWidget.selectedItems()[0].text()
+        future = gce.submit(check_shards, str(Path(work_dir) / (filename + ".shards.json")))
+        future.add_done_callback(lambda f: QTimer.singleShot(0, partial(self._check_shards_callback, f, gce, machine)))
+
+    def _check_shards_callback(self, future, gce, machine):
+        try:
+            result = future.result()
+        except Exception as e:
+            result = {"error": str(e)}
+        if "error" in result:
+            self.add_message_to_current_status(f"Cannot check the shards: {result['error']}", MessageLevel.ALERT)
+            return
+        if "warning" in result:
+            self.add_message_to_current_status(f"Shards: {result['warning']}", MessageLevel.WARNING)
+        total = len(result["shards"])
+        self.add_message_to_current_status(f"{Path(result['archive']).name}: {result['done']} of {total} shards done, {result['queued']} queued or running.")
+        if len(result["retry"]) > 0:
+            reply = QMessageBox.question(self, "Shards", f"Shards {result['retry']} failed or never started, resubmit them?",
+                                         QMessageBox.Yes | QMessageBox.No, QMessageBox.Yes)
+            if reply == QMessageBox.Yes:
+                for shard in result["shards"]:
+                    if shard["index"] in result["retry"]:
+                        self.submit_shard_job(gce, machine, shard)
+                self.add_message_to_current_status(f"Resubmitted shards {result['retry']}.")
+        elif result["done"] == total:
+            reply = QMessageBox.question(self, "Shards", f"All {total} shards are done, assemble them into {Path(result['archive']).name}?",
+                                         QMessageBox.Yes | QMessageBox.No, QMessageBox.Yes)
+            if reply == QMessageBox.Yes:
+                future = gce.submit(assemble_shards, result["manifest"], False)
+                future.add_done_callback(lambda f: QTimer.singleShot(0, partial(self._assemble_shards_callback, f, machine)))
+
+    def _assemble_shards_callback(self, future, machine):
+        try:
+            result = future.result()
+        except Exception as e:
+            result = {"error": str(e)}
+        if "error" in result:
+            self.add_message_to_current_status(f"Assembling the shards failed: {result['error']}", MessageLevel.ALERT)
+            return
+        ratio = "" if result["ratio"] is None else f", ratio {result['ratio']:.2f}"
+        self.add_message_to_current_status(f"{Path(result['archive']).name}: {result['shards']} shards assembled{ratio}, "
+                                           f"described by {Path(result['manifest']).name}.", MessageLevel.SUCCESS)
+        if machine == "A":
+            self.on_click_list_workdir_button_a()
+        else:
+            self.on_click_list_workdir_button_b()
 
     def sz_split_data_decompression(self, filename: str, compressed_data_dir:str, machine="auto"):
         if (self.machine_a_radio_button.isChecked() and machine=="auto") or machine=='A':
@@ -1130,8 +1875,17 @@ class UI(QDialog):
         else:
             QMessageBox.information(self, "szsplit decompression", "Select machine before compression!", QMessageBox.StandardButton.Close)
             return
+        if filename.endswith(".szg"):
+            self.decompress_archive_layers(gce, machine, str(Path(compressed_data_dir) / filename), str(Path(work_dir) / (filename + ".dp")))
+            return
+        compressed_file_path = str(Path(compressed_data_dir) / filename)
+        # the manifest of the output overrides the dimension, error bound and layer depth set in the app
+        self.load_manifest(gce, compressed_file_path, partial(self.sz_split_decompress_with_manifest, gce, executable, work_dir, job_config,
+                                                              machine, compressed_file_path))
+
+    def sz_split_decompress_with_manifest(self, gce, executable, work_dir, job_config, machine, compressed_file_path, manifest=None):
         ntask_per_node = self.szSplitnTaskSpinBox.value()
-        layer_depth = self.szSplitLayerDepthSpinBox.value()
+        layer_depth = self.szSplitLayerDepthSpinBox.value() if manifest is None else manifest.get("depth", self.szSplitLayerDepthSpinBox.value())
         if self.szSplitmpiModecheckBox.isChecked():
             is_mpi = True
             nNodes = int(self.szSplitnNodeSpinBox.value())
@@ -1144,10 +1898,12 @@ class UI(QDialog):
             threads = ntask_per_node
         total_processors = nNodes * ntask_per_node
         dimension = self.sz3_data_dimension_lineEdit.text()
-        parsed_dimension = dimension.split()
         eb = self.sz3_error_bound_lineEdit.text()
-        compressed_file_path = str(Path(compressed_data_dir) / filename)
-        decompressed_file_path = str(Path(work_dir) / (filename + ".dp"))
+        if manifest is not None:
+            dimension = " ".join(str(dim) for dim in manifest["dimension"])
+            eb = f"{manifest['error_bound']:g}"
+        parsed_dimension = dimension.split()
+        decompressed_file_path = str(Path(work_dir) / (Path(compressed_file_path).name + ".dp"))
         command = CompressorCmdFactory.make_szsplit_decompress_cmd(executable, compressed_file_path, decompressed_file_path,
                                                                    parsed_dimension, eb, layer_depth, threads, is_mpi, total_processors)
         job_config["name"] = "d-split"
@@ -1159,7 +1915,10 @@ class UI(QDialog):
         print(sbatch_file)
         sbatch_file_path = str(Path(work_dir) / "szsplit_decompress.sh")
         future = gce.submit(save_str_to_file, sbatch_file_path, sbatch_file)
-        future.add_done_callback(lambda f: self._submit_sbatch_job(sbatch_file_path, machine))
+        # the output is verified once the decompression job is done
+        verify = partial(self.verify_decompressed_file, gce, compressed_file_path, decompressed_file_path, eb, "ABS", dimension=dimension,
+                         manifest=manifest, machine=machine)
+        future.add_done_callback(lambda f: self._submit_sbatch_job(sbatch_file_path, machine, lambda job_id: verify(job_id=job_id)))
 
 
     def fastqzip_data_compression(self, filenames: List[str], data_dir:str, machine="auto"):
@@ -1263,6 +2022,13 @@ class UI(QDialog):
         elif self.compressorTabWidget.currentIndex() == 3:
             self.fastqzip_data_decompression(filename=filename, compressed_data_dir=data_dir)
         
+    def with_manifests(self, files: List[Path], list_widget) -> List[Path]:
+        # manifests travel with their outputs, so the destination can decompress and check them without the app's settings
+        listed = {list_widget.item(i).text() for i in range(list_widget.count())}
+        names = {file.name for file in files}
+        return files + [file.with_name(file.name + MANIFEST_SUFFIX) for file in files
+                        if file.name + MANIFEST_SUFFIX in listed and file.name + MANIFEST_SUFFIX not in names]
+
     def on_click_transfer_selected_button(self):
         # QMessageBox.information(self, "Transfer Selected", "You clicked the transfer selected button", QMessageBox.StandardButton.Close)
         filenames = self.dataset_dir_listWidget.selectedItems()
@@ -1272,7 +2038,7 @@ class UI(QDialog):
             QMessageBox.warning(self, "Authentication Error", "You need to authenticate Globus Transfer first!", QMessageBox.StandardButton.Cancel)
             return
 
-        files_to_transfer = [Path(data_dir) / file.text() for file in filenames]
+        files_to_transfer = self.with_manifests([Path(data_dir) / file.text() for file in filenames], self.dataset_dir_listWidget)
         if self.machine_a_radio_button.isChecked():
             source_endpoint = self.globus_id_lineedit_a.text()
             detination_endpoint = self.globus_id_lineedit_b.text()
@@ -1304,17 +2070,46 @@ class UI(QDialog):
         thread_b.finished.connect(lambda: (self.check_transfer_status(transfer_doc), thread_b, self.on_click_list_workdir_button_a()))
         thread_b.start()
 
+    def _check_resident_callback(self, future, gce, machine):
+        # helpers run through the module installed on the endpoint only when its version matches this client
+        try:
+            version = future.result()
+        except Exception as e:
+            version = None
+            print(f"Machine {machine} resident helper check failed:", e)
+        gce.resident = version == OCELOT_HELPER_VERSION
+        if gce.resident:
+            print(f"Machine {machine} runs the resident Ocelot helpers {version}")
+        else:
+            print(f"Machine {machine} has no matching resident Ocelot helpers ({version}), helpers are shipped with every call")
+
+    def _cpu_info_callback(self, future, machine):
+        try:
+            cpu_info = future.result()
+        except Exception as e:
+            print(f"lscpu failed on machine {machine}:", e)
+            return
+        print(f"Machine {machine} CPU Info:\n", cpu_info)
+        cpus = re.search(r"^CPU\(s\):\s*(\d+)", cpu_info, re.MULTILINE)
+        self.machine_cpus[machine] = int(cpus.group(1)) if cpus is not None else None
+
     def on_click_register_globus_compute_a(self):
-        self.gce_machine_a = Executor(endpoint_id=self.funcx_id_lineedit_a.text().strip(), client=self.gcc)
+        self.gce_machine_a = ResidentExecutor(Executor(endpoint_id=self.funcx_id_lineedit_a.text().strip(), client=self.gcc))
         future = self.gce_machine_a.submit(list_cpu)
         print("submitted a lscpu to machine A")
-        future.add_done_callback(lambda f: print("Machine A CPU Info:\n", f.result()))
+        future.add_done_callback(lambda f: self._cpu_info_callback(f, "A"))
+        gce = self.gce_machine_a
+        resident_future = gce.submit(get_resident_version)
+        resident_future.add_done_callback(lambda f: self._check_resident_callback(f, gce, "A"))
 
     def on_click_register_globus_compute_b(self):
-        self.gce_machine_b = Executor(endpoint_id=self.funcx_id_lineedit_b.text().strip(), client=self.gcc)
+        self.gce_machine_b = ResidentExecutor(Executor(endpoint_id=self.funcx_id_lineedit_b.text().strip(), client=self.gcc))
         future = self.gce_machine_b.submit(list_cpu)
         print("submitted a lscpu to machine B")
-        future.add_done_callback(lambda f: print("Machine B CPU Info:\n", f.result()))
+        future.add_done_callback(lambda f: self._cpu_info_callback(f, "B"))
+        gce = self.gce_machine_b
+        resident_future = gce.submit(get_resident_version)
+        resident_future.add_done_callback(lambda f: self._check_resident_callback(f, gce, "B"))
 
     def on_click_remove_authentication(self):
         reply = QMessageBox.question(self, 'Confirmation', 'Are you sure you want to deauthenticate?', QMessageBox.Yes | QMessageBox.No, QMessageBox.No)
@@ -1523,6 +2318,7 @@ class UI(QDialog):
                 self.machine_a_job_config["user"] = defaults["user"]
             if "reference_path" in defaults:
                 self.referencePathMA = defaults["reference_path"]
+            self.predictor_a = self.load_predictor(defaults)
             if "multi_node_partition" in defaults:
                 self.machine_a_job_config["multi_node_partition"] = defaults["multi_node_partition"]
             else:
@@ -1570,6 +2366,7 @@ class UI(QDialog):
                 self.machine_b_job_config["user"] = defaults["user"]
             if "reference_path" in defaults:
                 self.referencePathMB = defaults["reference_path"]
+            self.predictor_b = self.load_predictor(defaults)
             if "multi_node_partition" in defaults:
                 self.machine_b_job_config["multi_node_partition"] = defaults["multi_node_partition"]
             else:
@@ -1584,7 +2381,7 @@ class UI(QDialog):
             QMessageBox.warning(self, "Authentication Error", "You need to authenticate Globus Transfer first!", QMessageBox.StandardButton.Cancel)
             return
 
-        files_to_transfer :List[Path]= self.listwidget_a_selected_paths
+        files_to_transfer :List[Path]= self.with_manifests(list(self.listwidget_a_selected_paths), self.workdir_listwidget_a)
 
         task_data = globus_sdk.TransferData(
             source_endpoint=self.globus_id_lineedit_a.text(), destination_endpoint=self.globus_id_lineedit_b.text()
@@ -1666,7 +2463,7 @@ class UI(QDialog):
             QMessageBox.warning(self, "Authentication Error", "You need to authenticate Globus Transfer first!", QMessageBox.StandardButton.Cancel)
             return
 
-        files_to_transfer :List[Path]= self.listwidget_b_selected_paths
+        files_to_transfer :List[Path]= self.with_manifests(list(self.listwidget_b_selected_paths), self.workdir_listwidget_b)
 
         task_data = globus_sdk.TransferData(
             source_endpoint=self.globus_id_lineedit_b.text(), destination_endpoint=self.globus_id_lineedit_a.text()
@@ -11,7 +11,11 @@ setup(
     description="Ocelot is a lossy compression and transfer framework for floating-point scientific data.",
     long_description=long_description,
     packages=find_packages(),
+    # installed on the endpoints so that the remote helpers can be imported once per worker,
+    # ocelot_array reads the compressed outputs where they land
+    py_modules=["globus_compute_util", "ocelot_array"],
     install_requires=[
+        "numpy",
         "tabulate>=0.9.0",
         "pydantic>=1.10.14",
         "psutil>=5.9.8",
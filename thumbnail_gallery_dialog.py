@@ -0,0 +1,145 @@
+import sys
+import os
+import hashlib
+from pathlib import Path
+from PyQt5.QtWidgets import *
+from PyQt5.QtGui import *
+from PyQt5.QtCore import *
+
+from matplotlib import pyplot as plt
+import numpy as np
+
+from globus_compute_util import get_thumbnails
+
+
+class ThumbnailGalleryDialog(QDialog):
+    # emitted from the Globus Compute callback thread, delivered to the GUI thread as a queued signal
+    thumbnailsLoaded = pyqtSignal(object)
+
+    def __init__(self, window_title = 'Dataset Thumbnails', gce = None, data_dir = "./data", filenames = None,
+                 dataDimension = "1800 3600", is_float64 = False, cache_dir = None):
+        super().__init__()
+        self.gce = gce
+        self.data_dir = data_dir
+        self.filenames = list(filenames or [])
+        self.dataDimensionTxt = dataDimension
+        self.is_float64 = is_float64
+        self.thumbnailShape = (96, 144)
+        # thumbnails are cached on the client by file identity, (size, mtime_ns) on the endpoint
+        self.cache_dir = Path(cache_dir) if cache_dir else Path.home() / ".ocelot" / "thumbnails"
+        lut = np.asarray(plt.get_cmap('rainbow')(np.linspace(0, 1, 256)))
+        rgb = np.rint(lut[:, :3] * 255).astype(np.uint32)
+        self.colorTable = ((np.uint32(0xFF) << 24) | (rgb[:, 0] << 16) | (rgb[:, 1] << 8) | rgb[:, 2]).tolist()
+        self.items = {}
+        self.thumbnailsLoaded.connect(self.on_thumbnails_loaded)
+        self.initUI(window_title)
+        self.loadThumbnails()
+
+    def initUI(self, window_title):
+        self.setWindowTitle(window_title)
+        layout = QVBoxLayout()
+        self.statusLabel = QLabel(f"Rendering {len(self.filenames)} thumbnails...")
+        layout.addWidget(self.statusLabel)
+        self.galleryWidget = QListWidget()
+        self.galleryWidget.setViewMode(QListView.IconMode)
+        self.galleryWidget.setIconSize(QSize(self.thumbnailShape[1], self.thumbnailShape[0]))
+        self.galleryWidget.setResizeMode(QListView.Adjust)
+        self.galleryWidget.setMovement(QListView.Static)
+        self.galleryWidget.setSpacing(6)
+        self.galleryWidget.setWordWrap(True)
+        self.galleryWidget.itemDoubleClicked.connect(lambda item: self.accept())
+        placeholder = QPixmap(self.thumbnailShape[1], self.thumbnailShape[0])
+        placeholder.fill(Qt.lightGray)
+        for filename in self.filenames:
+            item = QListWidgetItem(QIcon(placeholder), filename)
+            self.galleryWidget.addItem(item)
+            self.items[filename] = item
+        layout.addWidget(self.galleryWidget)
+
+        buttonLayout = QHBoxLayout()
+        self.accept_button = QPushButton('Preview Selected')
+        self.accept_button.clicked.connect(self.accept)
+        self.cancel_button = QPushButton('Close')
+        self.cancel_button.clicked.connect(self.reject)
+        buttonLayout.addWidget(self.accept_button)
+        buttonLayout.addWidget(self.cancel_button)
+        layout.addLayout(buttonLayout)
+        self.setLayout(layout)
+        self.resize(800, 600)
+
+    def getSelectedFile(self):
+        selected = self.galleryWidget.selectedItems()
+        return selected[0].text() if len(selected) > 0 else None
+
+    def cachePath(self, filename):
+        endpoint_id = getattr(self.gce, "endpoint_id", None)
+        key = repr((str(endpoint_id), self.data_dir, filename, self.dataDimensionTxt, self.is_float64, self.thumbnailShape))
+        return self.cache_dir / (hashlib.sha1(key.encode()).hexdigest() + ".npz")
+
+    def loadCached(self, filename):
+        try:
+            with np.load(self.cachePath(filename)) as cached:
+                return tuple(cached["identity"].tolist()), cached["thumbnail"], float(cached["min"]), float(cached["max"])
+        except (OSError, KeyError, ValueError):
+            return None
+
+    def storeCached(self, filename, entry):
+        try:
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+            np.savez(self.cachePath(filename), identity=np.array(entry["identity"], dtype=np.int64),
+                     thumbnail=entry["thumbnail"], min=entry["min"], max=entry["max"])
+        except OSError as e:
+            print("failed to cache the thumbnail of", filename, e)
+
+    def showThumbnail(self, filename, thumbnail, data_min, data_max):
+        data = np.ascontiguousarray(thumbnail)
+        height, width = data.shape
+        qimage = QImage(data.tobytes(), width, height, data.strides[0], QImage.Format_Indexed8)
+        qimage.setColorTable(self.colorTable)
+        pixmap = QPixmap.fromImage(qimage.copy()).scaled(self.thumbnailShape[1], self.thumbnailShape[0], Qt.KeepAspectRatio)
+        self.items[filename].setIcon(QIcon(pixmap))
+        self.items[filename].setToolTip(f"{filename}\nmiddle layer range [{data_min:.6g}, {data_max:.6g}]")
+
+    def loadThumbnails(self):
+        # cached thumbnails show up right away, the endpoint only renders files that changed since
+        known = {}
+        for filename in self.filenames:
+            cached = self.loadCached(filename)
+            if cached is not None:
+                known[filename] = cached[0]
+                self.showThumbnail(filename, *cached[1:])
+        args = (self.dataDimensionTxt, self.data_dir, self.filenames, self.is_float64, self.thumbnailShape, known)
+        if self.gce == None:
+            self.on_thumbnails_loaded(get_thumbnails(*args))
+        else:
+            future = self.gce.submit(get_thumbnails, *args)
+            future.add_done_callback(lambda f: self.thumbnailsLoaded.emit(f))
+
+    def on_thumbnails_loaded(self, result):
+        if not isinstance(result, dict):
+            try:
+                result = result.result()
+            except Exception as e:
+                self.statusLabel.setText(f"Failed to render the thumbnails: {e}")
+                return
+        rendered, failed = 0, 0
+        for filename, entry in result.items():
+            if filename not in self.items:
+                continue
+            if "error" in entry:
+                failed += 1
+                self.items[filename].setToolTip(f"{filename}\n{entry['error']}")
+            elif entry.get("thumbnail") is not None:
+                rendered += 1
+                self.storeCached(filename, entry)
+                self.showThumbnail(filename, entry["thumbnail"], entry["min"], entry["max"])
+        cached = len(result) - rendered - failed
+        self.statusLabel.setText(f"{rendered} rendered, {cached} from cache, {failed} not previewable with dimension {self.dataDimensionTxt}")
+
+
+if __name__ == '__main__':
+    app = QApplication(sys.argv)
+    data_dir = sys.argv[1] if len(sys.argv) > 1 else "./data"
+    ex = ThumbnailGalleryDialog(data_dir=data_dir, filenames=sorted(os.listdir(data_dir)))
+    ex.show()
+    sys.exit(app.exec_())